@@ -0,0 +1,215 @@
+"""
+End-to-end benchmark of the MyDNS.JP update flow against the local fake server.
+
+Measures per-challenge latency, requests per challenge and form parse time of
+  - client : MyDNSJPClient.set_txt_record / clear_txt_record, one challenge at a time
+  - batch  : Authenticator.perform / cleanup with all challenges at once
+  - poll   : batch with propagation-poll against the local fake nameserver,
+             which publishes the TXT rows every --dns-refresh seconds
+
+usage: python benchmarks/bench_e2e.py [--challenges 20] [--accounts 2] [--rows 200] [--latency 0.02] [--dns-refresh 0.5] [--json result.json]
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import types
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import fake_dns
+import fake_mydnsjp
+
+from certbot_dns_mydnsjp.cert.client import Authenticator
+from certbot_dns_mydnsjp.mydnsjp.client import MyDNSJPClient
+from certbot_dns_mydnsjp.mydnsjp.directedit import DirectEditBackend
+from certbot_dns_mydnsjp.mydnsjp.scraping import ScrapingBackend
+from certbot_dns_mydnsjp.mydnsjp.session import MyDNSJPSessionManager
+
+class TimedScrapingBackend(ScrapingBackend):
+    """
+    ScrapingBackend accumulating the time spent in the form parser.
+    """
+
+    parse_seconds = 0.0
+
+    def _request_forms(self, *args, **kwargs) -> tuple:
+        r, parser = super()._request_forms(*args, **kwargs)
+        if parser is not None:
+            TimedScrapingBackend.parse_seconds += parser.seconds
+        return r, parser
+
+def make_backends(session_manager: MyDNSJPSessionManager, base_url: str) -> dict:
+    return {
+        ScrapingBackend.name: TimedScrapingBackend(session_manager, base_url + "/members/"),
+        DirectEditBackend.name: DirectEditBackend(session_manager, base_url + "/directedit.html"),
+    }
+
+class FakeAchall:
+    """
+    Minimal stand-in of certbot AnnotatedChallenge for dns-01.
+    """
+
+    account_key = None
+
+    def __init__(self, domain: str, validation: str) -> None:
+        self.domain = domain
+        self._validation = validation
+
+    def validation(self, account_key) -> str:
+        return self._validation
+
+    def validation_domain_name(self, domain: str) -> str:
+        return "_acme-challenge." + domain
+
+    def response(self, account_key) -> tuple:
+        return ("dns-01", self.domain)
+
+def make_authenticator(credentials_path: str, base_url: str, max_concurrency: int, options: dict = None) -> Authenticator:
+    defaults = {}
+
+    def add(name, **kwargs):
+        defaults["dns_mydnsjp_" + name.replace("-", "_")] = kwargs.get("default")
+
+    Authenticator.add_parser_arguments(add)
+    defaults["dns_mydnsjp_credentials"] = credentials_path
+    defaults["dns_mydnsjp_propagation_seconds"] = 0
+    defaults["dns_mydnsjp_max_concurrency"] = max_concurrency
+    for name, value in (options or {}).items():
+        defaults["dns_mydnsjp_" + name.replace("-", "_")] = value
+
+    class BenchAuthenticator(Authenticator):
+        def _setup_credentials(self) -> None:
+            super()._setup_credentials()
+            self._mydnsjp_client = MyDNSJPClient(self.credentials.conf("credential"), self._mydnsjp_session_manager,
+                                                 make_backends(self._mydnsjp_session_manager, base_url))
+
+    return BenchAuthenticator(types.SimpleNamespace(**defaults), "dns-mydnsjp")
+
+def summarize(name: str, state: fake_mydnsjp.FakeMyDNSJP, latencies: list, challenges: int, elapsed: float) -> dict:
+    return {
+        "scenario": name,
+        "challenges": challenges,
+        "total_seconds": elapsed,
+        "latency_per_challenge_mean": statistics.mean(latencies) if latencies else elapsed / challenges,
+        "latency_per_challenge_max": max(latencies) if latencies else elapsed / challenges,
+        "requests_per_challenge": state.total_requests() / challenges,
+        "bytes_per_challenge": state.bytes_sent / challenges,
+        "parse_ms_per_challenge": TimedScrapingBackend.parse_seconds * 1000 / challenges,
+        "requests": dict(state.counts),
+    }
+
+def bench_client(state: fake_mydnsjp.FakeMyDNSJP, base_url: str, credential: dict, challenges: int) -> dict:
+    session_manager = MyDNSJPSessionManager()
+    client = MyDNSJPClient(credential, session_manager, make_backends(session_manager, base_url))
+    domain = list(credential.keys())[0]
+    state.reset_counts()
+    TimedScrapingBackend.parse_seconds = 0.0
+    latencies = []
+    start = time.perf_counter()
+    for ix in range(challenges):
+        challenge_start = time.perf_counter()
+        cred = client.get_mydnsjp_credential(f"host{ix}.{domain}")
+        prev_content = client.set_txt_record(cred, f"_acme-challenge.host{ix}.{domain}", f"validation{ix}")
+        client.clear_txt_record(cred, f"_acme-challenge.host{ix}.{domain}", f"validation{ix}", prev_content)
+        latencies.append(time.perf_counter() - challenge_start)
+    elapsed = time.perf_counter() - start
+    session_manager.close()
+    return summarize("client", state, latencies, challenges, elapsed)
+
+def bench_batch(state: fake_mydnsjp.FakeMyDNSJP, base_url: str, credentials_path: str, domains: list, challenges: int, max_concurrency: int) -> dict:
+    authenticator = make_authenticator(credentials_path, base_url, max_concurrency)
+    achalls = []
+    for ix in range(challenges):
+        achalls.append(FakeAchall(f"host{ix}.{domains[ix % len(domains)]}", f"validation{ix}"))
+    state.reset_counts()
+    TimedScrapingBackend.parse_seconds = 0.0
+    start = time.perf_counter()
+    authenticator.perform(achalls)
+    authenticator.cleanup(achalls)
+    elapsed = time.perf_counter() - start
+    return summarize(f"batch(max_concurrency={max_concurrency})", state, [], challenges, elapsed)
+
+def bench_poll(state: fake_mydnsjp.FakeMyDNSJP, base_url: str, credentials_path: str, domains: list, challenges: int,
+               max_concurrency: int, dns_refresh: float) -> dict:
+    dns_state = fake_dns.FakeDNS(state, dns_refresh)
+    dns_server = fake_dns.serve(dns_state)
+    options = {
+        "propagation-poll": True,
+        "propagation-seconds": 30,
+        "propagation-poll-interval": 0.1,
+        "propagation-nameservers": f"127.0.0.1:{dns_server.server_address[1]}",
+    }
+    authenticator = make_authenticator(credentials_path, base_url, max_concurrency, options)
+    achalls = []
+    for ix in range(challenges):
+        achalls.append(FakeAchall(f"host{ix}.{domains[ix % len(domains)]}", f"validation{ix}"))
+    state.reset_counts()
+    TimedScrapingBackend.parse_seconds = 0.0
+    start = time.perf_counter()
+    authenticator.perform(achalls)
+    propagated = time.perf_counter() - start
+    authenticator.cleanup(achalls)
+    elapsed = time.perf_counter() - start
+    dns_server.shutdown()
+    dns_server.tcp_server.shutdown()
+    result = summarize(f"poll(dns_refresh={dns_refresh})", state, [], challenges, elapsed)
+    result["perform_seconds"] = propagated
+    result["dns_queries"] = dns_state.queries
+    return result
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="End-to-end benchmark against the local fake MyDNS.JP server.")
+    parser.add_argument("--challenges", type=int, default=20, help="number of challenges")
+    parser.add_argument("--accounts", type=int, default=2, help="number of MyDNS.JP accounts of the batch scenario")
+    parser.add_argument("--rows", type=int, default=200, help="DNSINFO record rows per account")
+    parser.add_argument("--filled-rows", type=int, default=50, help="rows filled with A records per account")
+    parser.add_argument("--latency", type=float, default=0.02, help="seconds added to every response")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="probability of HTTP 500 per request")
+    parser.add_argument("--max-concurrency", type=int, default=4, help="max-concurrency of the batch scenario")
+    parser.add_argument("--dns-refresh", type=float, default=0.5, help="seconds until the fake nameserver publishes new TXT rows")
+    parser.add_argument("--json", help="write results to this JSON file")
+    args = parser.parse_args()
+
+    from certbot._internal.display import obj as display_obj
+    display_obj.set_display(display_obj.FileDisplay(open(os.devnull, "w"), False))
+
+    state = fake_mydnsjp.FakeMyDNSJP(args.latency, args.error_rate)
+    domains = []
+    credential = {}
+    for ix in range(args.accounts):
+        domain = f"example{ix}.mydns.jp"
+        state.add_account(f"fake_id{ix}", f"fake_pwd{ix}", domain, args.rows, args.filled_rows)
+        domains.append(domain)
+        credential[domain] = {"id": f"fake_id{ix}", "pwd": f"fake_pwd{ix}"}
+    server = fake_mydnsjp.serve(state)
+    base_url = f"http://127.0.0.1:{server.server_port}"
+
+    results = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        credentials_path = os.path.join(work_dir, "mydnsjp.ini")
+        with open(credentials_path, "w") as f:
+            f.write("[dns_mydnsjp_credential]\n")
+            for domain, cred in credential.items():
+                f.write(f"[[{domain}]]\n'id'='{cred['id']}'\n'pwd'='{cred['pwd']}'\n")
+        os.chmod(credentials_path, 0o600)
+        results.append(bench_client(state, base_url, {domains[0]: credential[domains[0]]}, args.challenges))
+        results.append(bench_batch(state, base_url, credentials_path, domains, args.challenges, 1))
+        results.append(bench_batch(state, base_url, credentials_path, domains, args.challenges, args.max_concurrency))
+        results.append(bench_poll(state, base_url, credentials_path, domains, args.challenges, args.max_concurrency, args.dns_refresh))
+    server.shutdown()
+
+    print(f"{'scenario':<28} {'total[s]':>9} {'per chall[ms]':>14} {'req/chall':>10} {'KB/chall':>9} {'parse[ms]/chall':>16}")
+    for result in results:
+        print(f"{result['scenario']:<28} {result['total_seconds']:>9.3f} {result['latency_per_challenge_mean'] * 1000:>14.1f} "
+              f"{result['requests_per_challenge']:>10.2f} {result['bytes_per_challenge'] / 1024:>9.1f} {result['parse_ms_per_challenge']:>16.2f}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"args": vars(args), "results": results}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
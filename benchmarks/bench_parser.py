@@ -0,0 +1,155 @@
+"""
+Micro-benchmark of the MyDNS.JP members page form parser.
+
+Compares ScrapingBackend._get_form_element with the previous implementation
+(regex search over re-sliced substrings) on synthetic domain info pages.
+
+usage: python benchmarks/bench_parser.py [--rows 100,1000,5000] [--repeat 5]
+"""
+import argparse
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from certbot_dns_mydnsjp.mydnsjp.scraping import ScrapingBackend
+from certbot_dns_mydnsjp.mydnsjp.session import MyDNSJPSessionManager
+
+TYPES = ["A", "AAAA", "CNAME", "MX", "TXT", "DELEGATE"]
+
+legacy_regexp_form = re.compile("<form([^>]*)>(.*?)</form[^>]*>",re.S|re.I)
+legacy_regexp_select = re.compile("<select([^>]*)>(.*?)</select[^>]*>",re.S|re.I)
+legacy_regexp_option = re.compile("<option([^>]*)>([^<]*)",re.S|re.I)
+legacy_regexp_input = re.compile("<input([^>]*)>",re.S|re.I)
+legacy_regexp_method = re.compile("\\smethod\\s*=\\s*['\"]([^'\"]+)['\"]",re.S|re.I)
+legacy_regexp_action = re.compile("\\saction\\s*=\\s*['\"]([^'\"]+)['\"]",re.S|re.I)
+legacy_regexp_type = re.compile("\\stype\\s*=\\s*['\"]([^'\"]+)['\"]",re.S|re.I)
+legacy_regexp_name = re.compile("\\sname\\s*=\\s*['\"]([^'\"]+)['\"]",re.S|re.I)
+legacy_regexp_value = re.compile("\\svalue\\s*=\\s*['\"]([^'\"]*)['\"]",re.S|re.I)
+legacy_regexp_selected = re.compile("selected",re.S|re.I)
+
+def legacy_get_form_element(text: str, target: str) -> dict:
+    """
+    Previous implementation of ScrapingBackend._get_form_element.
+    """
+    result = None
+    pos_form=0
+    while pos_form < len(text):
+        regexp_form_result = legacy_regexp_form.search(text[pos_form:])
+        if regexp_form_result is None:
+            break
+        pos_form += regexp_form_result.end()
+        regexp_action_result = legacy_regexp_action.search(regexp_form_result[1])
+        if regexp_action_result is None:
+            continue
+        regexp_method_result = legacy_regexp_method.search(regexp_form_result[1])
+        if regexp_method_result is None:
+            continue
+        if regexp_action_result[1] != target:
+            continue
+        if result is None:
+            result = {}
+        result[""] = {"type": "form", "action": regexp_action_result[1], "method": regexp_method_result[1]}
+        pos_input = 0
+        while pos_input < len(regexp_form_result[2]):
+            regexp_input_result = legacy_regexp_input.search(regexp_form_result[2][pos_input:])
+            if regexp_input_result is None:
+                break
+            pos_input += regexp_input_result.end()
+            regexp_type_result = legacy_regexp_type.search(regexp_input_result[1])
+            if regexp_type_result is None:
+                continue
+            regexp_name_result = legacy_regexp_name.search(regexp_input_result[1])
+            if regexp_name_result is None:
+                continue
+            regexp_value_result = legacy_regexp_value.search(regexp_input_result[1])
+            if regexp_value_result is None:
+                continue
+            result[regexp_name_result[1]] = {"type": regexp_type_result[1], "value": regexp_value_result[1]}
+        pos_select = 0
+        while pos_select < len(regexp_form_result[2]):
+            regexp_select_result = legacy_regexp_select.search(regexp_form_result[2][pos_select:])
+            if regexp_select_result is None:
+                break
+            pos_select += regexp_select_result.end()
+            regexp_name_result = legacy_regexp_name.search(regexp_select_result[1])
+            if regexp_name_result is None:
+                continue
+            name = regexp_name_result[1]
+            result[name] = {"type": "select", "option": []}
+            pos_option = 0
+            while pos_option < len(regexp_select_result[2]):
+                regexp_option_result = legacy_regexp_option.search(regexp_select_result[2][pos_option:])
+                if regexp_option_result is None:
+                    break
+                pos_option += regexp_option_result.end()
+                regexp_value_result = legacy_regexp_value.search(regexp_option_result[1])
+                if regexp_value_result is None:
+                    continue
+                value = regexp_value_result[1]
+                result[name]["option"].append(value)
+                if legacy_regexp_selected.search(regexp_option_result[1]) is None:
+                    continue
+                result[name]["value"] = value
+    return result
+
+def make_page(rows: int) -> str:
+    """
+    Make a synthetic members page with a domain info form of rows records.
+
+    :param rows: number of DNSINFO record rows
+
+    :return: html text
+    """
+    out = ['<html><body><form action="/members/" method="post"><input type="submit" name="MENU" value="LOGOUT"></form>']
+    out.append('<form action="/members/#domaininfo" method="post">')
+    out.append('<input type="text" name="DNSINFO[domainname]" value="example.mydns.jp">')
+    for ix in range(4):
+        out.append(f'<input type="text" name="DNSINFO[mx][{ix}]" value=""><input type="text" name="DNSINFO[prio][{ix}]" value="">')
+    for ix in range(rows):
+        record_type = TYPES[ix % len(TYPES)]
+        out.append(f'<tr><td><input type="text" name="DNSINFO[hostname][{ix}]" value="host{ix}"></td>')
+        out.append(f'<td><select name="DNSINFO[type][{ix}]">')
+        for option in TYPES:
+            selected = " selected" if option == record_type else ""
+            out.append(f'<option value="{option}"{selected}>{option}</option>')
+        out.append('</select></td>')
+        out.append(f'<td><input type="text" name="DNSINFO[content][{ix}]" value="192.0.2.{ix % 256}"></td>')
+        out.append(f'<td><select name="DNSINFO[delegateid][{ix}]"><option value="0" selected>-</option></select></td></tr>')
+    out.append('<input type="submit" name="JOB" value="CHECK"></form></body></html>')
+    return "\n".join(out)
+
+def measure(func: callable, text: str, repeat: int) -> float:
+    """
+    Measure the best time of func over repeat runs.
+
+    :return: best seconds
+    """
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(text, "/members/#domaininfo")
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the MyDNS.JP members page form parser.")
+    parser.add_argument("--rows", default="100,1000,5000", help="comma separated numbers of record rows")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per measurement (best is reported)")
+    args = parser.parse_args()
+    backend = ScrapingBackend(MyDNSJPSessionManager())
+    print(f"{'rows':>8} {'bytes':>10} {'legacy[ms]':>12} {'current[ms]':>12} {'speedup':>8}")
+    for rows in [int(rows) for rows in args.rows.split(",")]:
+        text = make_page(rows)
+        if legacy_get_form_element(text, "/members/#domaininfo") != backend._get_form_element(text, "/members/#domaininfo"):
+            raise SystemExit(f"parse result mismatch at rows={rows}")
+        legacy = measure(legacy_get_form_element, text, args.repeat)
+        current = measure(backend._get_form_element, text, args.repeat)
+        print(f"{rows:>8} {len(text):>10} {legacy * 1000:>12.2f} {current * 1000:>12.2f} {legacy / current:>7.1f}x")
+
+if __name__ == "__main__":
+    main()
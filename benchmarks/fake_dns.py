@@ -0,0 +1,204 @@
+"""
+Local stand-in of the MyDNS.JP nameservers for checking the propagation polling.
+
+Answers UDP and TCP TXT queries from static records and, if linked to a fake MyDNS.JP
+server state (see bench_e2e.py), from the TXT rows of its accounts. The rows
+are copied at most every `refresh` seconds, so a new TXT value becomes visible
+after a delay like at the real nameservers. UDP answers longer than `udp_size`
+bytes are truncated (TC bit set), so the client has to retry over TCP.
+
+usage: python benchmarks/fake_dns.py [--port 5353] [--txt _acme-challenge.example.mydns.jp=value ...]
+    certbot ... --dns-mydnsjp-propagation-poll --dns-mydnsjp-propagation-nameservers 127.0.0.1:5353
+"""
+import argparse
+import socketserver
+import struct
+import threading
+import time
+
+import fake_mydnsjp
+
+DNS_TYPE_TXT = 16
+DNS_TYPE_ANY = 255
+DNS_CLASS_IN = 1
+DNS_TTL = 60
+DNS_FLAGS_RESPONSE = 0x8400
+DNS_FLAG_TC = 0x0200
+DNS_RCODE_FORMERR = 1
+DNS_RCODE_NXDOMAIN = 3
+DNS_RCODE_NOTIMP = 4
+
+class FakeDNS:
+    """
+    State and settings of the fake nameserver.
+    """
+
+    def __init__(self, mydnsjp: fake_mydnsjp.FakeMyDNSJP = None, refresh: float = 0.0, txt: dict = None,
+                 udp_size: int = 512) -> None:
+        """
+        :param mydnsjp: fake MyDNS.JP server state whose TXT rows are served, or None
+        :param refresh: seconds between copies of the MyDNS.JP TXT rows (propagation delay)
+        :param txt: static dictionary of name to list of TXT values
+        :param udp_size: maximum UDP answer size, longer answers are truncated
+        """
+        self.mydnsjp = mydnsjp
+        self.refresh = refresh
+        self.udp_size = udp_size
+        self.txt = {}
+        for name, values in (txt or {}).items():
+            self.txt[name.lower().rstrip(".")] = list(values)
+        self.queries = 0
+        self.tcp_queries = 0
+        self.lock = threading.Lock()
+        self._zone = {}
+        self._zone_time = None
+        if mydnsjp is not None:
+            self._zone = self._copy_zone()
+            self._zone_time = time.monotonic()
+
+    def lookup(self, name: str) -> list:
+        """
+        Get the TXT values of a name.
+
+        :return: list of TXT value, or None if the name does not exist
+        """
+        name = name.lower().rstrip(".")
+        with self.lock:
+            self.queries += 1
+            now = time.monotonic()
+            if self.mydnsjp is not None and now - self._zone_time >= self.refresh:
+                self._zone = self._copy_zone()
+                self._zone_time = now
+            values = self.txt.get(name, []) + self._zone.get(name, [])
+            if len(values) == 0 and name not in self.txt and name not in self._zone:
+                return None
+            return values
+
+    def _copy_zone(self) -> dict:
+        zone = {}
+        for account in self.mydnsjp.accounts.values():
+            for hostname, content in account.get_txt_records():
+                name = f"{hostname}.{account.domainname}" if hostname != "" else account.domainname
+                zone.setdefault(name.lower(), []).append(content)
+        return zone
+
+def parse_question(message: bytes) -> tuple:
+    """
+    Parse the first question of a DNS query.
+
+    :return: tuple of (name, type, position after the question)
+
+    :raise ValueError: if the message is malformed
+    """
+    if len(message) < 12:
+        raise ValueError("short message")
+    pos = 12
+    labels = []
+    while True:
+        length = message[pos]
+        pos += 1
+        if length == 0:
+            break
+        if length & 0xc0:
+            raise ValueError("compressed question name")
+        labels.append(message[pos:pos + length].decode("ascii", "replace"))
+        pos += length
+    qtype, qclass = struct.unpack("!HH", message[pos:pos + 4])
+    return ".".join(labels), qtype, pos + 4
+
+def make_response(message: bytes, state: FakeDNS) -> bytes:
+    """
+    Build the authoritative answer of a DNS query.
+    """
+    query_id = struct.unpack("!H", message[:2])[0]
+    try:
+        name, qtype, end = parse_question(message)
+    except (IndexError, ValueError, struct.error):
+        return struct.pack("!HHHHHH", query_id, DNS_FLAGS_RESPONSE | DNS_RCODE_FORMERR, 0, 0, 0, 0)
+    question = message[12:end]
+    if qtype not in (DNS_TYPE_TXT, DNS_TYPE_ANY):
+        return struct.pack("!HHHHHH", query_id, DNS_FLAGS_RESPONSE | DNS_RCODE_NOTIMP, 1, 0, 0, 0) + question
+    values = state.lookup(name)
+    if values is None:
+        return struct.pack("!HHHHHH", query_id, DNS_FLAGS_RESPONSE | DNS_RCODE_NXDOMAIN, 1, 0, 0, 0) + question
+    answers = b""
+    for value in values:
+        data = value.encode("utf-8")
+        rdata = b""
+        for pos in range(0, max(len(data), 1), 255):
+            chunk = data[pos:pos + 255]
+            rdata += struct.pack("!B", len(chunk)) + chunk
+        # the name is a pointer to the question
+        answers += struct.pack("!HHHIH", 0xc00c, DNS_TYPE_TXT, DNS_CLASS_IN, DNS_TTL, len(rdata)) + rdata
+    return struct.pack("!HHHHHH", query_id, DNS_FLAGS_RESPONSE, 1, len(values), 0, 0) + question + answers
+
+def truncate_response(response: bytes, size: int) -> bytes:
+    """
+    Truncate a DNS answer for UDP: keep the header and the question, drop the answers and set TC.
+    """
+    if len(response) <= size:
+        return response
+    query_id, flags = struct.unpack("!HH", response[:4])
+    _, _, end = parse_question(response)
+    return struct.pack("!HHHHHH", query_id, flags | DNS_FLAG_TC, 1, 0, 0, 0) + response[12:end]
+
+def make_handler(state: FakeDNS) -> type:
+    class FakeDNSHandler(socketserver.BaseRequestHandler):
+        def handle(self) -> None:
+            message, sock = self.request
+            if len(message) < 12:
+                return
+            sock.sendto(truncate_response(make_response(message, state), state.udp_size), self.client_address)
+
+    return FakeDNSHandler
+
+def make_tcp_handler(state: FakeDNS) -> type:
+    class FakeDNSTCPHandler(socketserver.StreamRequestHandler):
+        def handle(self) -> None:
+            header = self.rfile.read(2)
+            if len(header) < 2:
+                return
+            message = self.rfile.read(struct.unpack("!H", header)[0])
+            if len(message) < 12:
+                return
+            with state.lock:
+                state.tcp_queries += 1
+            response = make_response(message, state)
+            self.wfile.write(struct.pack("!H", len(response)) + response)
+
+    return FakeDNSTCPHandler
+
+def serve(state: FakeDNS, host: str = "127.0.0.1", port: int = 0) -> socketserver.ThreadingUDPServer:
+    """
+    Start the fake nameserver (UDP and TCP on the same port) in daemon threads.
+
+    :return: UDP server object (server.server_address[1] is the bound port, server.tcp_server is the TCP one)
+    """
+    server = socketserver.ThreadingUDPServer((host, port), make_handler(state))
+    server.daemon_threads = True
+    server.tcp_server = socketserver.ThreadingTCPServer((host, server.server_address[1]), make_tcp_handler(state))
+    server.tcp_server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    threading.Thread(target=server.tcp_server.serve_forever, daemon=True).start()
+    return server
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Local stand-in of the MyDNS.JP nameservers.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5353)
+    parser.add_argument("--txt", action="append", default=[], help="static TXT record name=value, may be repeated")
+    args = parser.parse_args()
+    txt = {}
+    for item in args.txt:
+        name, _, value = item.partition("=")
+        txt.setdefault(name, []).append(value)
+    state = FakeDNS(txt=txt)
+    server = serve(state, args.host, args.port)
+    print(f"fake DNS on {args.host}:{server.server_address[1]}/udp+tcp")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,295 @@
+"""
+Local stand-in of the MyDNS.JP web interface for benchmarks.
+
+Mimics the /members/ LOGIN form, the DNSINFO[...] DOMAIN INFO form, the
+confirm page and the DirectEDIT interface, with configurable zone size,
+response latency and error injection.
+
+usage: python benchmarks/fake_mydnsjp.py [--port 8080] [--rows 100] [--latency 0.05]
+    login with id=fake_id, pwd=fake_pwd, domainname=example.mydns.jp
+"""
+import argparse
+import base64
+import html
+import random
+import secrets
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+TYPES = ["A", "AAAA", "CNAME", "MX", "TXT", "DELEGATE"]
+PHASES = ["GET", "LOGIN", "CHECK", "CONFIRM", "DIRECTEDIT"]
+EMPTY_RECORD = ["", "A", "", "0"]
+
+class FakeAccount:
+    """
+    One MyDNS.JP account of the fake server.
+    """
+
+    def __init__(self, masterid: str, masterpwd: str, domainname: str, rows: int, filled_rows: int = 0) -> None:
+        self.masterid = masterid
+        self.masterpwd = masterpwd
+        self.domainname = domainname
+        self.records = []
+        for ix in range(rows):
+            if ix < filled_rows:
+                self.records.append([f"host{ix}", "A", f"192.0.2.{ix % 256}", "0"])
+            else:
+                self.records.append(list(EMPTY_RECORD))
+        self.lock = threading.Lock()
+
+    def get_txt_records(self) -> list:
+        """
+        Get (hostname, content) of all TXT rows.
+        """
+        with self.lock:
+            return [(record[0], record[2]) for record in self.records if record[1] == "TXT"]
+
+class FakeMyDNSJP:
+    """
+    State and settings of the fake server.
+    """
+
+    def __init__(self, latency: float = 0.0, error_rate: float = 0.0, expire_rate: float = 0.0) -> None:
+        """
+        :param latency: seconds added to every response
+        :param error_rate: probability of HTTP 500 response at each request
+        :param expire_rate: probability of a logged-in session expiring at each request
+        """
+        self.latency = latency
+        self.error_rate = error_rate
+        self.expire_rate = expire_rate
+        self.fail_next = {}
+        self.accounts = {}
+        self.sessions = {}
+        self.pending = {}
+        self.counts = {}
+        self.bytes_sent = 0
+        self.lock = threading.Lock()
+
+    def add_account(self, masterid: str, masterpwd: str, domainname: str, rows: int = 100, filled_rows: int = 0) -> FakeAccount:
+        account = FakeAccount(masterid, masterpwd, domainname, rows, filled_rows)
+        self.accounts[masterid] = account
+        return account
+
+    def fail(self, phase: str, times: int = 1) -> None:
+        """
+        Answer the next requests of a phase (see PHASES) with HTTP 500, whatever the error_rate.
+        """
+        with self.lock:
+            self.fail_next[phase] = self.fail_next.get(phase, 0) + times
+
+    def count(self, phase: str) -> None:
+        with self.lock:
+            self.counts[phase] = self.counts.get(phase, 0) + 1
+
+    def reset_counts(self) -> None:
+        with self.lock:
+            self.counts = {}
+            self.bytes_sent = 0
+
+    def total_requests(self) -> int:
+        with self.lock:
+            return sum(self.counts.values())
+
+def page_login() -> str:
+    return ('<html><body><h1>MyDNS.JP</h1>'
+            '<form action="/members/" method="post">'
+            '<input type="text" name="masterid" value="">'
+            '<input type="password" name="masterpwd" value="">'
+            '<input type="submit" name="MENU" value="LOGIN">'
+            '</form></body></html>')
+
+def page_domaininfo(account: FakeAccount, records: list, confirm: bool) -> str:
+    out = ['<html><body><h1>MyDNS.JP</h1>',
+           '<form action="/members/" method="post"><input type="submit" name="MENU" value="LOGOUT"></form>',
+           '<form action="/members/#domaininfo" method="post">',
+           f'<input type="text" name="DNSINFO[domainname]" value="{html.escape(account.domainname)}">']
+    for ix in range(4):
+        out.append(f'<input type="text" name="DNSINFO[mx][{ix}]" value=""><input type="text" name="DNSINFO[prio][{ix}]" value="">')
+    out.append('<table>')
+    for ix, (hostname, record_type, content, delegateid) in enumerate(records):
+        if confirm:
+            out.append(f'<tr><td>{html.escape(hostname)}</td><td>{record_type}</td><td>{html.escape(content)}</td></tr>')
+            out.append(f'<input type="hidden" name="DNSINFO[hostname][{ix}]" value="{html.escape(hostname)}">')
+            out.append(f'<input type="hidden" name="DNSINFO[type][{ix}]" value="{record_type}">')
+            out.append(f'<input type="hidden" name="DNSINFO[content][{ix}]" value="{html.escape(content)}">')
+            out.append(f'<input type="hidden" name="DNSINFO[delegateid][{ix}]" value="{delegateid}">')
+            continue
+        out.append(f'<tr><td><input type="text" name="DNSINFO[hostname][{ix}]" value="{html.escape(hostname)}"></td>')
+        out.append(f'<td><select name="DNSINFO[type][{ix}]">')
+        for option in TYPES:
+            selected = " selected" if option == record_type else ""
+            out.append(f'<option value="{option}"{selected}>{option}</option>')
+        out.append('</select></td>')
+        out.append(f'<td><input type="text" name="DNSINFO[content][{ix}]" value="{html.escape(content)}"></td>')
+        out.append(f'<td><select name="DNSINFO[delegateid][{ix}]"><option value="0" selected>-</option></select></td></tr>')
+    out.append('</table>')
+    if confirm:
+        out.append('<input type="submit" name="JOB" value="CONFIRM"><input type="submit" name="BACK" value="BACK">')
+    else:
+        out.append('<input type="submit" name="JOB" value="CHECK">')
+    out.append('</form></body></html>')
+    return "\n".join(out)
+
+def challenge_hostname(account: FakeAccount, domain: str) -> str:
+    if domain == account.domainname:
+        return "_acme-challenge"
+    return "_acme-challenge." + domain[:-len("." + account.domainname)]
+
+def make_handler(state: FakeMyDNSJP) -> type:
+    class FakeMyDNSJPHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args) -> None:
+            pass
+
+        def _session(self) -> str:
+            for part in self.headers.get("Cookie", "").split(";"):
+                key, _, value = part.strip().partition("=")
+                if key == "MYDNSJP_SID" and value in state.sessions:
+                    if random.random() < state.expire_rate:
+                        state.sessions.pop(value, None)
+                        return None
+                    return value
+            return None
+
+        def _send(self, status: int, body: str, session: str = None) -> None:
+            if state.latency > 0:
+                time.sleep(state.latency)
+            data = body.encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(data)))
+            if session is not None:
+                self.send_header("Set-Cookie", f"MYDNSJP_SID={session}; Path=/")
+            self.end_headers()
+            self.wfile.write(data)
+            with state.lock:
+                state.bytes_sent += len(data)
+
+        def _inject_error(self, phase: str) -> bool:
+            with state.lock:
+                forced = state.fail_next.get(phase, 0) > 0
+                if forced:
+                    state.fail_next[phase] -= 1
+            if forced or random.random() < state.error_rate:
+                self._send(500, "<html><body>Internal Server Error</body></html>")
+                return True
+            return False
+
+        def do_GET(self) -> None:
+            state.count("GET")
+            if self._inject_error("GET"):
+                return
+            session = self._session()
+            if session is None:
+                self._send(200, page_login())
+                return
+            account = state.accounts[state.sessions[session]]
+            with account.lock:
+                self._send(200, page_domaininfo(account, account.records, False))
+
+        def do_POST(self) -> None:
+            length = int(self.headers.get("Content-Length", 0))
+            form = {key: values[0] for key, values in urllib.parse.parse_qs(self.rfile.read(length).decode("utf-8"), keep_blank_values=True).items()}
+            if self.path.startswith("/directedit"):
+                self._directedit(form)
+                return
+            if "masterid" in form:
+                state.count("LOGIN")
+                if self._inject_error("LOGIN"):
+                    return
+                account = state.accounts.get(form["masterid"])
+                if account is None or account.masterpwd != form.get("masterpwd"):
+                    self._send(200, page_login())
+                    return
+                session = secrets.token_hex(16)
+                state.sessions[session] = account.masterid
+                with account.lock:
+                    self._send(200, page_domaininfo(account, account.records, False), session)
+                return
+            session = self._session()
+            if session is None:
+                self._send(200, page_login())
+                return
+            account = state.accounts[state.sessions[session]]
+            if form.get("JOB") == "CHECK":
+                state.count("CHECK")
+                if self._inject_error("CHECK"):
+                    return
+                records = []
+                for ix in range(len(account.records)):
+                    records.append([form.get(f"DNSINFO[hostname][{ix}]", ""), form.get(f"DNSINFO[type][{ix}]", "A"),
+                                    form.get(f"DNSINFO[content][{ix}]", ""), form.get(f"DNSINFO[delegateid][{ix}]", "0")])
+                state.pending[session] = records
+                self._send(200, page_domaininfo(account, records, True))
+            elif form.get("JOB") == "CONFIRM" and session in state.pending:
+                state.count("CONFIRM")
+                if self._inject_error("CONFIRM"):
+                    return
+                with account.lock:
+                    account.records[:] = state.pending.pop(session)
+                    self._send(200, page_domaininfo(account, account.records, False))
+            else:
+                self._send(200, page_login())
+
+        def _directedit(self, form: dict) -> None:
+            state.count("DIRECTEDIT")
+            if self._inject_error("DIRECTEDIT"):
+                return
+            authorization = self.headers.get("Authorization", "")
+            masterid, masterpwd = "", ""
+            if authorization.startswith("Basic "):
+                masterid, _, masterpwd = base64.b64decode(authorization[6:]).decode("utf-8").partition(":")
+            account = state.accounts.get(masterid)
+            if account is None or account.masterpwd != masterpwd:
+                self._send(401, "<html><body>Unauthorized</body></html>")
+                return
+            hostname = challenge_hostname(account, form.get("CERTBOT_DOMAIN", ""))
+            content = form.get("CERTBOT_VALIDATION", "")
+            with account.lock:
+                for record in account.records:
+                    if form.get("EDIT_CMD") == "REGIST" and record == EMPTY_RECORD:
+                        record[:3] = [hostname, "TXT", content]
+                        break
+                    if form.get("EDIT_CMD") == "DELETE" and record[:3] == [hostname, "TXT", content]:
+                        record[:] = EMPTY_RECORD
+                        break
+            self._send(200, "<html><body>OK</body></html>")
+
+    return FakeMyDNSJPHandler
+
+def serve(state: FakeMyDNSJP, host: str = "127.0.0.1", port: int = 0) -> ThreadingHTTPServer:
+    """
+    Start the fake server in a daemon thread.
+
+    :return: server object (server.server_port is the bound port)
+    """
+    server = ThreadingHTTPServer((host, port), make_handler(state))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Local stand-in of the MyDNS.JP web interface.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--rows", type=int, default=100, help="DNSINFO record rows of the zone")
+    parser.add_argument("--filled-rows", type=int, default=0, help="rows filled with A records")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="probability of HTTP 500 per request")
+    parser.add_argument("--expire-rate", type=float, default=0.0, help="probability of session expiry per request")
+    args = parser.parse_args()
+    state = FakeMyDNSJP(args.latency, args.error_rate, args.expire_rate)
+    state.add_account("fake_id", "fake_pwd", "example.mydns.jp", args.rows, args.filled_rows)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(state))
+    print(f"fake MyDNS.JP on http://{args.host}:{server.server_port}/members/ (id=fake_id pwd=fake_pwd)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,30 @@
+import concurrent.futures
+import logging
+import time
+
 from certbot import errors
+from certbot.display import util as display_util
 from certbot.plugins import dns_common
 
+from certbot_dns_mydnsjp.mydnsjp.backend import (
+    DEFAULT_CONNECT_TIMEOUT, DEFAULT_DEADLINE, DEFAULT_MAX_RETRIES, DEFAULT_READ_TIMEOUT, RequestPolicy)
+from certbot_dns_mydnsjp.mydnsjp.broker import BrokerClient
 from certbot_dns_mydnsjp.mydnsjp.client import MyDNSJPClient
+from certbot_dns_mydnsjp.mydnsjp.cookies import COOKIE_CACHE_SUFFIX, DEFAULT_COOKIE_CACHE_TTL, CookieCache
+from certbot_dns_mydnsjp.mydnsjp.deferred import deferred_cleanups
+from certbot_dns_mydnsjp.mydnsjp.errors import TxtRecordMissingMyDnsJpError
+from certbot_dns_mydnsjp.mydnsjp.journal import JOURNAL_SUFFIX, TxtJournal
+from certbot_dns_mydnsjp.mydnsjp.lock import LOCK_DIR_SUFFIX
+from certbot_dns_mydnsjp.mydnsjp.metrics import PROMETHEUS_TEXTFILE_MODE, MetricsRecorder
+from certbot_dns_mydnsjp.mydnsjp.ratelimit import (
+    DEFAULT_ACCOUNT_BURST, DEFAULT_ACCOUNT_RATE, DEFAULT_HOST_BURST, DEFAULT_HOST_RATE, RateLimiter)
+from certbot_dns_mydnsjp.mydnsjp.propagation import DEFAULT_POLL_INTERVAL, MYDNSJP_NAMESERVERS, PropagationChecker
+from certbot_dns_mydnsjp.mydnsjp.session import MyDNSJPSessionManager
+
+logger = logging.getLogger(__name__)
 
 DEFAULT_PROPAGATION_SECONDS = 30
+DEFAULT_MAX_CONCURRENCY = 4
 ACME_CHALLENGE_TXT_PREFIX = "_acme-challenge"
 
 class Authenticator(dns_common.DNSAuthenticator):
@@ -13,12 +34,20 @@ class Authenticator(dns_common.DNSAuthenticator):
 
     description = "Obtain certificates using a DNS TXT record with MyDNS.JP"
     _mydnsjp_client = None
+    _mydnsjp_broker = None
+    _mydnsjp_prefetch_futures = None
+    _mydnsjp_session_manager = None
+    _mydnsjp_metrics = None
     _prev_txt_contents = None
 
     def __init__(self, *args, **kwargs) -> None:
         super(Authenticator, self).__init__(*args, **kwargs)
         self._mydnsjp_client = None
-        self._prev_txt_contents = None
+        self._mydnsjp_broker = None
+        self._mydnsjp_prefetch_futures = []
+        self._mydnsjp_session_manager = MyDNSJPSessionManager()
+        self._mydnsjp_metrics = MetricsRecorder()
+        self._prev_txt_contents = {}
 
     @classmethod
     def add_parser_arguments(cls, add: callable) -> None:
@@ -34,6 +63,93 @@ class Authenticator(dns_common.DNSAuthenticator):
             default=False,
             action="store_true",
             help="Do not restore the original TXT record")
+        add("max-concurrency",
+            default=DEFAULT_MAX_CONCURRENCY,
+            type=int,
+            help="Maximum number of MyDNS.JP accounts updated concurrently (1 = one after another)")
+        add("propagation-poll",
+            default=False,
+            action="store_true",
+            help="Poll the MyDNS.JP nameservers until the TXT records are visible instead of a fixed wait "
+                 "(propagation-seconds is used as the maximum wait)")
+        add("propagation-nameservers",
+            default=",".join(MYDNSJP_NAMESERVERS),
+            help="Comma separated nameservers (host[:port]) polled by propagation-poll")
+        add("propagation-poll-interval",
+            default=DEFAULT_POLL_INTERVAL,
+            type=float,
+            help="Seconds between polls of propagation-poll")
+        add("metrics-textfile",
+            default=None,
+            help="Write per-phase timing metrics in Prometheus text format to this file after cleanup "
+                 "(e.g. for the node exporter textfile collector), readable only by the owner")
+        add("metrics-textfile-world-readable",
+            default=False,
+            action="store_true",
+            help="Write metrics-textfile with mode 0644, e.g. for a node exporter running as another user")
+        add("connect-timeout",
+            default=DEFAULT_CONNECT_TIMEOUT,
+            type=float,
+            help="Seconds to wait the connection of each MyDNS.JP request")
+        add("read-timeout",
+            default=DEFAULT_READ_TIMEOUT,
+            type=float,
+            help="Seconds to wait the response data of each MyDNS.JP request")
+        add("deadline",
+            default=DEFAULT_DEADLINE,
+            type=float,
+            help="Seconds allowed for one MyDNS.JP update including retries")
+        add("max-retries",
+            default=DEFAULT_MAX_RETRIES,
+            type=int,
+            help="Maximum retries of each MyDNS.JP request phase on transient failures (0 = no retry)")
+        add("rate-limit",
+            default=DEFAULT_ACCOUNT_RATE,
+            type=float,
+            help="Requests per second sent for one MyDNS.JP account (0 = no limit, the default)")
+        add("rate-burst",
+            default=DEFAULT_ACCOUNT_BURST,
+            type=int,
+            help="Requests of one MyDNS.JP account sent without waiting after an idle time")
+        add("host-rate-limit",
+            default=DEFAULT_HOST_RATE,
+            type=float,
+            help="Requests per second sent to one MyDNS.JP host for all accounts (0 = no limit, the default)")
+        add("host-rate-burst",
+            default=DEFAULT_HOST_BURST,
+            type=int,
+            help="Requests to one MyDNS.JP host sent without waiting after an idle time")
+        add("lock-dir",
+            default=None,
+            help="Directory of the lock files serializing updates of a MyDNS.JP account between certbot processes, "
+                 "owned by the user with mode 0700 (default: the credentials INI file path + '.locks')")
+        add("session-cache",
+            default=False,
+            action="store_true",
+            help="Save logged-in MyDNS.JP sessions next to the credentials INI file (readable only by the owner) "
+                 "and reuse them in later runs to skip the login")
+        add("session-cache-ttl",
+            default=DEFAULT_COOKIE_CACHE_TTL,
+            type=float,
+            help="Seconds a saved MyDNS.JP session is reused after its login")
+        add("prefetch",
+            default=False,
+            action="store_true",
+            help="Login and read the MyDNS.JP domain info of all accounts in the background when the plugin is prepared, "
+                 "while certbot gets the challenges from the ACME server")
+        add("journal",
+            default=None,
+            help="Journal file of the TXT values set by the plugin, read by certbot-dns-mydnsjp-sweep "
+                 "(default: the credentials INI file path + '.journal')")
+        add("deferred-cleanup",
+            default=False,
+            action="store_true",
+            help="Keep the TXT records of a certificate until the next certificate of the same MyDNS.JP account "
+                 "is performed, and clear them in the same domain info submission (the rest are cleared at exit)")
+        add("broker-socket",
+            default=None,
+            help="UNIX socket of certbot-dns-mydnsjp-broker, update TXT records through the broker "
+                 "(credentials are read by the broker)")
 
     def more_info(self) -> str:
         """
@@ -44,7 +160,21 @@ class Authenticator(dns_common.DNSAuthenticator):
         """
         return "This plugin configures a DNS TXT record to respond to a DNS-01 challenge using the MyDNS.JP web interface."
 
+    def prepare(self) -> None:
+        """
+        Start the prefetch of all accounts if prefetch is set.
+        """
+        if not self.conf("prefetch") or self.conf("broker-socket") is not None:
+            return
+        self._setup_credentials()
+        self._start_prefetch()
+
     def _setup_credentials(self) -> None:
+        if self._mydnsjp_client is not None or self._mydnsjp_broker is not None:
+            return
+        if self.conf("broker-socket") is not None:
+            self._mydnsjp_broker = BrokerClient(self.conf("broker-socket"))
+            return
         self._configure_file('credentials',
                              'MyDNS.JP credentials INI file')
         dns_common.validate_file_permissions(self.conf('credentials'))
@@ -55,13 +185,72 @@ class Authenticator(dns_common.DNSAuthenticator):
                 "credential": "INI file contains that\n[dns_mydnsjp_credential]\n[[MyDnsJpDomain1]]\n'id'='MyDnsJpId1'\n'pwd'='MyDnsJpPwd1'\n[[MyDnsJpDomain2]]\n'id'='MyDnsJpId2'\n'pwd'='MyDnsJpPwd2'\n...}",
             },
         )
+        if self.conf("session-cache"):
+            self._mydnsjp_session_manager.set_cookie_cache(CookieCache(self.conf("credentials") + COOKIE_CACHE_SUFFIX,
+                                                                       self.conf("session-cache-ttl"),
+                                                                       dns_common.validate_file_permissions))
         # create MyDNSJPClient with validate credential format
         try:
             credential = self.credentials.conf("credential")
-            self._mydnsjp_client = MyDNSJPClient(credential)
+            policy = RequestPolicy(self.conf("connect-timeout"), self.conf("read-timeout"), self.conf("deadline"), max(self.conf("max-retries"), 0))
+            journal = TxtJournal(self.conf("journal") or self.conf("credentials") + JOURNAL_SUFFIX)
+            limiter = RateLimiter(self.conf("rate-limit"), self.conf("rate-burst"), self.conf("host-rate-limit"), self.conf("host-rate-burst"))
+            self._mydnsjp_client = MyDNSJPClient(credential, self._mydnsjp_session_manager, metrics=self._mydnsjp_metrics, policy=policy,
+                                                 lock_dir=self.conf("lock-dir") or self.conf("credentials") + LOCK_DIR_SUFFIX,
+                                                 journal=journal, limiter=limiter)
         except Exception as e:
             raise errors.PluginError(e)
 
+    def perform(self, achalls: list) -> list:
+        """
+        Add the TXT records of all challenges, one domain info submission per MyDNS.JP account.
+
+        :param achalls: annotated challenges to perform
+        :return: list of challenge responses
+        :raise PluginError: if the TXT record can not be set of something goes wrong
+        """
+        self._setup_credentials()
+        self._stop_prefetch()
+        self._attempt_cleanup = True
+        responses = []
+        records = []
+        for achall in achalls:
+            records.append((achall.domain, achall.validation(achall.account_key)))
+            responses.append(achall.response(achall.account_key))
+        self._perform_records(records)
+        if self.conf("propagation-poll"):
+            self._wait_propagation(records)
+        else:
+            display_util.notify("Waiting %d seconds for DNS changes to propagate" % self.conf("propagation-seconds"))
+            start = time.perf_counter()
+            time.sleep(self.conf("propagation-seconds"))
+            self._mydnsjp_metrics.record("propagation", "", "", time.perf_counter() - start)
+        return responses
+
+    def cleanup(self, achalls: list) -> None:
+        """
+        Clear the TXT records of all challenges, one domain info submission per MyDNS.JP account.
+        Close the MyDNS.JP sessions after that.
+
+        :param achalls: annotated challenges to clean up
+        :raise PluginError: if the TXT record can not be cleared of something goes wrong
+        """
+        try:
+            self._stop_prefetch()
+            if self._mydnsjp_client is not None:
+                self._mydnsjp_client.cancel_prefetch()
+            if self._attempt_cleanup:
+                records = []
+                for achall in achalls:
+                    records.append((achall.domain, achall.validation(achall.account_key)))
+                self._cleanup_records(records)
+        finally:
+            session_manager = self._mydnsjp_session_manager
+            logger.info("MyDNS.JP logins: %d, logins avoided by session reuse: %d",
+                        session_manager.logins, session_manager.logins_avoided)
+            session_manager.close()
+            self._write_metrics()
+
     def _perform(self, domain: str, validation_name: str, validation: str) -> None:
         """
         Add the TXT record of the provided domain using MyDNS.JP.
@@ -71,15 +260,7 @@ class Authenticator(dns_common.DNSAuthenticator):
         :param validation: the value for the TXT record
         :raise PluginError: if the TXT record can not be set of something goes wrong
         """
-
-        challenge_domain = ACME_CHALLENGE_TXT_PREFIX + "." + domain
-        try:
-            # get the MyDNS.JP credential
-            credential = self._get_mydnsjp_client().get_mydnsjp_credential(domain)
-            # set TXT value for acme_challenge
-            self._prev_txt_contents = self._get_mydnsjp_client().set_txt_record(credential, challenge_domain, validation)
-        except Exception as e:
-            raise errors.PluginError(e)
+        self._perform_records([(domain, validation)])
 
     def _cleanup(self, domain: str, validation_name: str, validation: str) -> None:
         """
@@ -91,17 +272,209 @@ class Authenticator(dns_common.DNSAuthenticator):
         :param validation: the value for the TXT record
         :raise PluginError: if the TXT record can not be cleared of something goes wrong
         """
+        self._cleanup_records([(domain, validation)])
+
+    def _perform_records(self, records: list) -> None:
+        """
+        Add the TXT records grouped by MyDNS.JP account.
+
+        :param records: list of (domain, validation) tuple
+        :raise PluginError: if the TXT record can not be set of something goes wrong
+        """
+        if self._mydnsjp_broker is not None:
+            challenge_records = []
+            for domain, validation in records:
+                challenge_records.append((ACME_CHALLENGE_TXT_PREFIX + "." + domain, validation))
+            start = time.perf_counter()
+            try:
+                prev_contents = self._mydnsjp_broker.set_txt_records(challenge_records)
+            except Exception as e:
+                raise errors.PluginError(e)
+            finally:
+                self._mydnsjp_metrics.record("perform", "", ",".join(domain for domain, validation in records), time.perf_counter() - start)
+            for challenge_record, prev_content in zip(challenge_records, prev_contents):
+                self._prev_txt_contents[challenge_record] = prev_content
+            return
+
+        def perform_account(credential: dict, account_records: list) -> None:
+            challenge_records = []
+            for domain, validation in account_records:
+                challenge_records.append((ACME_CHALLENGE_TXT_PREFIX + "." + domain, validation))
+            client = self._get_mydnsjp_client()
+            pending = deferred_cleanups.take(credential["id"]) if self.conf("deferred-cleanup") else None
+            prev_contents = None
+            if pending is not None:
+                # clear TXT values of previous certificates and set TXT values for acme_challenge at once
+                try:
+                    prev_contents = client.update_txt_records(credential, pending[2], challenge_records, missing_ok=True)
+                except TxtRecordMissingMyDnsJpError as e:
+                    # a queued value is already gone and the backend could not skip it,
+                    # it must not block this and later certificates of the account
+                    logger.warning("Deferred MyDNS.JP TXT records of %s (%s) already removed, set the challenges alone: %s",
+                                   credential["id"], ",".join(domain for domain, content, prev_content in pending[2]), e)
+                except Exception:
+                    # e.g. the update may have been applied, the lock or the login failed, the flush at exit clears them
+                    deferred_cleanups.add(*pending)
+                    raise
+            if prev_contents is None:
+                # set TXT values for acme_challenge
+                prev_contents = client.set_txt_records(credential, challenge_records)
+            for challenge_record, prev_content in zip(challenge_records, prev_contents):
+                self._prev_txt_contents[challenge_record] = prev_content
+
+        self._run_per_account(perform_account, records, "perform")
+
+    def _cleanup_records(self, records: list) -> None:
+        """
+        Clear the TXT records grouped by MyDNS.JP account.
+        Restore the previous TXT values unless no-txt-restore is set.
+
+        :param records: list of (domain, validation) tuple
+        :raise PluginError: if the TXT record can not be cleared of something goes wrong
+        """
+        challenge_records = {}
+        for domain, validation in records:
+            challenge_record = (ACME_CHALLENGE_TXT_PREFIX + "." + domain, validation)
+            prev_content = self._prev_txt_contents.pop(challenge_record, None)
+            if self.conf("no-txt-restore"):
+                prev_content = None
+            challenge_records[(domain, validation)] = challenge_record + (prev_content,)
+
+        if self._mydnsjp_broker is not None:
+            start = time.perf_counter()
+            try:
+                self._mydnsjp_broker.clear_txt_records(list(challenge_records.values()))
+            except Exception as e:
+                raise errors.PluginError(e)
+            finally:
+                self._mydnsjp_metrics.record("cleanup", "", ",".join(domain for domain, validation in records), time.perf_counter() - start)
+            return
+
+        def cleanup_account(credential: dict, account_records: list) -> None:
+            account_challenge_records = []
+            for record in account_records:
+                account_challenge_records.append(challenge_records[record])
+            if self.conf("deferred-cleanup"):
+                # cleared by the next perform of the account or at exit
+                deferred_cleanups.add(self._get_mydnsjp_client(), credential, account_challenge_records)
+                return
+            # delete or restore TXT values for acme_challenge
+            self._get_mydnsjp_client().clear_txt_records(credential, account_challenge_records)
+
+        self._run_per_account(cleanup_account, records, "cleanup")
+
+    def _start_prefetch(self) -> None:
+        """
+        Prefetch the domain info of each MyDNS.JP account in background threads.
+        """
+        accounts = {}
+        for credential in self.credentials.conf("credential").values():
+            accounts[credential["id"]] = credential
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=min(max(self.conf("max-concurrency"), 1), max(len(accounts), 1)))
+
+        def prefetch_account(credential: dict) -> None:
+            try:
+                self._get_mydnsjp_client().prefetch(credential)
+            except Exception as e:
+                logger.debug("MyDNS.JP prefetch of %s skipped: %s", credential["id"], e)
+
+        for credential in accounts.values():
+            self._mydnsjp_prefetch_futures.append(executor.submit(prefetch_account, credential))
+        executor.shutdown(wait=False)
+
+    def _stop_prefetch(self) -> None:
+        """
+        Cancel prefetches not started yet, running prefetches finish in background
+        (the update of the account waits them by the account lock).
+        """
+        for future in self._mydnsjp_prefetch_futures:
+            future.cancel()
+        self._mydnsjp_prefetch_futures = []
 
-        challenge_domain = ACME_CHALLENGE_TXT_PREFIX + "." + domain
-        if self.conf("no-txt-restore"):
-            self._prev_txt_contents = None
+    def _wait_propagation(self, records: list) -> None:
+        """
+        Poll the MyDNS.JP nameservers until the TXT records are visible, at most propagation-seconds.
+
+        :param records: list of (domain, validation) tuple
+        """
+        display_util.notify("Waiting up to %d seconds for DNS changes to propagate" % self.conf("propagation-seconds"))
+        nameservers = [nameserver for nameserver in self.conf("propagation-nameservers").split(",") if nameserver.strip() != ""]
+        txt_records = []
+        for domain, validation in records:
+            txt_records.append((ACME_CHALLENGE_TXT_PREFIX + "." + domain, validation))
+        result = PropagationChecker(nameservers).wait(txt_records, self.conf("propagation-seconds"), self.conf("propagation-poll-interval"))
+        for name, elapsed in result.items():
+            if elapsed is None:
+                elapsed = float(self.conf("propagation-seconds"))
+            self._mydnsjp_metrics.record("propagation", "", name, elapsed)
+
+    def _write_metrics(self) -> None:
+        """
+        Write the phase metrics to metrics-textfile if it is set.
+        """
+        if self.conf("metrics-textfile") is None:
+            return
         try:
-            # get the MyDNS.JP credential
-            credential = self._get_mydnsjp_client().get_mydnsjp_credential(domain)
-            # delete or restore TXT value for acme_challenge
-            self._get_mydnsjp_client().clear_txt_record(credential, challenge_domain, validation, self._prev_txt_contents)
+            mode = 0o644 if self.conf("metrics-textfile-world-readable") else PROMETHEUS_TEXTFILE_MODE
+            self._mydnsjp_metrics.write_prometheus_textfile(self.conf("metrics-textfile"), mode)
+        except Exception as e:
+            logger.warning("Failed to write MyDNS.JP metrics to %s: %s", self.conf("metrics-textfile"), e)
+
+    def _run_per_account(self, func: callable, records: list, phase: str) -> None:
+        """
+        Run func for each MyDNS.JP account concurrently, up to max-concurrency accounts at a time.
+
+        :param func: function called with (credential, list of (domain, validation) tuple) of an account
+        :param records: list of (domain, validation) tuple
+        :param phase: phase name recorded to metrics for each account
+        :raise PluginError: with errors of all failed domains, after all accounts are finished
+        """
+        try:
+            groups = self._group_by_credential(records)
         except Exception as e:
             raise errors.PluginError(e)
+        def run_account(credential: dict, account_records: list) -> None:
+            start = time.perf_counter()
+            try:
+                func(credential, account_records)
+            finally:
+                domain_label = ",".join(domain for domain, validation in account_records)
+                self._mydnsjp_metrics.record(phase, credential["id"], domain_label, time.perf_counter() - start)
+
+        max_workers = min(max(self.conf("max-concurrency"), 1), max(len(groups), 1))
+        failures = []
+        if max_workers <= 1:
+            for credential, account_records in groups:
+                try:
+                    run_account(credential, account_records)
+                except Exception as e:
+                    failures.append((account_records, e))
+        else:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+                futures = {}
+                for credential, account_records in groups:
+                    futures[executor.submit(run_account, credential, account_records)] = account_records
+                for future in concurrent.futures.as_completed(futures):
+                    try:
+                        future.result()
+                    except Exception as e:
+                        failures.append((futures[future], e))
+        if len(failures) > 0:
+            messages = []
+            for account_records, e in failures:
+                for domain, validation in account_records:
+                    messages.append(f"{domain}: {e}")
+            raise errors.PluginError("\n".join(messages))
+
+    def _group_by_credential(self, records: list) -> list:
+        """
+        Group records by the MyDNS.JP credential of its domain.
+
+        :param records: list of (domain, validation) tuple
+        :return: list of (credential, list of (domain, validation) tuple) tuple
+        :raise UpdateMyDnsJpError: if no credential found for a domain
+        """
+        return self._get_mydnsjp_client().group_by_credential(records, lambda record: record[0])
 
     def _get_mydnsjp_client(self) -> MyDNSJPClient:
         """
@@ -0,0 +1,531 @@
+import asyncio
+import codecs
+import logging
+import time
+import urllib.parse
+
+from certbot_dns_mydnsjp.mydnsjp.backend import (
+    RequestContext, RequestPolicy, get_maybe_applied_error, get_remaining, get_retry_backoff, is_retry_status)
+from certbot_dns_mydnsjp.mydnsjp.client import MAX_CONFLICT_RETRIES, validate_credential
+from certbot_dns_mydnsjp.mydnsjp.domaininfo import DomainInfo
+from certbot_dns_mydnsjp.mydnsjp.errors import (
+    ConflictMyDnsJpError, MaybeAppliedMyDnsJpError, SessionExpiredMyDnsJpError, UpdateMyDnsJpError)
+from certbot_dns_mydnsjp.mydnsjp.journal import TxtJournal
+from certbot_dns_mydnsjp.mydnsjp.lock import DEFAULT_LOCK_DIR, DEFAULT_LOCK_TIMEOUT, AccountLock
+from certbot_dns_mydnsjp.mydnsjp.metrics import MetricsRecorder
+from certbot_dns_mydnsjp.mydnsjp.ratelimit import RateLimiter
+from certbot_dns_mydnsjp.mydnsjp.resolver import CredentialResolver
+from certbot_dns_mydnsjp.mydnsjp.scraping import (
+    DOMAININFO_FORM_ACTION, LOGIN_FORM_ACTION, MYDNSJP_LOGIN_URL, STREAM_CHUNK_SIZE, STREAM_DRAIN_LIMIT, FormParser,
+    check_domain_info, get_confirm_request, get_confirmed_domain_info, get_login_request, get_unverified_error, get_update_changes,
+    prepare_txt_update, rollback_txt_update)
+from certbot_dns_mydnsjp.mydnsjp.session import DEFAULT_POOL_MAXSIZE
+from certbot_dns_mydnsjp.mydnsjp.slots import TxtSlotAllocator
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+logger = logging.getLogger(__name__)
+
+class AsyncMyDNSJPClient:
+    """
+    asyncio client for clearing, setting the TXT record using the members page of MyDNS.JP (requires aiohttp).
+    The semantics are the same as MyDNSJPClient: one submission per account, one TXT row per value,
+    account locks shared with the sync client and the plugin, verification after confirm and conflict retries.
+    The forms, TXT rows and retries are decided by the same functions as ScrapingBackend, only the I/O differs.
+    All accounts use the members page,
+    DirectEDIT selected by 'backend' is not used.
+    One connection pool is shared by all accounts, each account has its own cookies.
+    A cancelled call sends no further request, and its allocated TXT rows are released.
+    """
+
+    def __init__(self, credential: dict, policy: RequestPolicy = None, limiter: RateLimiter = None, metrics: MetricsRecorder = None,
+                 lock_dir: str = DEFAULT_LOCK_DIR, lock_timeout: float = DEFAULT_LOCK_TIMEOUT, journal: TxtJournal = None,
+                 login_url: str = MYDNSJP_LOGIN_URL, pool_maxsize: int = DEFAULT_POOL_MAXSIZE) -> None:
+        """
+        Creates a new AsyncMyDNSJPClient object. The sessions are created in the running event loop when first used.
+
+        :param credential: the MyDNS.JP credential used for MyDNS.JP web interface
+        :param policy: timeouts and retry settings or None (default settings)
+        :param limiter: rate limiter or None (default limits)
+        :param metrics: recorder of phase metrics or None (create a new one)
+        :param lock_dir: directory of per-account lock files
+        :param lock_timeout: seconds to wait the lock of an account
+        :param journal: journal of TXT values set by this client or None
+        :param login_url: url of the members page
+        :param pool_maxsize: maximum number of pooled connections per account
+
+        :raise NotValidMyDnsJpCredentialError: if the credential is not a valid format for dns_mydnsjp
+        :raise UpdateMyDnsJpError: if aiohttp is not installed
+        """
+        if aiohttp is None:
+            raise UpdateMyDnsJpError("AsyncMyDNSJPClient requires aiohttp. (pip install certbot_dns_mydnsjp[async])")
+        validate_credential(credential)
+        self._resolver = CredentialResolver(credential)
+        self._policy = policy if policy is not None else RequestPolicy()
+        self._limiter = limiter if limiter is not None else RateLimiter()
+        self._metrics = metrics if metrics is not None else MetricsRecorder()
+        self._lock_dir = lock_dir
+        self._lock_timeout = lock_timeout
+        self._journal = journal
+        self._login_url = login_url
+        self._pool_limit = pool_maxsize * len(set(cred_val["id"] for cred_val in credential.values()))
+        self._slots = TxtSlotAllocator()
+        self._connector = None
+        self._sessions = {}
+        self._account_locks = {}
+
+    async def close(self) -> None:
+        """
+        Close the sessions and the connection pool.
+        """
+        sessions = list(self._sessions.values())
+        self._sessions.clear()
+        for s in sessions:
+            await s.close()
+        if self._connector is not None:
+            await self._connector.close()
+            self._connector = None
+
+    async def __aenter__(self) -> "AsyncMyDNSJPClient":
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback) -> None:
+        await self.close()
+
+    def get_mydnsjp_credential(self, domain) -> dict:
+        """
+        Get the credential of the longest domain key which is the domain or its parent domain.
+
+        :param domain: fully qualified domain name
+
+        :return: credential
+
+        :raise UpdateMyDnsJpError: if no credential found for the domain
+        """
+        result = self._resolver.resolve(domain)
+        if result is None:
+            raise UpdateMyDnsJpError(f"Not found mydnsjp_credential for domain '{domain}'")
+        return result
+
+    def group_by_credential(self, items: list, key: callable = None) -> list:
+        """
+        Group items by the credential of their domains, in order of the first item of each account.
+
+        :param items: list of domain, or of any item with key
+        :param key: callable(item) returning the domain of an item or None (the item is the domain)
+
+        :return: list of (credential, list of item) tuple, one per MyDNS.JP account
+
+        :raise UpdateMyDnsJpError: if no credential found for a domain
+        """
+        return self._resolver.group(items, key)
+
+    async def set_txt_record(self, credential: dict, domain: str, content: str) -> str:
+        """
+        Set the TXT record value for a specific MyDNS.JP domain.
+
+        :param credential: the MyDNS.JP credential used for MyDNS.JP web interface
+        :param domain: acme_challenge full domain, provided MyDNS.JP credential must have authority of this domain.
+        :param content: the string value to set as TXT record
+
+        :return: previous TXT record value or None
+
+        :raise UpdateMyDnsJpError: if unexpected sequence occured
+        """
+        return (await self.set_txt_records(credential, [(domain, content)]))[0]
+
+    async def set_txt_records(self, credential: dict, records: list) -> list:
+        """
+        Set TXT record values for domains of one MyDNS.JP account in a single submission.
+
+        :param credential: credential used for MyDNS.JP web interface
+        :param records: list of (domain, content) tuple, provided MyDNS.JP credential must have authority of all domains.
+
+        :return: list of previous TXT record value or None, in order of records
+
+        :raise UpdateMyDnsJpError: if unexpected sequence occured
+        """
+        if self._journal is None:
+            return await self._run_locked(credential, self._set_txt_records, records)
+        loop = asyncio.get_running_loop()
+        # journaled before the submission, removed only if the update surely was not applied
+        await loop.run_in_executor(None, self._journal.record_intent, credential, records)
+        try:
+            result = await self._run_locked(credential, self._set_txt_records, records)
+        except MaybeAppliedMyDnsJpError:
+            raise
+        except Exception:
+            await loop.run_in_executor(None, self._journal.record_failed, credential, records)
+            raise
+        await loop.run_in_executor(None, self._journal.record_set, credential, records, result)
+        return result
+
+    async def clear_txt_record(self, credential: dict, domain: str, content: str, prev_content: str) -> None:
+        """
+        Clear the TXT record for a specific MyDNS.JP domain.
+
+        :param credential: the MyDNS.JP credential used for MyDNS.JP web interface
+        :param domain: acme_challenge full domain, provided MyDNS.JP credential must have authority of this domain.
+        :param content: the string value to set as TXT record
+        :param prev_content: string value of restoring TXT record or None (for remove)
+
+        :raise UpdateMyDnsJpError: if unexpected sequence occured
+        """
+        await self.clear_txt_records(credential, [(domain, content, prev_content)])
+        return None
+
+    async def clear_txt_records(self, credential: dict, records: list) -> None:
+        """
+        Clear TXT records for domains of one MyDNS.JP account in a single submission.
+
+        :param credential: the MyDNS.JP credential used for MyDNS.JP web interface
+        :param records: list of (domain, content, prev_content) tuple, prev_content is string value of restoring TXT record or None (for remove)
+
+        :raise UpdateMyDnsJpError: if unexpected sequence occured
+        """
+        try:
+            await self._run_locked(credential, self._clear_txt_records, records)
+        except BaseException:
+            # the clear is given up, its rows must not be kept for a later set of the same values
+            for domain, content, prev_content in records:
+                self._slots.forget(credential["id"], domain, content)
+            raise
+        if self._journal is not None:
+            await asyncio.get_running_loop().run_in_executor(None, self._journal.record_clear, credential, records)
+        return None
+
+    async def _run_locked(self, credential: dict, func: callable, records: list):
+        """
+        Run func with the lock of the account, retry it on conflict.
+        Coroutines of an account wait on an asyncio lock, the lock file is taken in a worker thread.
+
+        :param credential: credential used for MyDNS.JP web interface
+        :param func: coroutine function called with (ctx, records)
+        :param records: records passed to func
+
+        :return: result of func
+
+        :raise UpdateMyDnsJpError: if unexpected sequence occured or the conflict remained
+        """
+        account_lock = self._account_locks.setdefault(credential["id"], asyncio.Lock())
+        try:
+            await asyncio.wait_for(account_lock.acquire(), self._lock_timeout)
+        except asyncio.TimeoutError:
+            raise UpdateMyDnsJpError(f"Timeout waiting the lock of MyDNS.JP account. ({credential['id']})")
+        try:
+            lock = AccountLock(credential["id"], self._lock_dir, self._lock_timeout)
+            acquiring = asyncio.get_running_loop().run_in_executor(None, lock.acquire)
+            try:
+                await asyncio.shield(acquiring)
+            except asyncio.CancelledError:
+                # the worker thread cannot be stopped, release the lock when it is acquired
+                acquiring.add_done_callback(lambda f: lock.release() if not f.cancelled() and f.exception() is None else None)
+                raise
+            try:
+                attempt = 0
+                relogin = False
+                while True:
+                    ctx = RequestContext(credential, ",".join(record[0] for record in records), time.monotonic() + self._policy.deadline)
+                    try:
+                        return await func(ctx, records)
+                    except SessionExpiredMyDnsJpError as e:
+                        if relogin:
+                            e.retries = ctx.retries
+                            raise
+                        relogin = True
+                        logger.warning("MyDNS.JP session expired during the update, login again and retry: %s", e)
+                    except ConflictMyDnsJpError as e:
+                        if attempt >= MAX_CONFLICT_RETRIES:
+                            raise
+                        attempt += 1
+                        logger.warning("MyDNS.JP update conflicted, retry (%d/%d): %s", attempt, MAX_CONFLICT_RETRIES, e)
+                    except UpdateMyDnsJpError as e:
+                        e.retries = ctx.retries
+                        raise
+            finally:
+                lock.bump()
+                lock.release()
+        finally:
+            account_lock.release()
+
+    async def _set_txt_records(self, ctx: RequestContext, records: list) -> list:
+        """
+        Implementation of set_txt_records, called with the lock of the account.
+        """
+        return await self._update_txt_records(ctx, [], records)
+
+    async def _clear_txt_records(self, ctx: RequestContext, records: list) -> None:
+        """
+        Implementation of clear_txt_records, called with the lock of the account.
+        """
+        await self._update_txt_records(ctx, records, [])
+        return None
+
+    async def _update_txt_records(self, ctx: RequestContext, clear_records: list, set_records: list) -> list:
+        """
+        Clear TXT records then set TXT record values of one MyDNS.JP account in a single submission,
+        in the same steps as ScrapingBackend._update_txt_records.
+
+        :param ctx: context of this call
+        :param clear_records: list of (domain, content, prev_content) tuple
+        :param set_records: list of (domain, content) tuple
+
+        :return: list of previous TXT record value or None, in order of set_records
+
+        :raise UpdateMyDnsJpError: if unexpected sequence occured
+        """
+        s = self._get_session(ctx.credential)
+        request_url, domain_info = await self._fetch_domain_info(ctx, s)
+        account = ctx.credential["id"]
+        slots, released, expected = prepare_txt_update(self._slots, account, domain_info, clear_records, set_records)
+        try:
+            changes = get_update_changes(account, domain_info)
+            if len(changes) > 0:
+                confirmed_domain_info = await self._send_domain_info(ctx, s, request_url, domain_info, changes)
+                try:
+                    await self._verify_domain_info(ctx, s, expected, confirmed_domain_info)
+                except ConflictMyDnsJpError:
+                    raise
+                except UpdateMyDnsJpError as e:
+                    raise get_unverified_error(e)
+        except BaseException:
+            rollback_txt_update(self._slots, account, slots, released)
+            raise
+        return [slot.prev_content for slot in slots]
+
+    async def _fetch_domain_info(self, ctx: RequestContext, s: "aiohttp.ClientSession") -> tuple:
+        """
+        Fetch domain info form, login only if the session is not logged in.
+
+        :param ctx: context of this call
+        :param s: session of the credential
+
+        :return: tuple of (request url, domain info)
+
+        :raise UpdateMyDnsJpError: if unexpected sequence occured
+        """
+        request_url = self._login_url
+        status, parser = await self._request_forms(ctx, s, "login_get", "GET", request_url, [DOMAININFO_FORM_ACTION, LOGIN_FORM_ACTION],
+                                                   DOMAININFO_FORM_ACTION)
+        if status != 200:
+            raise UpdateMyDnsJpError("Abnormal response from MyDNS.JP web. (LOGIN)")
+        if parser.results[DOMAININFO_FORM_ACTION] is not None:
+            return request_url, DomainInfo(parser.results[DOMAININFO_FORM_ACTION])
+        request_method, request_url, login_form_data = get_login_request(request_url, parser, ctx.credential)
+        status, parser = await self._request_forms(ctx, s, "login_post", request_method, request_url, [DOMAININFO_FORM_ACTION],
+                                                   DOMAININFO_FORM_ACTION, data=login_form_data)
+        if status != 200:
+            raise UpdateMyDnsJpError("Abnormal response from MyDNS.JP web. (Get DomainInfo)")
+        if parser.results[DOMAININFO_FORM_ACTION] is None:
+            s.cookie_jar.clear()
+            raise UpdateMyDnsJpError("MyDNS.JP login failed. (DomainInfoForm missing)")
+        return request_url, DomainInfo(parser.results[DOMAININFO_FORM_ACTION])
+
+    async def _send_domain_info(self, ctx: RequestContext, s: "aiohttp.ClientSession", request_url: str, domain_info: DomainInfo,
+                                changes: list) -> DomainInfo:
+        """
+        Send domain info form and confirm it, if the changed rows are shown in the confirm page.
+        The confirm request is not retried after it may have reached MyDNS.JP.
+
+        :param ctx: context of this call
+        :param s: session of the credential
+        :param request_url: url of the page containing the domain info form
+        :param domain_info: domain info
+        :param changes: changed rows returned by domain_info.get_changes()
+
+        :return: domain info in the response of confirm or None if the response has no domain info form
+
+        :raise UpdateMyDnsJpError: if unexpected sequence occured
+        """
+        request_url = urllib.parse.urljoin(request_url, domain_info.action)
+        status, parser = await self._request_forms(ctx, s, "update", domain_info.method.upper(), request_url,
+                                                   [DOMAININFO_FORM_ACTION, LOGIN_FORM_ACTION], DOMAININFO_FORM_ACTION,
+                                                   data=domain_info.get_form_data())
+        try:
+            request_method, request_url, confirm_domain_info_form_data = get_confirm_request(request_url, status, parser, changes)
+        except SessionExpiredMyDnsJpError:
+            s.cookie_jar.clear()
+            raise
+        status, parser = await self._request_forms(ctx, s, "confirm", request_method, request_url, [DOMAININFO_FORM_ACTION, LOGIN_FORM_ACTION],
+                                                   DOMAININFO_FORM_ACTION, replayable=False, data=confirm_domain_info_form_data)
+        try:
+            return get_confirmed_domain_info(status, parser)
+        except SessionExpiredMyDnsJpError:
+            s.cookie_jar.clear()
+            raise
+
+    async def _verify_domain_info(self, ctx: RequestContext, s: "aiohttp.ClientSession", expected: list,
+                                  domain_info: DomainInfo = None) -> None:
+        """
+        Check the TXT records in the domain info returned by confirm, or read the domain info again if there is none.
+
+        :param ctx: context of this call
+        :param s: session of the credential
+        :param expected: list of (hostname, content, present) tuple, present is True if the TXT value must exist
+        :param domain_info: domain info in the response of confirm or None
+
+        :raise ConflictMyDnsJpError: if a TXT value is not as expected
+        :raise UpdateMyDnsJpError: if unexpected sequence occured
+        """
+        if len(expected) == 0:
+            return
+        if domain_info is None:
+            request_url, domain_info = await self._fetch_domain_info(ctx, s)
+        check_domain_info(domain_info, expected)
+
+    async def _request_forms(self, ctx: RequestContext, s: "aiohttp.ClientSession", phase: str, method: str, url: str, targets: list,
+                             stop_target: str, replayable: bool = True, data: dict = None) -> tuple:
+        """
+        Send a HTTP request and parse the forms of the response while it is streamed.
+        Reading stops as soon as the stop_target form is closed.
+
+        :param ctx: context of this call
+        :param s: session of the credential
+        :param phase: phase name of the request
+        :param method: HTTP method
+        :param url: request url
+        :param targets: actions of the forms to extract
+        :param stop_target: action of the form after which the rest of the page is not parsed
+        :param replayable: True if sending the request twice is harmless
+        :param data: form data to send or None
+
+        :return: tuple of (HTTP status, parser of the last attempt or None if the response is not 200)
+        """
+        parsers = []
+
+        async def consume(r: "aiohttp.ClientResponse") -> int:
+            parser = FormParser(targets, stop_target)
+            parsers.append(parser)
+            decoder = codecs.getincrementaldecoder(r.charset or "utf-8")(errors="replace")
+            received = 0
+            async for chunk in r.content.iter_chunked(STREAM_CHUNK_SIZE):
+                received += len(chunk)
+                if parser.feed(decoder.decode(chunk)):
+                    # read a short rest without parsing to keep the connection alive
+                    return received + await self._drain(r)
+            parser.feed(decoder.decode(b"", True))
+            return received
+
+        status = await self._request(ctx, s, phase, method, url, replayable=replayable, consume=consume, data=data)
+        if status != 200 or len(parsers) == 0:
+            return status, None
+        return status, parsers[-1]
+
+    async def _drain(self, r: "aiohttp.ClientResponse") -> int:
+        """
+        Read a response body without parsing, only a short one is read to the end to keep the connection alive.
+
+        :param r: streamed response
+
+        :return: bytes read
+        """
+        received = 0
+        async for chunk in r.content.iter_chunked(STREAM_CHUNK_SIZE):
+            received += len(chunk)
+            if received > STREAM_DRAIN_LIMIT:
+                break
+        return received
+
+    async def _request(self, ctx: RequestContext, s: "aiohttp.ClientSession", phase: str, method: str, url: str, replayable: bool = True,
+                       consume: callable = None, data: dict = None) -> int:
+        """
+        Send a HTTP request with timeouts, retry transient failures and record the phase metric of each attempt,
+        the retries are decided by the same functions as MyDNSJPBackend._request.
+
+        :param ctx: context of the call
+        :param s: session of the credential
+        :param phase: phase name of the request
+        :param method: HTTP method
+        :param url: request url
+        :param replayable: True if sending the request twice is harmless
+        :param consume: coroutine function(response) reading the body of a 200 response and returning the bytes read
+        :param data: form data to send or None
+
+        :return: HTTP status (may be an error if retries are exhausted)
+
+        :raise MaybeAppliedMyDnsJpError: if a not replayable request failed after it may have been sent
+        :raise UpdateMyDnsJpError: if the request failed or the deadline exceeded
+        """
+        body = urllib.parse.urlencode(data) if data is not None else None
+        host = urllib.parse.urlsplit(url).hostname
+        attempt = 0
+        while True:
+            remaining = get_remaining(ctx, phase)
+            waited = self._limiter.reserve(ctx.credential["id"], host, ctx.deadline)
+            if waited > 0:
+                await asyncio.sleep(waited)
+                self._metrics.record("ratelimit_wait", ctx.credential["id"], ctx.domain, waited)
+                remaining = get_remaining(ctx, phase)
+            timeout = aiohttp.ClientTimeout(total=remaining, sock_connect=min(self._policy.connect_timeout, remaining),
+                                            sock_read=min(self._policy.read_timeout, remaining))
+            failure = None
+            status = None
+            try:
+                status = await self._send(ctx, s, phase, method, url, body, consume, timeout)
+                if not is_retry_status(status, replayable):
+                    return status
+                failure = f"status={status}"
+            except aiohttp.ClientConnectorError as e:
+                # the connection was not established, the request was surely not sent
+                failure = type(e).__name__
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if not replayable:
+                    raise get_maybe_applied_error(phase, e)
+                failure = type(e).__name__
+            attempt += 1
+            backoff = get_retry_backoff(ctx, self._policy, phase, attempt, failure, status is not None)
+            if backoff is None:
+                return status
+            await asyncio.sleep(backoff)
+
+    async def _send(self, ctx: RequestContext, s: "aiohttp.ClientSession", phase: str, method: str, url: str, body: str,
+                    consume: callable, timeout: "aiohttp.ClientTimeout") -> int:
+        """
+        Send a HTTP request and record its phase metric.
+
+        :param ctx: context of the call
+        :param s: session of the credential
+        :param phase: phase name of the request
+        :param method: HTTP method
+        :param url: request url
+        :param body: urlencoded form data or None
+        :param consume: coroutine function(response) reading the body of a 200 response and returning the bytes read
+        :param timeout: timeouts of the request
+
+        :return: HTTP status
+        """
+        headers = {"Content-Type": "application/x-www-form-urlencoded"} if body is not None else None
+        start = time.perf_counter()
+        status = None
+        bytes_received = 0
+        try:
+            async with s.request(method, url, data=body, headers=headers, timeout=timeout) as r:
+                status = r.status
+                if status == 200 and consume is not None:
+                    bytes_received = await consume(r)
+                else:
+                    bytes_received = len(await r.read())
+            return status
+        finally:
+            bytes_sent = len(body) if body is not None else 0
+            self._metrics.record(phase, ctx.credential["id"], ctx.domain, time.perf_counter() - start, bytes_sent, bytes_received, status)
+
+    def _get_session(self, credential: dict) -> "aiohttp.ClientSession":
+        """
+        Get the session of a credential, create it if not exists.
+
+        :param credential: credential used for MyDNS.JP web interface
+
+        :return: session object (may be already logged in)
+        """
+        s = self._sessions.get(credential["id"])
+        if s is None:
+            if self._connector is None:
+                self._connector = aiohttp.TCPConnector(limit=self._pool_limit)
+            # unsafe: also keep cookies of a members page addressed by IP
+            s = aiohttp.ClientSession(connector=self._connector, connector_owner=False, cookie_jar=aiohttp.CookieJar(unsafe=True))
+            self._sessions[credential["id"]] = s
+        return s
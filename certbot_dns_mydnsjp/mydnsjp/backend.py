@@ -0,0 +1,396 @@
+import abc
+import random
+import requests
+import time
+import urllib.parse
+
+from certbot_dns_mydnsjp.mydnsjp.errors import MaybeAppliedMyDnsJpError, UpdateMyDnsJpError
+from certbot_dns_mydnsjp.mydnsjp.metrics import MetricsRecorder
+from certbot_dns_mydnsjp.mydnsjp.ratelimit import RateLimiter
+from certbot_dns_mydnsjp.mydnsjp.session import MyDNSJPSessionManager
+
+DEFAULT_CONNECT_TIMEOUT = 10.0
+DEFAULT_READ_TIMEOUT = 30.0
+DEFAULT_DEADLINE = 300.0
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_BACKOFF_BASE = 1.0
+DEFAULT_BACKOFF_MAX = 30.0
+RETRY_STATUS_CODES = [429, 500, 502, 503, 504]
+
+class RequestPolicy:
+    """
+    Timeouts, deadline and retry settings of MyDNS.JP requests.
+    """
+
+    __slots__ = ("connect_timeout", "read_timeout", "deadline", "max_retries", "backoff_base", "backoff_max")
+
+    def __init__(self, connect_timeout: float = DEFAULT_CONNECT_TIMEOUT, read_timeout: float = DEFAULT_READ_TIMEOUT,
+                 deadline: float = DEFAULT_DEADLINE, max_retries: int = DEFAULT_MAX_RETRIES,
+                 backoff_base: float = DEFAULT_BACKOFF_BASE, backoff_max: float = DEFAULT_BACKOFF_MAX) -> None:
+        """
+        Creates a new RequestPolicy object.
+
+        :param connect_timeout: seconds to wait the connection of each request
+        :param read_timeout: seconds to wait the response data of each request
+        :param deadline: seconds allowed for one set/clear call (all of its requests and retries)
+        :param max_retries: maximum retries of each phase
+        :param backoff_base: base seconds of exponential backoff
+        :param backoff_max: maximum seconds of exponential backoff
+        """
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+class RequestContext:
+    """
+    State of one set/clear call of a backend.
+    """
+
+    __slots__ = ("credential", "domain", "deadline", "retries")
+
+    def __init__(self, credential: dict, domain: str, deadline: float) -> None:
+        """
+        Creates a new RequestContext object.
+
+        :param credential: credential used for MyDNS.JP web interface
+        :param domain: domain names of the call (comma separated)
+        :param deadline: time.monotonic() value to give up
+        """
+        self.credential = credential
+        self.domain = domain
+        self.deadline = deadline
+        self.retries = []
+
+class MyDNSJPBackend(metaclass=abc.ABCMeta):
+    """
+    Base class of the ways to set and clear TXT records of MyDNS.JP.
+    """
+
+    name = None
+    batch = True
+
+    def __init__(self, session_manager: MyDNSJPSessionManager, metrics: MetricsRecorder = None, policy: RequestPolicy = None,
+                 limiter: RateLimiter = None) -> None:
+        """
+        Creates a new MyDNSJPBackend object.
+
+        :param session_manager: session manager shared by backends
+        :param metrics: recorder of phase metrics or None (create a new one)
+        :param policy: timeouts and retry settings or None (default settings)
+        :param limiter: rate limiter shared by backends or None (no limit)
+        """
+        if metrics is None:
+            metrics = MetricsRecorder()
+        if policy is None:
+            policy = RequestPolicy()
+        self._session_manager = session_manager
+        self._metrics = metrics
+        self._policy = policy
+        self._limiter = limiter
+
+    def set_txt_records(self, credential: dict, records: list) -> list:
+        """
+        Set TXT record values for domains of one MyDNS.JP account.
+
+        :param credential: credential used for MyDNS.JP web interface
+        :param records: list of (domain, content) tuple, provided MyDNS.JP credential must have authority of all domains.
+
+        :return: list of previous TXT record value or None, in order of records
+
+        :raise UpdateMyDnsJpError: if unexpected sequence occured
+        """
+        ctx = self._new_context(credential, records)
+        try:
+            return self._set_txt_records(ctx, records)
+        except UpdateMyDnsJpError as e:
+            e.retries = ctx.retries
+            raise
+
+    def clear_txt_records(self, credential: dict, records: list) -> None:
+        """
+        Clear TXT records for domains of one MyDNS.JP account.
+
+        :param credential: the MyDNS.JP credential used for MyDNS.JP web interface
+        :param records: list of (domain, content, prev_content) tuple, prev_content is string value of restoring TXT record or None (for remove)
+
+        :raise UpdateMyDnsJpError: if unexpected sequence occured
+        """
+        ctx = self._new_context(credential, records)
+        try:
+            return self._clear_txt_records(ctx, records)
+        except UpdateMyDnsJpError as e:
+            e.retries = ctx.retries
+            raise
+
+    def update_txt_records(self, credential: dict, clear_records: list, set_records: list, missing_ok: bool = False) -> list:
+        """
+        Clear TXT records and set TXT record values for domains of one MyDNS.JP account,
+        in a single submission if the backend supports it.
+
+        :param credential: credential used for MyDNS.JP web interface
+        :param clear_records: list of (domain, content, prev_content) tuple to clear first
+        :param set_records: list of (domain, content) tuple to set
+        :param missing_ok: True if a value of clear_records held by no row is already cleared,
+                           only backends reading the domain info can check it
+
+        :return: list of previous TXT record value or None, in order of set_records
+
+        :raise UpdateMyDnsJpError: if unexpected sequence occured
+        """
+        ctx = self._new_context(credential, list(clear_records) + list(set_records))
+        try:
+            return self._update_txt_records(ctx, clear_records, set_records, missing_ok)
+        except UpdateMyDnsJpError as e:
+            e.retries = ctx.retries
+            raise
+
+    def forget_txt_records(self, credential: dict, records: list) -> None:
+        """
+        Forget the state kept for TXT values whose clear was given up.
+        Backends without such state do nothing.
+
+        :param credential: credential used for MyDNS.JP web interface
+        :param records: list of (domain, content, prev_content) tuple
+        """
+        return None
+
+    def prefetch(self, credential: dict, generation: int) -> None:
+        """
+        Prepare the account for a later update (e.g. login and read the domain info) in advance.
+        Backends without anything to prepare do nothing.
+
+        :param credential: credential used for MyDNS.JP web interface
+        :param generation: generation number of the account lock at the prefetch or None
+
+        :raise UpdateMyDnsJpError: if unexpected sequence occured
+        """
+        return None
+
+    def validate_prefetched(self, credential: dict, generation: int) -> None:
+        """
+        Discard the prefetched state of the account if it was updated after the prefetch.
+
+        :param credential: credential used for MyDNS.JP web interface
+        :param generation: current generation number of the account lock or None
+        """
+        return None
+
+    def cancel_prefetch(self) -> None:
+        """
+        Discard all prefetched states and the results of running prefetches.
+        """
+        return None
+
+    @abc.abstractmethod
+    def _set_txt_records(self, ctx: RequestContext, records: list) -> list:
+        """
+        Implementation of set_txt_records.
+
+        :param ctx: context of this call
+        :param records: list of (domain, content) tuple
+        """
+        raise NotImplementedError()
+
+    @abc.abstractmethod
+    def _clear_txt_records(self, ctx: RequestContext, records: list) -> None:
+        """
+        Implementation of clear_txt_records.
+
+        :param ctx: context of this call
+        :param records: list of (domain, content, prev_content) tuple
+        """
+        raise NotImplementedError()
+
+    def _update_txt_records(self, ctx: RequestContext, clear_records: list, set_records: list, missing_ok: bool = False) -> list:
+        """
+        Implementation of update_txt_records, clear and set in separate submissions by default.
+
+        :param ctx: context of this call
+        :param clear_records: list of (domain, content, prev_content) tuple
+        :param set_records: list of (domain, content) tuple
+        :param missing_ok: True if a value of clear_records held by no row is already cleared (not checked by default)
+        """
+        if len(clear_records) > 0:
+            self._clear_txt_records(ctx, clear_records)
+        if len(set_records) > 0:
+            return self._set_txt_records(ctx, set_records)
+        return []
+
+    def _new_context(self, credential: dict, records: list) -> RequestContext:
+        """
+        Create the context of a set/clear call.
+
+        :param credential: credential used for MyDNS.JP web interface
+        :param records: records of the call, first item of each record is the domain
+
+        :return: context object
+        """
+        domain = ",".join(record[0] for record in records)
+        return RequestContext(credential, domain, time.monotonic() + self._policy.deadline)
+
+    def _request(self, ctx: RequestContext, s: requests.Session, phase: str, method: str, url: str, replayable: bool = True,
+                 consume: callable = None, **kwargs) -> requests.Response:
+        """
+        Send a HTTP request with timeouts, retry transient failures and record the phase metric of each attempt.
+        Each attempt waits for the rate limiter, the wait is recorded as phase "ratelimit_wait".
+        A not replayable request (e.g. confirm) is retried only if it was surely not sent (connect timeout).
+
+        :param ctx: context of the call
+        :param s: session of the credential
+        :param phase: phase name of the request
+        :param method: HTTP method
+        :param url: request url
+        :param replayable: True if sending the request twice is harmless
+        :param consume: callable(response) reading the streamed body of a 200 response and returning the bytes read, or None (read the whole body)
+        :param kwargs: other arguments of requests.Session.request
+
+        :return: response (status may be an error if retries are exhausted)
+
+        :raise MaybeAppliedMyDnsJpError: if a not replayable request failed after it may have been sent
+        :raise UpdateMyDnsJpError: if the request failed or the deadline exceeded
+        """
+        attempt = 0
+        while True:
+            remaining = get_remaining(ctx, phase)
+            if self._limiter is not None:
+                waited = self._limiter.acquire(ctx.credential["id"], urllib.parse.urlsplit(url).hostname, ctx.deadline)
+                if waited > 0:
+                    self._metrics.record("ratelimit_wait", ctx.credential["id"], ctx.domain, waited)
+                    remaining = get_remaining(ctx, phase)
+            timeout = (min(self._policy.connect_timeout, remaining), min(self._policy.read_timeout, remaining))
+            failure = None
+            r = None
+            try:
+                r = self._send(ctx, s, phase, method, url, consume, timeout=timeout, **kwargs)
+                if not is_retry_status(r.status_code, replayable):
+                    return r
+                failure = f"status={r.status_code}"
+            except requests.exceptions.ConnectTimeout as e:
+                failure = type(e).__name__
+            except requests.exceptions.RequestException as e:
+                if not replayable:
+                    raise get_maybe_applied_error(phase, e)
+                failure = type(e).__name__
+            attempt += 1
+            backoff = get_retry_backoff(ctx, self._policy, phase, attempt, failure, r is not None)
+            if backoff is None:
+                return r
+            time.sleep(backoff)
+
+    def _send(self, ctx: RequestContext, s: requests.Session, phase: str, method: str, url: str, consume: callable = None, **kwargs) -> requests.Response:
+        """
+        Send a HTTP request and record its phase metric.
+
+        :param ctx: context of the call
+        :param s: session of the credential
+        :param phase: phase name of the request
+        :param method: HTTP method
+        :param url: request url
+        :param consume: callable(response) reading the streamed body of a 200 response and returning the bytes read, or None
+        :param kwargs: other arguments of requests.Session.request
+
+        :return: response (the body is already consumed and closed if consume is given)
+        """
+        start = time.perf_counter()
+        r = None
+        bytes_received = 0
+        try:
+            r = s.request(method=method, url=url, stream=consume is not None, **kwargs)
+            if consume is None:
+                bytes_received = len(r.content)
+                return r
+            try:
+                if r.status_code == 200:
+                    bytes_received = consume(r)
+                else:
+                    bytes_received = len(r.content)
+            finally:
+                r.close()
+            return r
+        finally:
+            bytes_sent = 0
+            status = None
+            if r is not None:
+                if r.request.body is not None:
+                    bytes_sent = len(r.request.body)
+                status = r.status_code
+            self._metrics.record(phase, ctx.credential["id"], ctx.domain, time.perf_counter() - start, bytes_sent, bytes_received, status)
+
+    def _record_phase(self, ctx: RequestContext, phase: str, start: float) -> None:
+        """
+        Record a phase without HTTP request (e.g. parse).
+
+        :param ctx: context of the call
+        :param phase: phase name
+        :param start: time.perf_counter() at the start of the phase
+        """
+        self._metrics.record(phase, ctx.credential["id"], ctx.domain, time.perf_counter() - start)
+
+def get_remaining(ctx: RequestContext, phase: str) -> float:
+    """
+    Get the seconds left before the deadline of a call, checked before each attempt of a request.
+
+    :param ctx: context of the call
+    :param phase: phase name of the request
+
+    :return: seconds left
+
+    :raise UpdateMyDnsJpError: if the deadline exceeded
+    """
+    remaining = ctx.deadline - time.monotonic()
+    if remaining <= 0:
+        raise UpdateMyDnsJpError(f"Deadline exceeded before MyDNS.JP request. ({phase})")
+    return remaining
+
+def is_retry_status(status: int, replayable: bool) -> bool:
+    """
+    Check if a response status is a transient failure to retry.
+
+    :param status: HTTP status
+    :param replayable: True if sending the request twice is harmless
+
+    :return: True if the request is retried
+    """
+    return status in RETRY_STATUS_CODES and replayable
+
+def get_maybe_applied_error(phase: str, e: Exception) -> MaybeAppliedMyDnsJpError:
+    """
+    Get the error of a not replayable request failed after it may have been sent.
+
+    :param phase: phase name of the request
+    :param e: error of the request
+
+    :return: error to raise
+    """
+    # some errors (e.g. asyncio.TimeoutError) have no message
+    detail = str(e) or repr(e)
+    return MaybeAppliedMyDnsJpError(f"MyDNS.JP request failed, not retried because it may have been applied. ({phase}: {detail})")
+
+def get_retry_backoff(ctx: RequestContext, policy: RequestPolicy, phase: str, attempt: int, failure: str, has_response: bool) -> float:
+    """
+    Decide the wait before a retry of a failed attempt and record the retry in the context.
+
+    :param ctx: context of the call
+    :param policy: timeouts and retry settings
+    :param phase: phase name of the request
+    :param attempt: number of the retry (1 for the first retry)
+    :param failure: description of the failure
+    :param has_response: True if the failed attempt got a response (returned as is if retries are exhausted)
+
+    :return: seconds to wait before the retry, or None if retries are exhausted and the response is returned
+
+    :raise UpdateMyDnsJpError: if retries are exhausted without response or the wait exceeds the deadline
+    """
+    if attempt > policy.max_retries:
+        if has_response:
+            return None
+        raise UpdateMyDnsJpError(f"MyDNS.JP request failed. ({phase}: {failure})")
+    # exponential backoff with full jitter
+    backoff = random.uniform(0, min(policy.backoff_max, policy.backoff_base * (2 ** (attempt - 1))))
+    if time.monotonic() + backoff >= ctx.deadline:
+        raise UpdateMyDnsJpError(f"Deadline exceeded while retrying MyDNS.JP request. ({phase}: {failure})")
+    ctx.retries.append(f"{phase} attempt {attempt}: {failure}")
+    return backoff
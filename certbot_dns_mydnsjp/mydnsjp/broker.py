@@ -0,0 +1,345 @@
+"""
+Local broker daemon of MyDNS.JP updates.
+
+The broker keeps warm sessions per MyDNS.JP account and accepts set/clear TXT requests
+over a UNIX socket. Requests arriving within the coalescing window are submitted as one
+domain info update per account, and updates of an account are serialized.
+
+usage: certbot-dns-mydnsjp-broker --credentials mydnsjp.ini --socket /run/certbot-dns-mydnsjp.sock
+
+Protocol: one JSON object per line.
+  request : {"op": "set", "records": [[domain, content], ...]}
+            {"op": "clear", "records": [[domain, content, prev_content], ...]}
+  response: {"ok": true, "result": [...]} or {"ok": false, "error": "..."}
+"""
+import argparse
+import json
+import logging
+import os
+import socket
+import socketserver
+import stat
+import threading
+import time
+
+from certbot_dns_mydnsjp.mydnsjp.cli import add_client_arguments, make_client
+from certbot_dns_mydnsjp.mydnsjp.client import MyDNSJPClient
+from certbot_dns_mydnsjp.mydnsjp.errors import MaybeAppliedMyDnsJpError, UpdateMyDnsJpError
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_COALESCE_WINDOW = 0.5
+DEFAULT_BROKER_TIMEOUT = 600.0
+BROKER_OPS = ["set", "clear"]
+
+class _BrokerItem:
+    """
+    One request of a MyDNS.JP account waiting in the broker.
+    """
+
+    __slots__ = ("op", "records", "done", "result", "error")
+
+    def __init__(self, op: str, records: list) -> None:
+        self.op = op
+        self.records = records
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class _AccountQueue:
+    """
+    Pending requests and the worker thread of a MyDNS.JP account.
+    """
+
+    def __init__(self, credential: dict) -> None:
+        self.credential = credential
+        self.items = []
+        self.condition = threading.Condition()
+        self.thread = None
+
+class MyDNSJPBroker:
+    """
+    Coalesce set/clear TXT requests per MyDNS.JP account and run them with one client.
+    """
+
+    def __init__(self, client: MyDNSJPClient, window: float = DEFAULT_COALESCE_WINDOW) -> None:
+        """
+        Creates a new MyDNSJPBroker object.
+
+        :param client: client shared by all requests
+        :param window: seconds to wait for more requests of an account before submitting
+        """
+        self._client = client
+        self._window = window
+        self._queues = {}
+        self._lock = threading.Lock()
+
+    def submit(self, op: str, records: list) -> list:
+        """
+        Run a set/clear request and wait the result.
+
+        :param op: "set" or "clear"
+        :param records: records of MyDNSJPClient.set_txt_records or clear_txt_records
+
+        :return: list of previous TXT value (set) or None (clear), in order of records
+
+        :raise UpdateMyDnsJpError: if an update failed
+        """
+        if op not in BROKER_OPS:
+            raise UpdateMyDnsJpError(f"Unknown broker operation '{op}'")
+        waiting = []
+        for credential, account_items in self._client.group_by_credential(list(enumerate(records)), lambda item: item[1][0]):
+            ixs = [ix for ix, record in account_items]
+            item = _BrokerItem(op, [tuple(record) for ix, record in account_items])
+            self._enqueue(credential, item)
+            waiting.append((ixs, item))
+        result = [None] * len(records)
+        errors = []
+        for ixs, item in waiting:
+            item.done.wait()
+            if item.error is not None:
+                errors.append(str(item.error))
+                continue
+            if item.result is not None:
+                for ix, value in zip(ixs, item.result):
+                    result[ix] = value
+        if len(errors) > 0:
+            raise UpdateMyDnsJpError("\n".join(errors))
+        return result if op == "set" else None
+
+    def _enqueue(self, credential: dict, item: _BrokerItem) -> None:
+        """
+        Add a request to the queue of the account, start its worker if not running.
+
+        :param credential: credential used for MyDNS.JP web interface
+        :param item: request
+        """
+        with self._lock:
+            queue = self._queues.get(credential["id"])
+            if queue is None:
+                queue = _AccountQueue(credential)
+                self._queues[credential["id"]] = queue
+            with queue.condition:
+                queue.items.append(item)
+                queue.condition.notify()
+            if queue.thread is None:
+                queue.thread = threading.Thread(target=self._run_account, args=(queue,), daemon=True)
+                queue.thread.start()
+
+    def _run_account(self, queue: _AccountQueue) -> None:
+        """
+        Worker of an account, submit the pending requests after the coalescing window.
+
+        :param queue: queue of the account
+        """
+        while True:
+            with queue.condition:
+                while len(queue.items) == 0:
+                    queue.condition.wait()
+            time.sleep(self._window)
+            with queue.condition:
+                items = queue.items
+                queue.items = []
+            # run consecutive requests of the same operation as one update
+            ix = 0
+            while ix < len(items):
+                end = ix
+                while end < len(items) and items[end].op == items[ix].op:
+                    end += 1
+                self._run_batch(queue.credential, items[ix:end])
+                ix = end
+
+    def _run_batch(self, credential: dict, items: list) -> None:
+        """
+        Submit requests of the same operation as one update and notify their results.
+        If the update of several requests failed, each request is run alone so an error reaches only its own client.
+
+        :param credential: credential used for MyDNS.JP web interface
+        :param items: list of _BrokerItem of the same operation
+        """
+        records = []
+        for item in items:
+            records.extend(item.records)
+        logger.info("MyDNS.JP broker %s %d records of %s in one update", items[0].op, len(records), credential["id"])
+        try:
+            if items[0].op == "set":
+                result = self._client.set_txt_records(credential, records)
+            else:
+                self._client.clear_txt_records(credential, records)
+                result = [None] * len(records)
+            pos = 0
+            for item in items:
+                item.result = result[pos:pos + len(item.records)]
+                pos += len(item.records)
+        except MaybeAppliedMyDnsJpError as e:
+            # running the requests again would not tell which ones were applied
+            logger.warning("MyDNS.JP broker %s failed: %s", items[0].op, e)
+            for item in items:
+                item.error = e
+        except Exception as e:
+            if len(items) > 1:
+                logger.warning("MyDNS.JP broker %s of %d requests failed, run them one by one: %s", items[0].op, len(items), e)
+                for item in items:
+                    self._run_batch(credential, [item])
+                return
+            logger.warning("MyDNS.JP broker %s failed: %s", items[0].op, e)
+            items[0].error = e
+        for item in items:
+            item.done.set()
+
+class _BrokerRequestHandler(socketserver.StreamRequestHandler):
+    """
+    Handle JSON line requests of a broker connection.
+    """
+
+    def handle(self) -> None:
+        for line in self.rfile:
+            if line.strip() == b"":
+                continue
+            try:
+                request = json.loads(line)
+                result = self.server.broker.submit(request.get("op"), request.get("records", []))
+                response = {"ok": True, "result": result}
+            except Exception as e:
+                response = {"ok": False, "error": str(e)}
+            self.wfile.write(json.dumps(response).encode("utf-8") + b"\n")
+            self.wfile.flush()
+
+class MyDNSJPBrokerServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    UNIX socket server of MyDNSJPBroker, the socket is accessible only by the owner.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, socket_path: str, broker: MyDNSJPBroker) -> None:
+        """
+        Creates a new MyDNSJPBrokerServer object and bind the socket.
+
+        :param socket_path: path of the UNIX socket (a socket left at the path is replaced)
+        :param broker: broker handling the requests
+
+        :raise UpdateMyDnsJpError: if something else than a socket exists at the path
+        """
+        remove_socket(socket_path)
+        self.broker = broker
+        old_umask = os.umask(0o177)
+        try:
+            super().__init__(socket_path, _BrokerRequestHandler)
+        finally:
+            os.umask(old_umask)
+
+def remove_socket(path: str) -> None:
+    """
+    Remove the UNIX socket at a path, nothing else is removed.
+
+    :param path: path of the UNIX socket
+
+    :raise UpdateMyDnsJpError: if something else than a socket exists at the path
+    """
+    try:
+        mode = os.lstat(path).st_mode
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(mode):
+        raise UpdateMyDnsJpError(f"Not a UNIX socket, refusing to replace it. ({path})")
+    os.unlink(path)
+
+class BrokerClient:
+    """
+    Client of the broker daemon, with the same set/clear methods as MyDNSJPClient without credential.
+    """
+
+    def __init__(self, socket_path: str, timeout: float = DEFAULT_BROKER_TIMEOUT) -> None:
+        """
+        Creates a new BrokerClient object.
+
+        :param socket_path: path of the UNIX socket of the broker
+        :param timeout: seconds to wait a response
+        """
+        self._socket_path = socket_path
+        self._timeout = timeout
+
+    def set_txt_records(self, records: list) -> list:
+        """
+        Set TXT record values through the broker.
+
+        :param records: list of (domain, content) tuple
+
+        :return: list of previous TXT record value or None, in order of records
+
+        :raise UpdateMyDnsJpError: if the broker failed
+        """
+        return self._call("set", records)
+
+    def clear_txt_records(self, records: list) -> None:
+        """
+        Clear TXT records through the broker.
+
+        :param records: list of (domain, content, prev_content) tuple
+
+        :raise UpdateMyDnsJpError: if the broker failed
+        """
+        self._call("clear", records)
+        return None
+
+    def _call(self, op: str, records: list):
+        """
+        Send a request to the broker and wait the response.
+
+        :param op: "set" or "clear"
+        :param records: records of the request
+
+        :return: result of the response
+
+        :raise UpdateMyDnsJpError: if the broker is not reachable or failed
+        """
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+                s.settimeout(self._timeout)
+                s.connect(self._socket_path)
+                s.sendall(json.dumps({"op": op, "records": [list(record) for record in records]}).encode("utf-8") + b"\n")
+                with s.makefile("rb") as f:
+                    line = f.readline()
+        except OSError as e:
+            raise UpdateMyDnsJpError(f"MyDNS.JP broker is not reachable. ({self._socket_path}: {e})")
+        if line == b"":
+            raise UpdateMyDnsJpError(f"MyDNS.JP broker closed the connection. ({self._socket_path})")
+        response = json.loads(line)
+        if not response.get("ok"):
+            raise UpdateMyDnsJpError(f"MyDNS.JP broker failed. ({response.get('error')})")
+        return response.get("result")
+
+def main() -> None:
+    """
+    Entry point of the broker daemon.
+    """
+    parser = argparse.ArgumentParser(description="Local broker daemon of MyDNS.JP updates for certbot-dns-mydnsjp.")
+    add_client_arguments(parser)
+    parser.add_argument("--socket", required=True, help="path of the UNIX socket")
+    parser.add_argument("--window", type=float, default=DEFAULT_COALESCE_WINDOW,
+                        help="seconds to wait for more requests of an account before submitting")
+    parser.set_defaults(log_level="INFO")
+    args = parser.parse_args()
+
+    client, session_manager = make_client(args, parser)
+    try:
+        server = MyDNSJPBrokerServer(args.socket, MyDNSJPBroker(client, args.window))
+    except UpdateMyDnsJpError as e:
+        session_manager.close()
+        parser.exit(1, f"{parser.prog}: {e}\n")
+    logger.info("MyDNS.JP broker listening on %s", args.socket)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        session_manager.close()
+        try:
+            remove_socket(args.socket)
+        except (OSError, UpdateMyDnsJpError) as e:
+            logger.warning("MyDNS.JP broker socket not removed: %s", e)
+
+if __name__ == "__main__":
+    main()
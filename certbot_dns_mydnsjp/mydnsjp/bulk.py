@@ -0,0 +1,190 @@
+"""
+Bulk TXT record updates of MyDNS.JP driven by a manifest, for ACME clients and automation other than certbot.
+
+usage: certbot-dns-mydnsjp-bulk --credentials mydnsjp.ini [--manifest manifest.jsonl] [--max-concurrency 4]
+
+Manifest (from --manifest or stdin), one entry per line:
+  JSON lines: {"domain": "_acme-challenge.example.mydns.jp", "value": "...", "action": "set"}
+              {"domain": "_acme-challenge.example.mydns.jp", "value": "...", "action": "clear", "prev": "..."}
+  CSV       : domain,value,action[,prev]
+
+The entries are grouped by MyDNS.JP account, consecutive entries of the same action of an account
+are submitted as one update, and the accounts are updated concurrently.
+One JSON result per manifest line is written to stdout as each account completes:
+  {"line": 1, "domain": "...", "action": "set", "ok": true, "prev": null, "error": null}
+"""
+import argparse
+import csv
+import json
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from certbot_dns_mydnsjp.mydnsjp.cli import add_client_arguments, make_client
+from certbot_dns_mydnsjp.mydnsjp.client import MyDNSJPClient
+from certbot_dns_mydnsjp.mydnsjp.errors import UpdateMyDnsJpError
+
+DEFAULT_BULK_CONCURRENCY = 4
+MANIFEST_FORMATS = ["auto", "json", "csv"]
+MANIFEST_ACTIONS = ["set", "clear"]
+
+class ManifestEntry:
+    """
+    One line of a manifest.
+    """
+
+    __slots__ = ("line", "domain", "value", "action", "prev", "error")
+
+    def __init__(self, line: int, domain: str, value: str, action: str, prev: str = None, error: str = None) -> None:
+        self.line = line
+        self.domain = domain
+        self.value = value
+        self.action = action
+        self.prev = prev
+        self.error = error
+
+def read_manifest(f, manifest_format: str = "auto"):
+    """
+    Read manifest entries one line at a time, an invalid line is returned with its error.
+
+    :param f: text file of the manifest
+    :param manifest_format: "json", "csv" or "auto" (a line starting with "{" is JSON)
+
+    :return: generator of ManifestEntry
+    """
+    for line_no, line in enumerate(f, start=1):
+        line = line.strip()
+        if line == "" or line.startswith("#"):
+            continue
+        try:
+            if manifest_format == "json" or (manifest_format == "auto" and line.startswith("{")):
+                data = json.loads(line)
+                if not isinstance(data, dict):
+                    raise ValueError("not a JSON object")
+                fields = [data.get("domain"), data.get("value"), data.get("action"), data.get("prev")]
+            else:
+                row = next(csv.reader([line]))
+                if len(row) < 3 or len(row) > 4:
+                    raise ValueError("expected domain,value,action[,prev]")
+                fields = [column.strip() for column in row] + [None] * (4 - len(row))
+                if fields[3] == "":
+                    fields[3] = None
+        except ValueError as e:
+            yield ManifestEntry(line_no, None, None, None, error=f"Invalid manifest line: {e}")
+            continue
+        domain, value, action, prev = fields
+        entry = ManifestEntry(line_no, domain, value, action, prev)
+        if not isinstance(domain, str) or domain == "" or not isinstance(value, str):
+            entry.error = "Invalid manifest line: domain and value are required"
+        elif action not in MANIFEST_ACTIONS:
+            entry.error = f"Invalid manifest line: unknown action '{action}'"
+        yield entry
+
+class BulkRunner:
+    """
+    Apply manifest entries with one MyDNSJPClient, one submission per account and action run.
+    """
+
+    def __init__(self, client: MyDNSJPClient, out, max_concurrency: int = DEFAULT_BULK_CONCURRENCY) -> None:
+        """
+        Creates a new BulkRunner object.
+
+        :param client: client of the MyDNS.JP accounts
+        :param out: text file the results are written to
+        :param max_concurrency: maximum number of accounts updated at the same time
+        """
+        self._client = client
+        self._out = out
+        self._max_concurrency = max(max_concurrency, 1)
+        self._out_lock = threading.Lock()
+        self.failed = 0
+
+    def run(self, entries) -> None:
+        """
+        Apply entries and write the result of each of them.
+
+        :param entries: iterable of ManifestEntry
+        """
+        valid = []
+        for entry in entries:
+            if entry.error is None:
+                try:
+                    self._client.get_mydnsjp_credential(entry.domain)
+                    valid.append(entry)
+                    continue
+                except UpdateMyDnsJpError as e:
+                    entry.error = str(e)
+            self._write([entry])
+        groups = self._client.group_by_credential(valid, lambda entry: entry.domain)
+        if len(groups) == 0:
+            return
+        with ThreadPoolExecutor(max_workers=min(self._max_concurrency, len(groups))) as executor:
+            for future in [executor.submit(self._run_account, credential, account_entries) for credential, account_entries in groups]:
+                future.result()
+
+    def _run_account(self, credential: dict, entries: list) -> None:
+        """
+        Apply entries of an account, consecutive entries of the same action are one update.
+
+        :param credential: credential used for MyDNS.JP web interface
+        :param entries: list of ManifestEntry of the account, in manifest order
+        """
+        ix = 0
+        while ix < len(entries):
+            end = ix
+            while end < len(entries) and entries[end].action == entries[ix].action:
+                end += 1
+            batch = entries[ix:end]
+            try:
+                if batch[0].action == "set":
+                    result = self._client.set_txt_records(credential, [(entry.domain, entry.value) for entry in batch])
+                    for entry, prev in zip(batch, result):
+                        entry.prev = prev
+                else:
+                    self._client.clear_txt_records(credential, [(entry.domain, entry.value, entry.prev) for entry in batch])
+            except Exception as e:
+                for entry in batch:
+                    entry.error = str(e)
+            self._write(batch)
+            ix = end
+
+    def _write(self, entries: list) -> None:
+        """
+        Write the results of entries, one JSON object per line.
+
+        :param entries: list of ManifestEntry
+        """
+        with self._out_lock:
+            for entry in entries:
+                if entry.error is not None:
+                    self.failed += 1
+                self._out.write(json.dumps({"line": entry.line, "domain": entry.domain, "action": entry.action,
+                                            "ok": entry.error is None, "prev": entry.prev, "error": entry.error}) + "\n")
+            self._out.flush()
+
+def main() -> None:
+    """
+    Entry point of the bulk command, exit status is 1 if any entry failed.
+    """
+    parser = argparse.ArgumentParser(description="Set/clear MyDNS.JP TXT records listed in a manifest.")
+    add_client_arguments(parser)
+    parser.add_argument("--manifest", default="-", help="manifest file, '-' reads stdin")
+    parser.add_argument("--format", choices=MANIFEST_FORMATS, default="auto", help="manifest format")
+    parser.add_argument("--max-concurrency", type=int, default=DEFAULT_BULK_CONCURRENCY,
+                        help="maximum number of MyDNS.JP accounts updated at the same time")
+    args = parser.parse_args()
+
+    client, session_manager = make_client(args, parser)
+    runner = BulkRunner(client, sys.stdout, args.max_concurrency)
+    try:
+        if args.manifest == "-":
+            runner.run(read_manifest(sys.stdin, args.format))
+        else:
+            with open(args.manifest, newline="") as f:
+                runner.run(read_manifest(f, args.format))
+    finally:
+        session_manager.close()
+    sys.exit(1 if runner.failed > 0 else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Common options of the standalone commands (broker, bulk) using MyDNSJPClient without certbot.
+"""
+import argparse
+import logging
+
+from certbot_dns_mydnsjp.mydnsjp.backend import (
+    DEFAULT_CONNECT_TIMEOUT, DEFAULT_DEADLINE, DEFAULT_MAX_RETRIES, DEFAULT_READ_TIMEOUT, RequestPolicy)
+from certbot_dns_mydnsjp.mydnsjp.client import MyDNSJPClient, validate_credential
+from certbot_dns_mydnsjp.mydnsjp.cookies import COOKIE_CACHE_SUFFIX, DEFAULT_COOKIE_CACHE_TTL, CookieCache
+from certbot_dns_mydnsjp.mydnsjp.errors import NotValidMyDnsJpCredentialError
+from certbot_dns_mydnsjp.mydnsjp.journal import JOURNAL_SUFFIX, TxtJournal
+from certbot_dns_mydnsjp.mydnsjp.lock import LOCK_DIR_SUFFIX
+from certbot_dns_mydnsjp.mydnsjp.ratelimit import (
+    DEFAULT_ACCOUNT_BURST, DEFAULT_ACCOUNT_RATE, DEFAULT_HOST_BURST, DEFAULT_HOST_RATE, RateLimiter)
+from certbot_dns_mydnsjp.mydnsjp.session import MyDNSJPSessionManager
+
+def add_client_arguments(parser: argparse.ArgumentParser) -> None:
+    """
+    Add the options of the credentials file and MyDNSJPClient.
+
+    :param parser: argument parser of the command
+    """
+    parser.add_argument("--credentials", required=True, help="MyDNS.JP credentials INI file (same format as the plugin)")
+    parser.add_argument("--connect-timeout", type=float, default=DEFAULT_CONNECT_TIMEOUT,
+                        help="seconds to wait the connection of each MyDNS.JP request")
+    parser.add_argument("--read-timeout", type=float, default=DEFAULT_READ_TIMEOUT,
+                        help="seconds to wait the response data of each MyDNS.JP request")
+    parser.add_argument("--deadline", type=float, default=DEFAULT_DEADLINE,
+                        help="seconds allowed for one MyDNS.JP update including retries")
+    parser.add_argument("--max-retries", type=int, default=DEFAULT_MAX_RETRIES,
+                        help="maximum retries of each MyDNS.JP request phase on transient failures")
+    parser.add_argument("--rate-limit", type=float, default=DEFAULT_ACCOUNT_RATE,
+                        help="requests per second sent for one MyDNS.JP account (0 = no limit, the default)")
+    parser.add_argument("--rate-burst", type=int, default=DEFAULT_ACCOUNT_BURST,
+                        help="requests of one MyDNS.JP account sent without waiting after an idle time")
+    parser.add_argument("--host-rate-limit", type=float, default=DEFAULT_HOST_RATE,
+                        help="requests per second sent to one MyDNS.JP host for all accounts (0 = no limit, the default)")
+    parser.add_argument("--host-rate-burst", type=int, default=DEFAULT_HOST_BURST,
+                        help="requests to one MyDNS.JP host sent without waiting after an idle time")
+    parser.add_argument("--lock-dir", default=None,
+                        help="directory of the lock files serializing updates of a MyDNS.JP account, "
+                             "owned by the user with mode 0700 (default: the credentials INI file path + '.locks')")
+    parser.add_argument("--session-cache", action="store_true",
+                        help="save logged-in sessions next to the credentials INI file and reuse them")
+    parser.add_argument("--session-cache-ttl", type=float, default=DEFAULT_COOKIE_CACHE_TTL,
+                        help="seconds a saved MyDNS.JP session is reused after its login")
+    parser.add_argument("--journal", default=None,
+                        help="journal file of the TXT values set (default: the credentials INI file path + '.journal')")
+    parser.add_argument("--log-level", default="WARNING", help="logging level (DEBUG, INFO, WARNING, ...)")
+
+def make_client(args: argparse.Namespace, parser: argparse.ArgumentParser) -> tuple:
+    """
+    Configure logging and create MyDNSJPClient from the options of add_client_arguments.
+    An invalid log level or credentials file exits the command with the usage error of the parser.
+
+    :param args: parsed options
+    :param parser: argument parser of the command
+
+    :return: tuple of (MyDNSJPClient, MyDNSJPSessionManager)
+    """
+    from certbot import errors
+    from certbot.plugins import dns_common
+
+    try:
+        logging.basicConfig(level=args.log_level.upper(), format="%(asctime)s %(levelname)s %(name)s %(message)s")
+    except ValueError:
+        parser.error(f"invalid --log-level: {args.log_level}")
+    try:
+        dns_common.validate_file_permissions(args.credentials)
+        credentials = dns_common.CredentialsConfiguration(args.credentials, lambda name: "dns_mydnsjp_" + name)
+        credential = credentials.conf("credential")
+        validate_credential(credential)
+    except (errors.PluginError, KeyError, TypeError, NotValidMyDnsJpCredentialError) as e:
+        parser.error(f"invalid credentials file {args.credentials}: {e}")
+    cookie_cache = None
+    if args.session_cache:
+        cookie_cache = CookieCache(args.credentials + COOKIE_CACHE_SUFFIX, args.session_cache_ttl, dns_common.validate_file_permissions)
+    policy = RequestPolicy(args.connect_timeout, args.read_timeout, args.deadline, max(args.max_retries, 0))
+    session_manager = MyDNSJPSessionManager(cookie_cache=cookie_cache)
+    journal = TxtJournal(args.journal or args.credentials + JOURNAL_SUFFIX)
+    limiter = RateLimiter(args.rate_limit, args.rate_burst, args.host_rate_limit, args.host_rate_burst)
+    lock_dir = args.lock_dir or args.credentials + LOCK_DIR_SUFFIX
+    client = MyDNSJPClient(credential, session_manager, policy=policy, lock_dir=lock_dir, journal=journal, limiter=limiter)
+    return client, session_manager
@@ -1,83 +1,130 @@
 import logging
-import re
-import requests
-import urllib
+
+from certbot_dns_mydnsjp.mydnsjp.backend import MyDNSJPBackend, RequestPolicy
+from certbot_dns_mydnsjp.mydnsjp.directedit import DirectEditBackend
+from certbot_dns_mydnsjp.mydnsjp.errors import (
+    ConflictMyDnsJpError, MaybeAppliedMyDnsJpError, NotValidMyDnsJpCredentialError, SessionExpiredMyDnsJpError, UpdateMyDnsJpError)
+from certbot_dns_mydnsjp.mydnsjp.journal import TxtJournal
+from certbot_dns_mydnsjp.mydnsjp.lock import DEFAULT_LOCK_DIR, DEFAULT_LOCK_TIMEOUT, AccountLock
+from certbot_dns_mydnsjp.mydnsjp.metrics import MetricsRecorder
+from certbot_dns_mydnsjp.mydnsjp.ratelimit import RateLimiter
+from certbot_dns_mydnsjp.mydnsjp.resolver import CredentialResolver
+from certbot_dns_mydnsjp.mydnsjp.scraping import ScrapingBackend
+from certbot_dns_mydnsjp.mydnsjp.session import MyDNSJPSessionManager
+
+logger = logging.getLogger(__name__)
 
 # prevent urllib3 to log request with credential
 logging.getLogger("urllib3").setLevel(logging.WARNING)
 
-MYDNSJP_LOGIN_URL = "https://www.mydns.jp/members/"
-regexp_name_of_mydnsjp_dnsinfo = re.compile("^DNSINFO\\[([^\\]]+)\\]\\[([^\\]]+)\\]",re.S|re.I)
-NAME_OF_MYDNSJP_DOMAINNAME = "DNSINFO[domainname]"
-KEYS_OF_MYDNSJP_MX = ["mx","prio"]
-KEYS_OF_MYDNSJP_RECORD = ["hostname","type","content","delegateid"]
-EXCEPT_NAMES_OF_MYDNSJP_CONFIRM = ["BACK"]
+DEFAULT_BACKEND = ScrapingBackend.name
+NAMES_OF_MYDNSJP_BACKEND = [ScrapingBackend.name, DirectEditBackend.name]
 
 ACME_CHALLENGE_TXT_PREFIX = "_acme-challenge"
+MAX_CONFLICT_RETRIES = 2
 
-regexp_form = re.compile("<form([^>]*)>(.*?)</form[^>]*>",re.S|re.I)
-regexp_select = re.compile("<select([^>]*)>(.*?)</select[^>]*>",re.S|re.I)
-regexp_option = re.compile("<option([^>]*)>([^<]*)",re.S|re.I)
-regexp_input = re.compile("<input([^>]*)>",re.S|re.I)
-regexp_method = re.compile("\\smethod\\s*=\\s*['\"]([^'\"]+)['\"]",re.S|re.I)
-regexp_action = re.compile("\\saction\\s*=\\s*['\"]([^'\"]+)['\"]",re.S|re.I)
-regexp_type = re.compile("\\stype\\s*=\\s*['\"]([^'\"]+)['\"]",re.S|re.I)
-regexp_name = re.compile("\\sname\\s*=\\s*['\"]([^'\"]+)['\"]",re.S|re.I)
-regexp_value = re.compile("\\svalue\\s*=\\s*['\"]([^'\"]*)['\"]",re.S|re.I)
-regexp_selected = re.compile("selected",re.S|re.I)
-
-class NotValidMyDnsJpCredentialError(Exception):
-    """
-    Exception if the credential is not a valid format for dns_mydnsjp.
+def validate_credential(credential: dict) -> None:
     """
+    Check the format of the credential of dns_mydnsjp.
 
-    def __init__(self):
-        super().__init__("The credential is not a valid format for dns_mydnsjp.")
+    :param credential: dictionary of domain key to credential ('id', 'pwd' and optional 'backend')
 
-class UpdateMyDnsJpError(Exception):
+    :raise NotValidMyDnsJpCredentialError: if the credential is not a valid format for dns_mydnsjp
     """
-    Exception if error occured at update domain info of MyDNS.JP.
-    """
-
-    def __init__(self, message):
-        self.message = message
-        super().__init__(self.message)
+    if credential is None or len(credential) == 0:
+        raise NotValidMyDnsJpCredentialError()
+    for cred_key, cred_val in credential.items():
+        if len(cred_key) == 0 or 'id' not in cred_val or 'pwd' not in cred_val:
+            raise NotValidMyDnsJpCredentialError()
+        if len(cred_val['id']) == 0 or len(cred_val['pwd']) == 0:
+            raise NotValidMyDnsJpCredentialError()
+        if cred_val.get('backend', DEFAULT_BACKEND) not in NAMES_OF_MYDNSJP_BACKEND:
+            raise NotValidMyDnsJpCredentialError()
 
 class MyDNSJPClient:
     """
     Client for clearing, setting the TXT record using MyDNS.JP.
     """
 
-    def __init__(self, credential: dict) -> None:
+    def __init__(self, credential: dict, session_manager: MyDNSJPSessionManager = None, backends: dict = None, metrics: MetricsRecorder = None,
+                 policy: RequestPolicy = None, lock_dir: str = DEFAULT_LOCK_DIR, lock_timeout: float = DEFAULT_LOCK_TIMEOUT,
+                 journal: TxtJournal = None, limiter: RateLimiter = None) -> None:
         """
         Creates a new MyDnsJpClient object.
+        Each credential may select the backend with 'backend' ('scraping' or 'directedit', default 'scraping').
+        Updates of an account are serialized between processes with a lock file in lock_dir.
+        TXT values set and cleared are recorded in the journal, so that values left by a crashed run can be swept.
+        All requests of the default backends are paced by one rate limiter per account and per host.
 
         :param credential: the MyDNS.JP credential used for MyDNS.JP web interface
+        :param session_manager: shared session manager or None (create a new one)
+        :param backends: dictionary of backend name to backend object or None (use default backends)
+        :param metrics: recorder of phase metrics of default backends or None
+        :param policy: timeouts and retry settings of default backends or None
+        :param lock_dir: directory of per-account lock files
+        :param lock_timeout: seconds to wait the lock of an account
+        :param journal: journal of TXT values set by this client or None
+        :param limiter: rate limiter of default backends or None (default limits)
 
         :raise NotValidMyDnsJpCredentialError: if the credential is not a valid format for dns_mydnsjp
         """
-        if credential is None or len(credential) == 0:
-            raise NotValidMyDnsJpCredentialError()
-        for cred_key, cred_val in credential.items():
-            if len(cred_key) == 0 or 'id' not in cred_val or 'pwd' not in cred_val:
-                raise NotValidMyDnsJpCredentialError()
-            if len(cred_val['id']) == 0 or len(cred_val['pwd']) == 0:
-                raise NotValidMyDnsJpCredentialError()
+        validate_credential(credential)
         self._credential = credential
+        self._resolver = CredentialResolver(credential)
+        if session_manager is None:
+            session_manager = MyDNSJPSessionManager()
+        self._session_manager = session_manager
+        if backends is None:
+            if limiter is None:
+                limiter = RateLimiter()
+            backends = {
+                ScrapingBackend.name: ScrapingBackend(session_manager, metrics=metrics, policy=policy, limiter=limiter),
+                DirectEditBackend.name: DirectEditBackend(session_manager, metrics=metrics, policy=policy, limiter=limiter),
+            }
+        self._backends = backends
+        self._lock_dir = lock_dir
+        self._lock_timeout = lock_timeout
+        self._journal = journal
 
     def get_mydnsjp_credential(self, domain) -> dict:
-        result = None
-        result_key = None
-        for cred_key, cred_val in self._credential.items():
-            if not domain.endswith(cred_key):
-                continue
-            if result_key is None or len(cred_key) > len(result_key):
-                result = cred_val
-                result_key = cred_key
+        """
+        Get the credential of the longest domain key which is the domain or its parent domain.
+
+        :param domain: fully qualified domain name
+
+        :return: credential
+
+        :raise UpdateMyDnsJpError: if no credential found for the domain
+        """
+        result = self._resolver.resolve(domain)
         if result is None:
             raise UpdateMyDnsJpError(f"Not found mydnsjp_credential for domain '{domain}'")
         return result
 
+    def get_mydnsjp_credentials(self) -> list:
+        """
+        Get the credentials of all configured MyDNS.JP accounts.
+
+        :return: list of credential, one per MyDNS.JP account
+        """
+        result = {}
+        for cred_val in self._credential.values():
+            result.setdefault(cred_val["id"], cred_val)
+        return list(result.values())
+
+    def group_by_credential(self, items: list, key: callable = None) -> list:
+        """
+        Group items by the credential of their domains in one pass.
+
+        :param items: list of domain, or of any item with key
+        :param key: callable(item) returning the domain of an item or None (the item is the domain)
+
+        :return: list of (credential, list of item) tuple, one per MyDNS.JP account
+
+        :raise UpdateMyDnsJpError: if no credential found for a domain
+        """
+        return self._resolver.group(items, key)
+
     def set_txt_record(self, credential: dict, domain: str, content: str) -> str:
         """
         Set a TXT record value for a specific domain using MyDNS.JP.
@@ -90,62 +137,49 @@ class MyDNSJPClient:
 
         :raise UpdateMyDnsJpError: if unexpected sequence occured
         """
-        s = requests.Session()
-        request_url = MYDNSJP_LOGIN_URL
-        request_method = "GET"
-        r = s.request(method=request_method, url=request_url)
-        if r.status_code != 200:
-            raise UpdateMyDnsJpError("Abnormal response from MyDNS.JP web. (LOGIN)")
-        login_form_element = self._get_form_element(r.text, "/members/")
-        if login_form_element is None:
-            raise UpdateMyDnsJpError("Abnormal response from MyDNS.JP web. (LoginForm missing)")
-        login_form_element["masterid"]["value"] = credential["id"]
-        login_form_element["masterpwd"]["value"] = credential["pwd"]
-        login_form_data = self._get_form_data(login_form_element, None)
-        request_url = urllib.parse.urljoin(request_url, login_form_element[""]["action"])
-        request_method = login_form_element[""]["method"].upper()
-        r = s.request(method=request_method, url=request_url, data=login_form_data)
-        if r.status_code != 200:
-            raise UpdateMyDnsJpError("Abnormal response from MyDNS.JP web. (Get DomainInfo)")
-        domain_info_form_element = self._get_form_element(r.text, "/members/#domaininfo")
-        if domain_info_form_element is None:
-            raise UpdateMyDnsJpError("MyDNS.JP login failed. (DomainInfoForm missing)")
-        domainname = self._get_domaininame_element(domain_info_form_element)
-        if domainname is None:
-            raise UpdateMyDnsJpError("No configured domainname at MyDNS.JP. (domainname is None)")
-        domain_suffix = "." + domainname["value"]
-        if not domain.endswith(domain_suffix):
-            raise UpdateMyDnsJpError("Domain suffix mismatch. (DomainInfo domainname between credential domain)")
-        hostname = domain[:-len(domain_suffix)]
-        record_element = self._get_record_element(domain_info_form_element)
-        hostname_elements = self._find_record_element(record_element, hostname, "TXT", None)
-        if hostname_elements is None:
-            hostname_elements = self._find_record_element(record_element, "", "A", "")
-        if hostname_elements is None:
-            raise UpdateMyDnsJpError("Abnormal response from MyDNS.JP web. (hostname_elements missing)")
-        hostname_element = hostname_elements[list(hostname_elements.keys())[0]]
-        prev_content = hostname_element["content"]["value"]
-        if prev_content == "":
-            prev_content = None
-        hostname_element["hostname"]["value"] = hostname
-        hostname_element["type"]["value"] = "TXT"
-        hostname_element["content"]["value"] = content
-        domain_info_form_data = self._get_form_data(domain_info_form_element, None)
-        request_url = urllib.parse.urljoin(request_url, domain_info_form_element[""]["action"])
-        request_method = domain_info_form_element[""]["method"].upper()
-        r = s.request(method=request_method, url=request_url, data=domain_info_form_data)
-        if r.status_code != 200:
-            raise UpdateMyDnsJpError("Abnormal response from MyDNS.JP web. (Send DomainInfo)")
-        confirm_domain_info_form_element = self._get_form_element(r.text, "/members/#domaininfo")
-        if confirm_domain_info_form_element is None:
-            raise UpdateMyDnsJpError("Abnormal response from MyDNS.JP web. (ConfirmForm missing)")
-        confirm_domain_info_form_data = self._get_form_data(confirm_domain_info_form_element, EXCEPT_NAMES_OF_MYDNSJP_CONFIRM)
-        request_url = urllib.parse.urljoin(request_url, confirm_domain_info_form_element[""]["action"])
-        request_method = confirm_domain_info_form_element[""]["method"].upper()
-        r = s.request(method=request_method, url=request_url, data=confirm_domain_info_form_data)
-        if r.status_code != 200:
-            raise UpdateMyDnsJpError("Abnormal response from MyDNS.JP web. (Confirm DomainInfo)")
-        return prev_content
+        return self.set_txt_records(credential, [(domain, content)])[0]
+
+    def set_txt_records(self, credential: dict, records: list) -> list:
+        """
+        Set TXT record values for domains of one MyDNS.JP account.
+        The members page is used as fallback if the selected backend failed, unless its request may have been applied.
+        The update is retried if another process changed the domain info at the same time.
+
+        :param credential: credential used for MyDNS.JP web interface
+        :param records: list of (domain, content) tuple, provided MyDNS.JP credential must have authority of all domains.
+
+        :return: list of previous TXT record value or None, in order of records
+
+        :raise UpdateMyDnsJpError: if unexpected sequence occured
+        """
+        result = self._run_journaled(credential, self._set_txt_records, records, records)
+        if self._journal is not None:
+            self._journal.record_set(credential, records, result)
+        return result
+
+    def _set_txt_records(self, credential: dict, records: list) -> list:
+        """
+        Implementation of set_txt_records, called with the lock of the account.
+        """
+        backend = self._get_backend(credential)
+        fallback = self._backends[ScrapingBackend.name]
+        if backend is fallback:
+            return backend.set_txt_records(credential, records)
+        result = []
+        for ix, record in enumerate(records):
+            try:
+                prev_contents = backend.set_txt_records(credential, [record])
+                if self._journal is not None:
+                    # applied even if a later value fails
+                    self._journal.record_set(credential, [record], prev_contents)
+                result.extend(prev_contents)
+            except MaybeAppliedMyDnsJpError:
+                # the value may be added later by MyDNS.JP, the members page would add it again in another row
+                raise
+            except Exception as e:
+                logger.warning("MyDNS.JP %s backend failed, fall back to %s backend: %s", backend.name, fallback.name, e)
+                return result + fallback.set_txt_records(credential, records[ix:])
+        return result
 
     def clear_txt_record(self, credential: dict, domain: str, content: str, prev_content: str) -> None:
         """
@@ -158,261 +192,183 @@ class MyDNSJPClient:
 
         :raise UpdateMyDnsJpError: if unexpected sequence occured
         """
-        s = requests.Session()
-        request_url = MYDNSJP_LOGIN_URL
-        request_method = "GET"
-        r = s.request(method=request_method, url=request_url)
-        if r.status_code != 200:
-            raise UpdateMyDnsJpError("Abnormal response from MyDNS.JP web. (LOGIN)")
-        login_form_element = self._get_form_element(r.text, "/members/")
-        if login_form_element is None:
-            raise UpdateMyDnsJpError("Abnormal response from MyDNS.JP web. (LoginForm missing)")
-        login_form_element["masterid"]["value"] = credential["id"]
-        login_form_element["masterpwd"]["value"] = credential["pwd"]
-        login_form_data = self._get_form_data(login_form_element, None)
-        request_url = urllib.parse.urljoin(request_url, login_form_element[""]["action"])
-        request_method = login_form_element[""]["method"].upper()
-        r = s.request(method=request_method, url=request_url, data=login_form_data)
-        if r.status_code != 200:
-            raise UpdateMyDnsJpError("Abnormal response from MyDNS.JP web. (Get DomainInfo)")
-        domain_info_form_element = self._get_form_element(r.text, "/members/#domaininfo")
-        if domain_info_form_element is None:
-            raise UpdateMyDnsJpError("MyDNS.JP login failed. (DomainInfoForm missing)")
-        domainname = self._get_domaininame_element(domain_info_form_element)
-        if domainname is None:
-            raise UpdateMyDnsJpError("No configured domainname at MyDNS.JP. (domainname is None)")
-        domain_suffix = "." + domainname["value"]
-        if not domain.endswith(domain_suffix):
-            raise UpdateMyDnsJpError("Domain suffix mismatch. (DomainInfo domainname between credential domain)")
-        hostname = domain[:-len(domain_suffix)]
-        record_element = self._get_record_element(domain_info_form_element)
-        hostname_elements = self._find_record_element(record_element, hostname, "TXT", content)
-        if hostname_elements is None:
-            raise UpdateMyDnsJpError("Abnormal response from MyDNS.JP web. (hostname_elements missing)")
-        hostname_element = hostname_elements[list(hostname_elements.keys())[0]]
-        if prev_content is not None:
-            hostname_element["hostname"]["value"] = hostname
-            hostname_element["type"]["value"] = "TXT"
-            hostname_element["content"]["value"] = prev_content
-        else :
-            hostname_element["hostname"]["value"] = ""
-            hostname_element["type"]["value"] = "A"
-            hostname_element["content"]["value"] = ""
-        domain_info_form_data = self._get_form_data(domain_info_form_element, None)
-        request_url = urllib.parse.urljoin(request_url, domain_info_form_element[""]["action"])
-        request_method = domain_info_form_element[""]["method"].upper()
-        r = s.request(method=request_method, url=request_url, data=domain_info_form_data)
-        if r.status_code != 200:
-            raise UpdateMyDnsJpError("Abnormal response from MyDNS.JP web. (Send DomainInfo)")
-        confirm_domain_info_form_element = self._get_form_element(r.text, "/members/#domaininfo")
-        if confirm_domain_info_form_element is None:
-            raise UpdateMyDnsJpError("Abnormal response from MyDNS.JP web. (ConfirmForm missing)")
-        confirm_domain_info_form_data = self._get_form_data(confirm_domain_info_form_element, EXCEPT_NAMES_OF_MYDNSJP_CONFIRM)
-        request_url = urllib.parse.urljoin(request_url, confirm_domain_info_form_element[""]["action"])
-        request_method = confirm_domain_info_form_element[""]["method"].upper()
-        r = s.request(method=request_method, url=request_url, data=confirm_domain_info_form_data)
-        if r.status_code != 200:
-            raise UpdateMyDnsJpError("Abnormal response from MyDNS.JP web. (Confirm DomainInfo)")
+        self.clear_txt_records(credential, [(domain, content, prev_content)])
         return None
 
-    def _get_form_element(self, text: str, target: str) -> dict:
-        """
-        Extract form parameter elements from html.
-
-        :param text: html text
-        :param target: action of target form.
-
-        :return: element dictionary of target form
-        """
-        result = None
-        pos_form=0
-        while pos_form < len(text):
-            regexp_form_result = regexp_form.search(text[pos_form:])
-            if regexp_form_result is None:
-                break
-            pos_form += regexp_form_result.end()
-            regexp_action_result = regexp_action.search(regexp_form_result[1])
-            if regexp_action_result is None:
-                continue
-            regexp_method_result = regexp_method.search(regexp_form_result[1])
-            if regexp_method_result is None:
-                continue
-            if regexp_action_result[1] != target:
-                continue
-            if result is None:
-                result = {}
-            name = ""
-            type = "form"
-            action = regexp_action_result[1]
-            method = regexp_method_result[1]
-            result[name] = {}
-            result[name]["type"] = type
-            result[name]["action"] = action
-            result[name]["method"] = method
-            pos_input = 0
-            while pos_input < len(regexp_form_result[2]):
-                regexp_input_result = regexp_input.search(regexp_form_result[2][pos_input:])
-                if regexp_input_result is None:
-                    break
-                pos_input += regexp_input_result.end()
-                regexp_type_result = regexp_type.search(regexp_input_result[1])
-                if regexp_type_result is None:
-                    continue
-                regexp_name_result = regexp_name.search(regexp_input_result[1])
-                if regexp_name_result is None:
-                    continue
-                regexp_value_result = regexp_value.search(regexp_input_result[1])
-                if regexp_value_result is None:
-                    continue
-                type = regexp_type_result[1]
-                name = regexp_name_result[1]
-                value = regexp_value_result[1]
-                result[name] = {}
-                result[name]["type"] = type
-                result[name]["value"] = value
-            pos_select = 0
-            while pos_select < len(regexp_form_result[2]):
-                regexp_select_result = regexp_select.search(regexp_form_result[2][pos_select:])
-                if regexp_select_result is None:
-                    break
-                pos_select += regexp_select_result.end()
-                type = "select"
-                regexp_name_result = regexp_name.search(regexp_select_result[1])
-                if regexp_name_result is None:
-                    continue
-                name = regexp_name_result[1]
-                result[name] = {}
-                result[name]["type"] = type
-                result[name]["option"] = []
-                pos_option = 0
-                while pos_option < len(regexp_select_result[2]):
-                    regexp_option_result = regexp_option.search(regexp_select_result[2][pos_option:])
-                    if regexp_option_result is None:
-                        break
-                    pos_option += regexp_option_result.end()
-                    regexp_value_result = regexp_value.search(regexp_option_result[1])
-                    if regexp_value_result is None:
-                        continue
-                    value = regexp_value_result[1]
-                    result[name]["option"].append(value)
-                    regexp_selected_result = regexp_selected.search(regexp_option_result[1])
-                    if regexp_selected_result is None:
-                        continue
-                    result[name]["value"] = value
+    def clear_txt_records(self, credential: dict, records: list) -> None:
+        """
+        Clear TXT records for domains of one MyDNS.JP account.
+        The members page is used as fallback if the selected backend failed.
+        The update is retried if another process changed the domain info at the same time.
+
+        :param credential: the MyDNS.JP credential used for MyDNS.JP web interface
+        :param records: list of (domain, content, prev_content) tuple, prev_content is string value of restoring TXT record or None (for remove)
+
+        :raise UpdateMyDnsJpError: if unexpected sequence occured
+        """
+        try:
+            self._run_locked(credential, self._clear_txt_records, records)
+        except BaseException:
+            # the clear is given up, its rows must not be kept for a later set of the same values
+            self._backends[ScrapingBackend.name].forget_txt_records(credential, records)
+            raise
+        if self._journal is not None:
+            self._journal.record_clear(credential, records)
+        return None
+
+    def _clear_txt_records(self, credential: dict, records: list) -> None:
+        """
+        Implementation of clear_txt_records, called with the lock of the account.
+        """
+        backend = self._get_backend(credential)
+        fallback = self._backends[ScrapingBackend.name]
+        if backend is fallback:
+            return backend.clear_txt_records(credential, records)
+        for ix, record in enumerate(records):
+            try:
+                backend.clear_txt_records(credential, [record])
+            except Exception as e:
+                logger.warning("MyDNS.JP %s backend failed, fall back to %s backend: %s", backend.name, fallback.name, e)
+                return fallback.clear_txt_records(credential, records[ix:])
+        return None
+
+    def list_txt_records(self, credential: dict, hostname_prefix: str = ACME_CHALLENGE_TXT_PREFIX) -> list:
+        """
+        Read the TXT records of an account whose hostname starts with a prefix, from the members page.
+
+        :param credential: credential used for MyDNS.JP web interface
+        :param hostname_prefix: prefix of the hostname relative to the domainname
+
+        :return: list of (domain, content, journal entry or None) tuple, the entry is given for values set by this plugin
+
+        :raise UpdateMyDnsJpError: if unexpected sequence occured
+        """
+        records = self._backends[ScrapingBackend.name].list_txt_records(credential, hostname_prefix)
+        journal_entries = self._journal.load(credential) if self._journal is not None else {}
+        result = []
+        for domain, content in records:
+            result.append((domain, content, journal_entries.get((domain, content))))
         return result
 
-    def _get_form_data(self, element: dict, except_names: list) -> dict:
+    def update_txt_records(self, credential: dict, clear_records: list, set_records: list, missing_ok: bool = False) -> list:
         """
-        Convert to sending data from parameter element.
+        Clear TXT records then set TXT record values for domains of one MyDNS.JP account,
+        in one domain info submission with the members page.
 
-        :param element: element dictionary of form
-        :param except_names: name list of not to send.
+        :param credential: credential used for MyDNS.JP web interface
+        :param clear_records: list of (domain, content, prev_content) tuple, see clear_txt_records
+        :param set_records: list of (domain, content) tuple, see set_txt_records
+        :param missing_ok: True if a value of clear_records held by no row is already cleared (e.g. queued clears)
 
-        :return: sending data
+        :return: list of previous TXT record value or None, in order of set_records
+
+        :raise UpdateMyDnsJpError: if unexpected sequence occured
         """
-        result = None
-        for name, param in element.items():
-            if name == "":
-                continue
-            if "value" not in param:
-                continue
-            if except_names is not None and name in except_names:
-                continue
-            if result is None:
-                result = {}
-            result[name] = param["value"]
+        try:
+            result = self._run_journaled(credential, self._update_txt_records, (clear_records, set_records, missing_ok), set_records)
+        except BaseException:
+            self._backends[ScrapingBackend.name].forget_txt_records(credential, clear_records)
+            raise
+        if self._journal is not None:
+            self._journal.record_clear(credential, clear_records)
+            self._journal.record_set(credential, set_records, result)
         return result
 
-    def _get_domaininame_element(self, element: dict) -> dict:
+    def _update_txt_records(self, credential: dict, records: tuple) -> list:
+        """
+        Implementation of update_txt_records, called with the lock of the account.
         """
-        Get domainname element from element dictionary.
+        clear_records, set_records, missing_ok = records
+        backend = self._get_backend(credential)
+        if backend is self._backends[ScrapingBackend.name]:
+            return backend.update_txt_records(credential, clear_records, set_records, missing_ok)
+        # one value per request, with the fallback of each operation
+        self._clear_txt_records(credential, clear_records)
+        return self._set_txt_records(credential, set_records)
+
+    def prefetch(self, credential: dict) -> None:
+        """
+        Login and read the domain info of an account in advance, if the account is not being updated now.
 
-        :param element: element dictionary of form
+        :param credential: credential used for MyDNS.JP web interface
 
-        :return: domainname element
+        :raise UpdateMyDnsJpError: if the account is locked or unexpected sequence occured
         """
-        if NAME_OF_MYDNSJP_DOMAINNAME not in element:
-            return None
-        return element[NAME_OF_MYDNSJP_DOMAINNAME]
+        with AccountLock(credential["id"], self._lock_dir, 0) as lock:
+            self._get_backend(credential).prefetch(credential, lock.generation)
 
-    def _get_mx_element(self, element: dict) -> dict:
+    def cancel_prefetch(self) -> None:
         """
-        Get mx element from element dictionary.
+        Discard prefetched states of all backends.
+        """
+        for backend in self._backends.values():
+            backend.cancel_prefetch()
+
+    def _run_journaled(self, credential: dict, func: callable, records, set_records: list):
+        """
+        Run func with _run_locked, the values of set_records are journaled as pending before they are submitted
+        and removed from the journal only if the update surely was not applied.
+
+        :param credential: credential used for MyDNS.JP web interface
+        :param func: callable(credential, records)
+        :param records: records passed to func
+        :param set_records: list of (domain, content) tuple set by func
 
-        :param element: element dictionary of form
+        :return: result of func
 
-        :return: mx element dictionary
+        :raise UpdateMyDnsJpError: if unexpected sequence occured or the conflict remained
         """
-        result = None
-        for name, param in element.items():
-            if name == "":
-                continue
-            if "value" not in param:
-                continue
-            regexp_name_of_mydnsjp_dnsinfo_result = regexp_name_of_mydnsjp_dnsinfo.search(name)
-            if regexp_name_of_mydnsjp_dnsinfo_result is None:
-                continue
-            key = regexp_name_of_mydnsjp_dnsinfo_result[1]
-            ix = regexp_name_of_mydnsjp_dnsinfo_result[2]
-            value = param["value"]
-            if key not in KEYS_OF_MYDNSJP_MX:
-                continue
-            if result is None:
-                result = {}
-            if ix not in result:
-                result[ix] = {}
-            result[ix][key] = param
-        return result
+        if self._journal is None:
+            return self._run_locked(credential, func, records)
+        self._journal.record_intent(credential, set_records)
+        try:
+            return self._run_locked(credential, func, records)
+        except MaybeAppliedMyDnsJpError:
+            raise
+        except Exception:
+            self._journal.record_failed(credential, set_records)
+            raise
+
+    def _run_locked(self, credential: dict, func: callable, records: list):
+        """
+        Run func with the lock of the account, retry it on conflict.
 
-    def _get_record_element(self, element: dict) -> dict:
-        """
-        Get record element from element dictionary.
-
-        :param element: element dictionary of form
-
-        :return: record element dictionary
-        """
-        result = None
-        for name, param in element.items():
-            if name == "":
-                continue
-            if "value" not in param:
-                continue
-            regexp_name_of_mydnsjp_dnsinfo_result = regexp_name_of_mydnsjp_dnsinfo.search(name)
-            if regexp_name_of_mydnsjp_dnsinfo_result is None:
-                continue
-            key = regexp_name_of_mydnsjp_dnsinfo_result[1]
-            ix = regexp_name_of_mydnsjp_dnsinfo_result[2]
-            value = param["value"]
-            if key not in KEYS_OF_MYDNSJP_RECORD:
-                continue
-            if result is None:
-                result = {}
-            if ix not in result:
-                result[ix] = {}
-            result[ix][key] = param
-        return result
+        :param credential: credential used for MyDNS.JP web interface
+        :param func: function called with (credential, records)
+        :param records: records passed to func
 
-    def _find_record_element(self, record: dict, hostname: str, type: str, content: str) -> dict:
+        :return: result of func
+
+        :raise UpdateMyDnsJpError: if unexpected sequence occured or the conflict remained
+        """
+        with AccountLock(credential["id"], self._lock_dir, self._lock_timeout) as lock:
+            for backend in self._backends.values():
+                backend.validate_prefetched(credential, lock.generation)
+            attempt = 0
+            relogin = False
+            try:
+                while True:
+                    try:
+                        return func(credential, records)
+                    except SessionExpiredMyDnsJpError as e:
+                        if relogin:
+                            raise
+                        relogin = True
+                        logger.warning("MyDNS.JP session expired during the update, login again and retry: %s", e)
+                    except ConflictMyDnsJpError as e:
+                        if attempt >= MAX_CONFLICT_RETRIES:
+                            raise
+                        attempt += 1
+                        logger.warning("MyDNS.JP update conflicted, retry (%d/%d): %s", attempt, MAX_CONFLICT_RETRIES, e)
+            finally:
+                lock.bump()
+
+    def _get_backend(self, credential: dict) -> MyDNSJPBackend:
         """
-        Find record element from record dictionary.
+        Get the backend selected by the credential.
 
-        :param record: record dictionary
-        :param hostname: search hostname or None
-        :param type: search type or None
-        :param content: search content or None
+        :param credential: credential used for MyDNS.JP web interface
 
-        :return: record element dictionary
+        :return: backend object
         """
-        result = None
-        for key, param in record.items():
-            if hostname is not None and param["hostname"]["value"] != hostname:
-                continue
-            if type is not None and param["type"]["value"] != type:
-                continue
-            if content is not None and param["content"]["value"] != content:
-                continue
-            if result is None:
-                result = {}
-            result[key] = param
-        return result
+        return self._backends[credential.get("backend", DEFAULT_BACKEND)]
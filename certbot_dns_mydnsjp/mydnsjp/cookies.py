@@ -0,0 +1,127 @@
+import hashlib
+import json
+import logging
+import os
+import stat
+import tempfile
+import threading
+import time
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_COOKIE_CACHE_TTL = 1800.0
+COOKIE_CACHE_SUFFIX = ".session"
+
+class CookieCache:
+    """
+    Cookies of logged-in MyDNS.JP sessions saved to a file, so that later processes skip the login.
+    The file is readable only by the owner, and an entry is used only within the TTL after the login.
+    """
+
+    def __init__(self, path: str, ttl: float = DEFAULT_COOKIE_CACHE_TTL, validate_permissions: callable = None) -> None:
+        """
+        Creates a new CookieCache object.
+
+        :param path: path of the cache file
+        :param ttl: seconds a saved session is used after its login
+        :param validate_permissions: callable(path) checking the permissions of an existing cache file or None
+        """
+        self._path = path
+        self._ttl = ttl
+        self._validate_permissions = validate_permissions
+        self._lock = threading.Lock()
+
+    def load(self, credential: dict, s: requests.Session) -> bool:
+        """
+        Put the saved cookies of a credential into a session.
+
+        :param credential: credential used for MyDNS.JP web interface
+        :param s: new session of the credential
+
+        :return: True if cookies were loaded
+        """
+        with self._lock:
+            entry = self._read().get(self._key(credential))
+        if entry is None or time.time() - entry["saved"] > self._ttl:
+            return False
+        for cookie in entry["cookies"]:
+            s.cookies.set(cookie["name"], cookie["value"], domain=cookie["domain"], path=cookie["path"],
+                          secure=cookie["secure"], expires=cookie["expires"])
+        logger.debug("Loaded MyDNS.JP session of %s from %s", credential["id"], self._path)
+        return True
+
+    def save(self, credential: dict, s: requests.Session) -> None:
+        """
+        Save the cookies of a just logged-in session.
+
+        :param credential: credential used for MyDNS.JP web interface
+        :param s: session of the credential
+        """
+        cookies = []
+        for cookie in s.cookies:
+            cookies.append({"name": cookie.name, "value": cookie.value, "domain": cookie.domain,
+                            "path": cookie.path, "secure": cookie.secure, "expires": cookie.expires})
+        with self._lock:
+            entries = self._read()
+            entries[self._key(credential)] = {"saved": time.time(), "cookies": cookies}
+            self._write(entries)
+
+    def invalidate(self, credential: dict) -> None:
+        """
+        Remove the saved session of a credential.
+
+        :param credential: credential used for MyDNS.JP web interface
+        """
+        with self._lock:
+            entries = self._read()
+            if entries.pop(self._key(credential), None) is not None:
+                self._write(entries)
+
+    def _key(self, credential: dict) -> str:
+        """
+        Get the entry key of a credential (the master id is not stored as is).
+
+        :param credential: credential used for MyDNS.JP web interface
+
+        :return: key
+        """
+        return hashlib.sha256(credential["id"].encode("utf-8")).hexdigest()
+
+    def _read(self) -> dict:
+        """
+        Read all entries, an unreadable or unsafe file is ignored.
+
+        :return: dictionary of key to entry
+        """
+        if not os.path.exists(self._path):
+            return {}
+        if self._validate_permissions is not None:
+            self._validate_permissions(self._path)
+        if stat.S_IMODE(os.stat(self._path).st_mode) & 0o077 != 0:
+            logger.warning("Ignore MyDNS.JP session cache %s, it is accessible by other users.", self._path)
+            return {}
+        try:
+            with open(self._path) as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning("Ignore MyDNS.JP session cache %s: %s", self._path, e)
+            return {}
+
+    def _write(self, entries: dict) -> None:
+        """
+        Replace the cache file atomically, readable only by the owner.
+
+        :param entries: dictionary of key to entry
+        """
+        directory = os.path.dirname(os.path.abspath(self._path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".mydnsjp_session_")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(entries, f)
+            os.chmod(tmp_path, 0o600)
+            os.replace(tmp_path, self._path)
+        except Exception:
+            os.unlink(tmp_path)
+            raise
@@ -0,0 +1,68 @@
+import atexit
+import logging
+import threading
+
+from certbot_dns_mydnsjp.mydnsjp.client import MyDNSJPClient
+
+logger = logging.getLogger(__name__)
+
+class DeferredCleanups:
+    """
+    Queue of TXT record clears of the process, keyed by MyDNS.JP account.
+    certbot renew creates a plugin object for each certificate, so the queue is shared by the process.
+    A later perform of the account takes the queued clears into its own update, the rest is flushed at exit.
+    """
+
+    def __init__(self) -> None:
+        """
+        Creates a new DeferredCleanups object.
+        """
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._registered = False
+
+    def add(self, client: MyDNSJPClient, credential: dict, records: list) -> None:
+        """
+        Queue TXT records to clear.
+
+        :param client: client used to clear the records if they are flushed
+        :param credential: credential used for MyDNS.JP web interface
+        :param records: list of (domain, content, prev_content) tuple
+        """
+        with self._lock:
+            if not self._registered:
+                atexit.register(self.flush)
+                self._registered = True
+            pending = self._pending.get(credential["id"])
+            queued = [] if pending is None else pending[2]
+            # the latest client is used, clients of earlier certificates may be discarded
+            self._pending[credential["id"]] = (client, credential, queued + list(records))
+
+    def take(self, account: str) -> tuple:
+        """
+        Remove the queued TXT records of an account.
+        Give them back with add if they could not be cleared.
+
+        :param account: MyDNS.JP master id
+
+        :return: (client, credential, list of (domain, content, prev_content) tuple) tuple or None if nothing is queued
+        """
+        with self._lock:
+            return self._pending.pop(account, None)
+
+    def flush(self) -> None:
+        """
+        Clear all queued TXT records, one update per account. A value already gone is skipped.
+        Failures are logged, the records are left to certbot-dns-mydnsjp-sweep.
+        """
+        with self._lock:
+            pending = list(self._pending.values())
+            self._pending.clear()
+        for client, credential, records in pending:
+            try:
+                client.update_txt_records(credential, records, [], missing_ok=True)
+            except Exception as e:
+                logger.error("Failed to clear deferred MyDNS.JP TXT records of %s (%s): %s",
+                             credential["id"], ",".join(domain for domain, content, prev_content in records), e)
+
+deferred_cleanups = DeferredCleanups()
@@ -0,0 +1,92 @@
+from certbot_dns_mydnsjp.mydnsjp.backend import MyDNSJPBackend, RequestContext, RequestPolicy
+from certbot_dns_mydnsjp.mydnsjp.errors import UpdateMyDnsJpError
+from certbot_dns_mydnsjp.mydnsjp.metrics import MetricsRecorder
+from certbot_dns_mydnsjp.mydnsjp.ratelimit import RateLimiter
+from certbot_dns_mydnsjp.mydnsjp.session import MyDNSJPSessionManager
+
+MYDNSJP_DIRECTEDIT_URL = "https://www.mydns.jp/directedit.html"
+EDIT_CMD_REGIST = "REGIST"
+EDIT_CMD_DELETE = "DELETE"
+
+ACME_CHALLENGE_TXT_PREFIX = "_acme-challenge"
+
+class DirectEditBackend(MyDNSJPBackend):
+    """
+    Backend using the DirectEDIT interface of MyDNS.JP, one authenticated request per TXT record.
+    DirectEDIT can not read the previous TXT value, so it can not restore it.
+    """
+
+    name = "directedit"
+    batch = False
+
+    def __init__(self, session_manager: MyDNSJPSessionManager, url: str = MYDNSJP_DIRECTEDIT_URL, metrics: MetricsRecorder = None,
+                 policy: RequestPolicy = None, limiter: RateLimiter = None) -> None:
+        """
+        Creates a new DirectEditBackend object.
+
+        :param session_manager: session manager shared by backends
+        :param url: url of the DirectEDIT interface
+        :param metrics: recorder of phase metrics or None
+        :param policy: timeouts and retry settings or None
+        :param limiter: rate limiter shared by backends or None
+        """
+        super().__init__(session_manager, metrics, policy, limiter)
+        self._url = url
+
+    def _set_txt_records(self, ctx: RequestContext, records: list) -> list:
+        """
+        Register TXT record values using DirectEDIT.
+
+        :param ctx: context of this call
+        :param records: list of (domain, content) tuple, domain must start with "_acme-challenge."
+
+        :return: list of None (previous TXT value is unknown), in order of records
+
+        :raise UpdateMyDnsJpError: if DirectEDIT request failed
+        """
+        result = []
+        for domain, content in records:
+            self._edit(ctx, EDIT_CMD_REGIST, domain, content)
+            result.append(None)
+        return result
+
+    def _clear_txt_records(self, ctx: RequestContext, records: list) -> None:
+        """
+        Delete TXT record values using DirectEDIT.
+
+        :param ctx: context of this call
+        :param records: list of (domain, content, prev_content) tuple, prev_content must be None
+
+        :raise UpdateMyDnsJpError: if DirectEDIT request failed or restoring is requested
+        """
+        for domain, content, prev_content in records:
+            if prev_content is not None:
+                raise UpdateMyDnsJpError("DirectEDIT can not restore previous TXT value.")
+            self._edit(ctx, EDIT_CMD_DELETE, domain, content)
+        return None
+
+    def _edit(self, ctx: RequestContext, edit_cmd: str, domain: str, content: str) -> None:
+        """
+        Send a DirectEDIT request.
+        REGIST is not retried after the request may have reached MyDNS.JP, it would fill another record.
+
+        :param ctx: context of this call
+        :param edit_cmd: REGIST or DELETE
+        :param domain: acme_challenge fully qualified domain name
+        :param content: the string value of TXT record
+
+        :raise UpdateMyDnsJpError: if DirectEDIT request failed
+        """
+        if not domain.startswith(ACME_CHALLENGE_TXT_PREFIX + "."):
+            raise UpdateMyDnsJpError("DirectEDIT supports only acme_challenge TXT record.")
+        data = {
+            "CERTBOT_DOMAIN": domain[len(ACME_CHALLENGE_TXT_PREFIX + "."):],
+            "CERTBOT_VALIDATION": content,
+            "EDIT_CMD": edit_cmd,
+        }
+        credential = ctx.credential
+        s = self._session_manager.get_session(credential)
+        r = self._request(ctx, s, "directedit", "POST", self._url, replayable=(edit_cmd == EDIT_CMD_DELETE),
+                          data=data, auth=(credential["id"], credential["pwd"]))
+        if r.status_code != 200:
+            raise UpdateMyDnsJpError(f"Abnormal response from MyDNS.JP DirectEDIT. ({edit_cmd} status={r.status_code})")
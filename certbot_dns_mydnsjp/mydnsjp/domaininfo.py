@@ -0,0 +1,221 @@
+import re
+
+regexp_name_of_mydnsjp_dnsinfo = re.compile("^DNSINFO\\[([^\\]]+)\\]\\[([^\\]]+)\\]",re.S|re.I)
+NAME_OF_MYDNSJP_DOMAINNAME = "DNSINFO[domainname]"
+KEYS_OF_MYDNSJP_RECORD = ["hostname","type","content","delegateid"]
+
+class DomainInfoRecord:
+    """
+    One DNSINFO record row of the domain info form.
+    A value is None if the form has no value for it.
+    """
+
+    __slots__ = ("ix", "hostname", "type", "content", "delegateid")
+
+    def __init__(self, ix: str) -> None:
+        """
+        Creates a new DomainInfoRecord object.
+
+        :param ix: index of the row in the form ("n" of DNSINFO[...][n])
+        """
+        self.ix = ix
+        self.hostname = None
+        self.type = None
+        self.content = None
+        self.delegateid = None
+
+    def values(self) -> tuple:
+        """
+        Get the values changed by updates.
+
+        :return: tuple of (hostname, type, content)
+        """
+        return (self.hostname, self.type, self.content)
+
+    def is_free(self) -> bool:
+        """
+        Check if the row is an empty row.
+
+        :return: True if hostname, content are empty and type is A
+        """
+        return self.hostname == "" and self.type == "A" and self.content == ""
+
+class DomainInfo:
+    """
+    Domain info form of MyDNS.JP with indexed DNSINFO record rows.
+    """
+
+    def __init__(self, form_element: dict) -> None:
+        """
+        Creates a new DomainInfo object from the element dictionary of domain info form.
+
+        :param form_element: element dictionary of domain info form
+        """
+        self.action = form_element[""]["action"]
+        self.method = form_element[""]["method"]
+        self.domainname = None
+        self.records = []
+        self._fields = {}
+        self._records_by_ix = {}
+        self._by_hostname = {}
+        self._by_hostname_type = {}
+        self._by_content = {}
+        self._free = {}
+        self._original = {}
+        for name, param in form_element.items():
+            if name == "":
+                continue
+            if "value" not in param:
+                continue
+            if name == NAME_OF_MYDNSJP_DOMAINNAME:
+                self.domainname = param["value"]
+            regexp_name_of_mydnsjp_dnsinfo_result = regexp_name_of_mydnsjp_dnsinfo.search(name)
+            if regexp_name_of_mydnsjp_dnsinfo_result is None or regexp_name_of_mydnsjp_dnsinfo_result[1] not in KEYS_OF_MYDNSJP_RECORD:
+                self._fields[name] = param["value"]
+                continue
+            key = regexp_name_of_mydnsjp_dnsinfo_result[1]
+            ix = regexp_name_of_mydnsjp_dnsinfo_result[2]
+            record = self._records_by_ix.get(ix)
+            if record is None:
+                record = DomainInfoRecord(ix)
+                self._records_by_ix[ix] = record
+                self.records.append(record)
+            setattr(record, key, param["value"])
+        for record in self.records:
+            self._index(record)
+            self._original[record.ix] = record.values()
+
+    def get_record(self, ix: str) -> DomainInfoRecord:
+        """
+        Get record by row index.
+
+        :param ix: index of the row
+
+        :return: record or None
+        """
+        return self._records_by_ix.get(ix)
+
+    def find(self, hostname: str, type: str, content: str) -> DomainInfoRecord:
+        """
+        Find the first record matching all given values.
+
+        :param hostname: search hostname or None
+        :param type: search type or None
+        :param content: search content or None
+
+        :return: record or None
+        """
+        if hostname is not None and type is not None:
+            candidates = self._by_hostname_type.get((hostname, type), {})
+        elif hostname is not None:
+            candidates = self._by_hostname.get(hostname, {})
+        elif content is not None:
+            candidates = self._by_content.get(content, {})
+        else:
+            candidates = self._records_by_ix
+        for record in candidates.values():
+            if hostname is not None and record.hostname != hostname:
+                continue
+            if type is not None and record.type != type:
+                continue
+            if content is not None and record.content != content:
+                continue
+            return record
+        return None
+
+    def find_all(self, hostname: str, type: str) -> list:
+        """
+        Find all records of hostname (and type).
+
+        :param hostname: search hostname
+        :param type: search type or None
+
+        :return: list of record
+        """
+        if type is not None:
+            return list(self._by_hostname_type.get((hostname, type), {}).values())
+        return list(self._by_hostname.get(hostname, {}).values())
+
+    def find_free(self) -> DomainInfoRecord:
+        """
+        Find the first empty row.
+
+        :return: record or None
+        """
+        for record in self._free.values():
+            return record
+        return None
+
+    def update(self, record: DomainInfoRecord, hostname: str, type: str, content: str) -> None:
+        """
+        Update values of record and its indexes.
+
+        :param record: record of this domain info
+        :param hostname: new hostname
+        :param type: new type
+        :param content: new content
+        """
+        self._unindex(record)
+        record.hostname = hostname
+        record.type = type
+        record.content = content
+        self._index(record)
+
+    def clear(self, record: DomainInfoRecord) -> None:
+        """
+        Make record an empty row.
+
+        :param record: record of this domain info
+        """
+        self.update(record, "", "A", "")
+
+    def get_changes(self) -> list:
+        """
+        Get the rows changed since the form was parsed.
+
+        :return: list of (record, (hostname, type, content) before the change) tuple, in order of the rows
+        """
+        changes = []
+        for record in self.records:
+            original = self._original[record.ix]
+            if record.values() != original:
+                changes.append((record, original))
+        return changes
+
+    def get_form_data(self) -> dict:
+        """
+        Convert to sending data of domain info form.
+
+        :return: sending data
+        """
+        result = dict(self._fields)
+        for record in self.records:
+            for key in KEYS_OF_MYDNSJP_RECORD:
+                value = getattr(record, key)
+                if value is None:
+                    continue
+                result[f"DNSINFO[{key}][{record.ix}]"] = value
+        return result
+
+    def _index(self, record: DomainInfoRecord) -> None:
+        """
+        Add record to indexes.
+
+        :param record: record of this domain info
+        """
+        self._by_hostname.setdefault(record.hostname, {})[record.ix] = record
+        self._by_hostname_type.setdefault((record.hostname, record.type), {})[record.ix] = record
+        self._by_content.setdefault(record.content, {})[record.ix] = record
+        if record.is_free():
+            self._free[record.ix] = record
+
+    def _unindex(self, record: DomainInfoRecord) -> None:
+        """
+        Remove record from indexes.
+
+        :param record: record of this domain info
+        """
+        self._by_hostname[record.hostname].pop(record.ix, None)
+        self._by_hostname_type[(record.hostname, record.type)].pop(record.ix, None)
+        self._by_content[record.content].pop(record.ix, None)
+        self._free.pop(record.ix, None)
@@ -0,0 +1,47 @@
+class NotValidMyDnsJpCredentialError(Exception):
+    """
+    Exception if the credential is not a valid format for dns_mydnsjp.
+    """
+
+    def __init__(self):
+        super().__init__("The credential is not a valid format for dns_mydnsjp.")
+
+class UpdateMyDnsJpError(Exception):
+    """
+    Exception if error occured at update domain info of MyDNS.JP.
+    retries is the list of retried request descriptions before the error.
+    """
+
+    def __init__(self, message, retries: list = None):
+        self.message = message
+        self.retries = list(retries) if retries is not None else []
+        super().__init__(self.message)
+
+    def __str__(self) -> str:
+        if len(self.retries) == 0:
+            return self.message
+        return f"{self.message} (retried: {'; '.join(self.retries)})"
+
+class MaybeAppliedMyDnsJpError(UpdateMyDnsJpError):
+    """
+    Exception if a not replayable request failed after it may have reached MyDNS.JP,
+    the change may have been applied.
+    """
+
+class SessionExpiredMyDnsJpError(UpdateMyDnsJpError):
+    """
+    Exception if MyDNS.JP returned the login page to an update of a logged-in session,
+    the session expired after the domain info was read.
+    """
+
+class TxtRecordMissingMyDnsJpError(UpdateMyDnsJpError):
+    """
+    Exception if no row of the domain info holds a TXT value to clear,
+    e.g. it was already removed by certbot-dns-mydnsjp-sweep or by hand.
+    """
+
+class ConflictMyDnsJpError(UpdateMyDnsJpError):
+    """
+    Exception if the domain info of MyDNS.JP did not have the intended TXT records after confirm,
+    e.g. another process updated the same account at the same time.
+    """
@@ -0,0 +1,219 @@
+import contextlib
+import hashlib
+import json
+import logging
+import os
+import stat
+import tempfile
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+JOURNAL_SUFFIX = ".journal"
+
+class TxtJournal:
+    """
+    TXT values set by this plugin saved to a file until they are cleared, with the value they replaced.
+    Values are saved as pending before they are submitted, so a value whose update may have been applied
+    (or a crash after the submission) is journaled too, the replaced value of a pending entry is unknown (None).
+    Values left by a crashed run are found in the journal by the sweep command, which tells them
+    from TXT records of others and restores the replaced values.
+    Failures to read or write the journal are logged and do not fail the update or the sweep.
+    """
+
+    def __init__(self, path: str) -> None:
+        """
+        Creates a new TxtJournal object.
+
+        :param path: path of the journal file
+        """
+        self._path = path
+        self._lock = threading.Lock()
+
+    def record_intent(self, credential: dict, records: list) -> None:
+        """
+        Add TXT values about to be submitted as pending. A value already in the journal is kept as is.
+
+        :param credential: credential used for MyDNS.JP web interface
+        :param records: list of (domain, content) tuple
+        """
+        def update(entries: dict) -> None:
+            account_entries = entries.setdefault(self._key(credential), [])
+            for domain, content in records:
+                if self._find(account_entries, domain, content) is None:
+                    account_entries.append({"domain": domain, "content": content, "prev": None, "time": time.time(), "pending": True})
+        self._update(update)
+
+    def record_failed(self, credential: dict, records: list) -> None:
+        """
+        Remove pending TXT values whose update surely was not applied.
+
+        :param credential: credential used for MyDNS.JP web interface
+        :param records: list of (domain, content) tuple
+        """
+        failed = set((record[0], record[1]) for record in records)
+        def update(entries: dict) -> None:
+            key = self._key(credential)
+            account_entries = [entry for entry in entries.get(key, [])
+                               if not entry.get("pending", False) or (entry["domain"], entry["content"]) not in failed]
+            if len(account_entries) > 0:
+                entries[key] = account_entries
+            else:
+                entries.pop(key, None)
+        self._update(update)
+
+    def record_set(self, credential: dict, records: list, prev_contents: list) -> None:
+        """
+        Add TXT values just set, or complete their pending entries. A value already set in the journal keeps its replaced value.
+
+        :param credential: credential used for MyDNS.JP web interface
+        :param records: list of (domain, content) tuple
+        :param prev_contents: list of previous TXT record value or None, in order of records
+        """
+        def update(entries: dict) -> None:
+            account_entries = entries.setdefault(self._key(credential), [])
+            for (domain, content), prev_content in zip(records, prev_contents):
+                entry = self._find(account_entries, domain, content)
+                if entry is None:
+                    account_entries.append({"domain": domain, "content": content, "prev": prev_content, "time": time.time()})
+                else:
+                    if entry.pop("pending", False):
+                        entry["prev"] = prev_content
+                    entry["time"] = time.time()
+        self._update(update)
+
+    def record_clear(self, credential: dict, records: list) -> None:
+        """
+        Remove TXT values just cleared.
+
+        :param credential: credential used for MyDNS.JP web interface
+        :param records: list of (domain, content, ...) tuple
+        """
+        cleared = set((record[0], record[1]) for record in records)
+        def update(entries: dict) -> None:
+            key = self._key(credential)
+            account_entries = [entry for entry in entries.get(key, []) if (entry["domain"], entry["content"]) not in cleared]
+            if len(account_entries) > 0:
+                entries[key] = account_entries
+            else:
+                entries.pop(key, None)
+        self._update(update)
+
+    def load(self, credential: dict) -> dict:
+        """
+        Get the journal entries of an account, the journal is read once.
+
+        :param credential: credential used for MyDNS.JP web interface
+
+        :return: dictionary of (domain, content) to entry, an entry has "prev" (replaced value or None)
+                 and "time" (epoch seconds when set), empty if the journal can not be read
+        """
+        try:
+            with self._locked():
+                entries = self._read()
+        except OSError as e:
+            logger.warning("Failed to read MyDNS.JP TXT journal %s: %s", self._path, e)
+            return {}
+        result = {}
+        for entry in entries.get(self._key(credential), []):
+            result[(entry["domain"], entry["content"])] = entry
+        return result
+
+    def _find(self, account_entries: list, domain: str, content: str) -> dict:
+        """
+        Find the entry of a TXT value in the entries of an account.
+
+        :param account_entries: list of entry
+        :param domain: fully qualified domain name of the TXT record
+        :param content: the string value of TXT record
+
+        :return: entry or None
+        """
+        for entry in account_entries:
+            if entry["domain"] == domain and entry["content"] == content:
+                return entry
+        return None
+
+    def _key(self, credential: dict) -> str:
+        """
+        Get the entry key of a credential (the master id is not stored as is).
+
+        :param credential: credential used for MyDNS.JP web interface
+
+        :return: key
+        """
+        return hashlib.sha256(credential["id"].encode("utf-8")).hexdigest()
+
+    def _update(self, func: callable) -> None:
+        """
+        Read, modify with func and write the journal while holding its lock.
+
+        :param func: callable(entries) modifying the dictionary of key to entries
+        """
+        try:
+            with self._locked():
+                entries = self._read()
+                func(entries)
+                self._write(entries)
+        except OSError as e:
+            logger.warning("Failed to update MyDNS.JP TXT journal %s: %s", self._path, e)
+
+    @contextlib.contextmanager
+    def _locked(self):
+        """
+        Hold the lock of the journal between threads and processes.
+
+        :raise OSError: if the lock file is unsafe or can not be opened
+        """
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+            lock_path = self._path + ".lock"
+            fd = os.open(lock_path, os.O_RDWR | os.O_CREAT | os.O_NOFOLLOW, 0o600)
+            try:
+                st = os.fstat(fd)
+                if not stat.S_ISREG(st.st_mode) or st.st_uid != os.geteuid():
+                    raise PermissionError(f"Unsafe lock file of MyDNS.JP TXT journal. ({lock_path})")
+                fcntl.flock(fd, fcntl.LOCK_EX)
+                yield
+            finally:
+                os.close(fd)
+
+    def _read(self) -> dict:
+        """
+        Read all entries, an unreadable file is ignored.
+
+        :return: dictionary of key to entries
+        """
+        if not os.path.exists(self._path):
+            return {}
+        try:
+            with open(self._path) as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning("Ignore MyDNS.JP TXT journal %s: %s", self._path, e)
+            return {}
+
+    def _write(self, entries: dict) -> None:
+        """
+        Replace the journal file atomically, readable only by the owner.
+
+        :param entries: dictionary of key to entries
+        """
+        directory = os.path.dirname(os.path.abspath(self._path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".mydnsjp_journal_")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(entries, f)
+            os.chmod(tmp_path, 0o600)
+            os.replace(tmp_path, self._path)
+        except Exception:
+            os.unlink(tmp_path)
+            raise
@@ -0,0 +1,123 @@
+import hashlib
+import os
+import stat
+import tempfile
+import time
+
+from certbot_dns_mydnsjp.mydnsjp.errors import UpdateMyDnsJpError
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# the plugin and the commands use the credentials INI file path + LOCK_DIR_SUFFIX, this is the default of the library
+DEFAULT_LOCK_DIR = os.path.join(tempfile.gettempdir(), "certbot_dns_mydnsjp-" + str(os.getuid() if hasattr(os, "getuid") else 0))
+LOCK_DIR_SUFFIX = ".locks"
+DEFAULT_LOCK_TIMEOUT = 600.0
+LOCK_POLL_INTERVAL = 0.1
+
+class AccountLock:
+    """
+    Exclusive lock of one MyDNS.JP account shared between processes (and threads) of the host.
+    The lock is an flock of a file in the lock directory, named by the hash of the account.
+    The file holds a generation number incremented by each update, to detect changes made after a prefetch.
+    The lock directory must be owned by the user and not accessible by others (mode 0700),
+    and symbolic links are not followed, so other users can not redirect the writes or hold the lock.
+    Without fcntl (e.g. on Windows) the lock does nothing and the generation is None.
+    """
+
+    def __init__(self, account: str, lock_dir: str = DEFAULT_LOCK_DIR, timeout: float = DEFAULT_LOCK_TIMEOUT) -> None:
+        """
+        Creates a new AccountLock object.
+
+        :param account: MyDNS.JP master id
+        :param lock_dir: directory of lock files
+        :param timeout: seconds to wait the lock
+        """
+        self._path = os.path.join(lock_dir, "mydnsjp-" + hashlib.sha256(account.encode("utf-8")).hexdigest()[:16] + ".lock")
+        self._lock_dir = lock_dir
+        self._timeout = timeout
+        self._fd = None
+        self.generation = None
+
+    def acquire(self) -> None:
+        """
+        Acquire the lock, waiting up to the timeout.
+
+        :raise UpdateMyDnsJpError: if the lock was not acquired in time (immediately if timeout is 0) or the lock directory is unsafe
+        """
+        if fcntl is None:
+            return
+        fd = self._open()
+        deadline = time.monotonic() + self._timeout
+        while True:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                break
+            except BlockingIOError:
+                if time.monotonic() >= deadline:
+                    os.close(fd)
+                    raise UpdateMyDnsJpError(f"Timeout waiting the lock of MyDNS.JP account. ({self._path})")
+                time.sleep(LOCK_POLL_INTERVAL)
+        self._fd = fd
+        data = os.pread(fd, 32, 0).strip()
+        self.generation = int(data) if data.isdigit() else 0
+
+    def _open(self) -> int:
+        """
+        Create the lock directory if needed, check it and open the lock file in it.
+
+        :return: file descriptor of the lock file
+
+        :raise UpdateMyDnsJpError: if the lock directory or the lock file is unsafe or can not be opened
+        """
+        try:
+            os.makedirs(self._lock_dir, mode=0o700, exist_ok=True)
+            dir_fd = os.open(self._lock_dir, os.O_RDONLY | os.O_DIRECTORY | os.O_NOFOLLOW)
+        except OSError as e:
+            raise UpdateMyDnsJpError(f"Failed to open the lock directory of MyDNS.JP accounts. ({self._lock_dir}: {e})")
+        try:
+            st = os.fstat(dir_fd)
+            if st.st_uid != os.geteuid() or stat.S_IMODE(st.st_mode) & 0o077 != 0:
+                raise UpdateMyDnsJpError(f"Unsafe lock directory of MyDNS.JP accounts, it must be owned by the user with mode 0700. ({self._lock_dir})")
+            try:
+                fd = os.open(os.path.basename(self._path), os.O_RDWR | os.O_CREAT | os.O_NOFOLLOW, 0o600, dir_fd=dir_fd)
+            except OSError as e:
+                raise UpdateMyDnsJpError(f"Failed to open the lock file of MyDNS.JP account. ({self._path}: {e})")
+        finally:
+            os.close(dir_fd)
+        st = os.fstat(fd)
+        if not stat.S_ISREG(st.st_mode) or st.st_uid != os.geteuid():
+            os.close(fd)
+            raise UpdateMyDnsJpError(f"Unsafe lock file of MyDNS.JP account. ({self._path})")
+        return fd
+
+    def bump(self) -> None:
+        """
+        Increment the generation number, called after the account may have been updated.
+        """
+        if self._fd is None:
+            return
+        self.generation += 1
+        os.ftruncate(self._fd, 0)
+        os.pwrite(self._fd, str(self.generation).encode("ascii"), 0)
+
+    def release(self) -> None:
+        """
+        Release the lock.
+        """
+        if self._fd is None:
+            return
+        try:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        finally:
+            os.close(self._fd)
+            self._fd = None
+
+    def __enter__(self) -> "AccountLock":
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.release()
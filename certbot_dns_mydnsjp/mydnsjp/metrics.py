@@ -0,0 +1,151 @@
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+
+logger = logging.getLogger(__name__)
+
+PROMETHEUS_METRIC_PREFIX = "certbot_dns_mydnsjp"
+PROMETHEUS_TEXTFILE_MODE = 0o600
+
+class PhaseMetric:
+    """
+    Measurement of one phase (one HTTP request, a parse or a wait) of a MyDNS.JP update.
+    """
+
+    __slots__ = ("phase", "account", "domain", "seconds", "bytes_sent", "bytes_received", "status")
+
+    def __init__(self, phase: str, account: str, domain: str, seconds: float, bytes_sent: int = 0, bytes_received: int = 0, status: int = None) -> None:
+        """
+        Creates a new PhaseMetric object.
+
+        :param phase: phase name (login_get, login_post, parse, update, confirm, directedit, propagation, ...)
+        :param account: MyDNS.JP master id or ""
+        :param domain: domain names of the phase (comma separated) or ""
+        :param seconds: duration of the phase
+        :param bytes_sent: request body bytes
+        :param bytes_received: response body bytes
+        :param status: HTTP status or None
+        """
+        self.phase = phase
+        self.account = account
+        self.domain = domain
+        self.seconds = seconds
+        self.bytes_sent = bytes_sent
+        self.bytes_received = bytes_received
+        self.status = status
+
+class MetricsRecorder:
+    """
+    Collect PhaseMetric of MyDNS.JP updates, log them and pass them to callbacks.
+    """
+
+    def __init__(self, callbacks: list = None) -> None:
+        """
+        Creates a new MetricsRecorder object.
+
+        :param callbacks: list of callable called with each PhaseMetric
+        """
+        self._callbacks = list(callbacks) if callbacks is not None else []
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def add_callback(self, callback: callable) -> None:
+        """
+        Add a callable called with each PhaseMetric.
+
+        :param callback: callable(PhaseMetric)
+        """
+        self._callbacks.append(callback)
+
+    def record(self, phase: str, account: str, domain: str, seconds: float, bytes_sent: int = 0, bytes_received: int = 0, status: int = None) -> None:
+        """
+        Record a phase.
+        See PhaseMetric for the parameters.
+        """
+        metric = PhaseMetric(phase, account, domain, seconds, bytes_sent, bytes_received, status)
+        with self._lock:
+            self._metrics.append(metric)
+        logger.debug("mydnsjp_phase phase=%s account=%s domain=%s seconds=%.3f bytes_sent=%d bytes_received=%d status=%s",
+                     phase, account, domain, seconds, bytes_sent, bytes_received, status)
+        for callback in self._callbacks:
+            try:
+                callback(metric)
+            except Exception as e:
+                logger.warning("MyDNS.JP metrics callback failed: %s", e)
+
+    def get_metrics(self) -> list:
+        """
+        Get all recorded phases.
+
+        :return: list of PhaseMetric
+        """
+        with self._lock:
+            return list(self._metrics)
+
+    def write_prometheus_textfile(self, path: str, mode: int = PROMETHEUS_TEXTFILE_MODE) -> None:
+        """
+        Write recorded phases in Prometheus text format, summed per (phase, account, domain).
+        The account label is a hash of the master id like the lock file names, the master id is not written as is.
+        The file is replaced atomically for the node exporter textfile collector.
+
+        :param path: output file path (should end with .prom)
+        :param mode: permission of the file, readable only by the owner by default
+        """
+        summary = {}
+        for metric in self.get_metrics():
+            key = (metric.phase, _account_label(metric.account), metric.domain)
+            if key not in summary:
+                summary[key] = [0, 0.0, 0, 0, None]
+            summary[key][0] += 1
+            summary[key][1] += metric.seconds
+            summary[key][2] += metric.bytes_sent
+            summary[key][3] += metric.bytes_received
+            if metric.status is not None:
+                summary[key][4] = metric.status
+        lines = []
+        for name, help_text, ix in [("phase_count", "Number of MyDNS.JP phases", 0),
+                                    ("phase_seconds", "Total duration of MyDNS.JP phases in seconds", 1),
+                                    ("phase_bytes_sent", "Total request body bytes of MyDNS.JP phases", 2),
+                                    ("phase_bytes_received", "Total response body bytes of MyDNS.JP phases", 3),
+                                    ("phase_last_http_status", "Last HTTP status of MyDNS.JP phases", 4)]:
+            lines.append(f"# HELP {PROMETHEUS_METRIC_PREFIX}_{name} {help_text}")
+            lines.append(f"# TYPE {PROMETHEUS_METRIC_PREFIX}_{name} gauge")
+            for (phase, account, domain), values in summary.items():
+                if values[ix] is None:
+                    continue
+                labels = f'phase="{_escape_label(phase)}",account="{_escape_label(account)}",domain="{_escape_label(domain)}"'
+                lines.append(f"{PROMETHEUS_METRIC_PREFIX}_{name}{{{labels}}} {values[ix]}")
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".mydnsjp_metrics_")
+        try:
+            with os.fdopen(fd, "w") as f:
+                f.write("\n".join(lines) + "\n")
+            os.chmod(tmp_path, mode)
+            os.replace(tmp_path, path)
+        except Exception:
+            os.unlink(tmp_path)
+            raise
+
+def _account_label(account: str) -> str:
+    """
+    Get the label value of a MyDNS.JP master id.
+
+    :param account: MyDNS.JP master id or ""
+
+    :return: first 16 hex digits of the sha256 of the master id, or ""
+    """
+    if account == "":
+        return ""
+    return hashlib.sha256(account.encode("utf-8")).hexdigest()[:16]
+
+def _escape_label(value: str) -> str:
+    """
+    Escape a Prometheus label value.
+
+    :param value: label value
+
+    :return: escaped label value
+    """
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace("\"", "\\\"")
@@ -0,0 +1,280 @@
+import concurrent.futures
+import logging
+import random
+import socket
+import struct
+import time
+
+logger = logging.getLogger(__name__)
+
+MYDNSJP_NAMESERVERS = ["ns0.mydns.jp", "ns1.mydns.jp"]
+DEFAULT_DNS_PORT = 53
+DEFAULT_QUERY_TIMEOUT = 2.0
+DEFAULT_POLL_INTERVAL = 2.0
+MAX_PROPAGATION_WORKERS = 8
+DNS_TYPE_TXT = 16
+DNS_CLASS_IN = 1
+DNS_FLAG_TC = 0x0200
+
+class DnsQueryError(Exception):
+    """
+    Exception if a DNS query could not be answered.
+    """
+
+    def __init__(self, message):
+        self.message = message
+        super().__init__(self.message)
+
+def parse_nameserver(nameserver: str) -> tuple:
+    """
+    Parse nameserver address.
+
+    :param nameserver: "host", "host:port", "[ipv6]" or "[ipv6]:port"
+
+    :return: tuple of (host, port)
+    """
+    nameserver = nameserver.strip()
+    if nameserver.startswith("["):
+        host, _, rest = nameserver[1:].partition("]")
+        port = rest[1:] if rest.startswith(":") else ""
+    elif nameserver.count(":") == 1:
+        host, _, port = nameserver.partition(":")
+    else:
+        host, port = nameserver, ""
+    if port == "":
+        return host, DEFAULT_DNS_PORT
+    return host, int(port)
+
+def query_txt(name: str, nameserver: tuple, timeout: float = DEFAULT_QUERY_TIMEOUT) -> list:
+    """
+    Query TXT records of a name directly to a nameserver (non-recursive).
+    The query is sent over UDP, and retried over TCP if the answer is truncated.
+
+    :param name: fully qualified domain name
+    :param nameserver: tuple of (host, port)
+    :param timeout: seconds to wait the answer
+
+    :return: list of TXT record value
+
+    :raise DnsQueryError: if no valid answer received
+    """
+    query_id = random.randint(0, 0xffff)
+    question = b""
+    for label in name.rstrip(".").split("."):
+        encoded_label = label.encode("idna") if label else b""
+        question += struct.pack("!B", len(encoded_label)) + encoded_label
+    question += b"\x00" + struct.pack("!HH", DNS_TYPE_TXT, DNS_CLASS_IN)
+    # flags=0 : standard query, recursion not desired
+    message = struct.pack("!HHHHHH", query_id, 0, 1, 0, 0, 0) + question
+    response = _exchange_udp(message, nameserver, timeout)
+    if struct.unpack("!H", response[2:4])[0] & DNS_FLAG_TC:
+        logger.debug("TXT answer of %s is truncated, retry over TCP", name)
+        response = _exchange_tcp(message, nameserver, timeout)
+        if struct.unpack("!H", response[2:4])[0] & DNS_FLAG_TC:
+            raise DnsQueryError(f"Truncated answer from nameserver {nameserver[0]}:{nameserver[1]}.")
+    return _parse_txt_response(response)
+
+def _exchange_udp(message: bytes, nameserver: tuple, timeout: float) -> bytes:
+    """
+    Send a DNS query over UDP and receive the answer of the same id.
+
+    :param message: DNS query message
+    :param nameserver: tuple of (host, port)
+    :param timeout: seconds to wait the answer
+
+    :return: DNS response message
+
+    :raise DnsQueryError: if no answer received
+    """
+    host, port = nameserver
+    family, _, _, _, address = socket.getaddrinfo(host, port, 0, socket.SOCK_DGRAM)[0]
+    with socket.socket(family, socket.SOCK_DGRAM) as sock:
+        sock.settimeout(timeout)
+        try:
+            sock.sendto(message, address)
+            while True:
+                response, _ = sock.recvfrom(65535)
+                if len(response) >= 12 and response[:2] == message[:2]:
+                    return response
+        except OSError as e:
+            raise DnsQueryError(f"No answer from nameserver {host}:{port}. ({e})")
+
+def _exchange_tcp(message: bytes, nameserver: tuple, timeout: float) -> bytes:
+    """
+    Send a DNS query over TCP and receive the answer.
+
+    :param message: DNS query message
+    :param nameserver: tuple of (host, port)
+    :param timeout: seconds to wait the answer
+
+    :return: DNS response message
+
+    :raise DnsQueryError: if no valid answer received
+    """
+    host, port = nameserver
+    try:
+        with socket.create_connection((host, port), timeout) as sock:
+            sock.sendall(struct.pack("!H", len(message)) + message)
+            length = struct.unpack("!H", _recv_exact(sock, 2))[0]
+            response = _recv_exact(sock, length)
+    except OSError as e:
+        raise DnsQueryError(f"No answer from nameserver {host}:{port} over TCP. ({e})")
+    if len(response) < 12 or response[:2] != message[:2]:
+        raise DnsQueryError(f"Malformed DNS response from nameserver {host}:{port} over TCP.")
+    return response
+
+def _recv_exact(sock: socket.socket, size: int) -> bytes:
+    """
+    Receive exactly size bytes from a stream socket.
+
+    :param sock: connected stream socket
+    :param size: number of bytes
+
+    :return: received bytes
+
+    :raise OSError: if the connection is closed before size bytes
+    """
+    data = b""
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if chunk == b"":
+            raise OSError("connection closed")
+        data += chunk
+    return data
+
+def _skip_name(response: bytes, pos: int) -> int:
+    """
+    Skip a (possibly compressed) domain name in DNS message.
+
+    :param response: DNS message
+    :param pos: start position of the name
+
+    :return: position after the name
+    """
+    while True:
+        length = response[pos]
+        if length & 0xc0 == 0xc0:
+            return pos + 2
+        pos += 1
+        if length == 0:
+            return pos
+        pos += length
+
+def _parse_txt_response(response: bytes) -> list:
+    """
+    Extract TXT record values from DNS response message.
+
+    :param response: DNS message
+
+    :return: list of TXT record value
+
+    :raise DnsQueryError: if the response is an error
+    """
+    try:
+        _, flags, qdcount, ancount, _, _ = struct.unpack("!HHHHHH", response[:12])
+        rcode = flags & 0x000f
+        if rcode == 3:
+            # NXDOMAIN
+            return []
+        if rcode != 0:
+            raise DnsQueryError(f"DNS error response. (rcode={rcode})")
+        pos = 12
+        for _ in range(qdcount):
+            pos = _skip_name(response, pos) + 4
+        result = []
+        for _ in range(ancount):
+            pos = _skip_name(response, pos)
+            rtype, _, _, rdlength = struct.unpack("!HHIH", response[pos:pos + 10])
+            pos += 10
+            rdata = response[pos:pos + rdlength]
+            pos += rdlength
+            if rtype != DNS_TYPE_TXT:
+                continue
+            value = b""
+            rdpos = 0
+            while rdpos < len(rdata):
+                length = rdata[rdpos]
+                value += rdata[rdpos + 1:rdpos + 1 + length]
+                rdpos += 1 + length
+            result.append(value.decode("utf-8", "replace"))
+        return result
+    except (IndexError, struct.error):
+        raise DnsQueryError("Malformed DNS response.")
+
+class PropagationChecker:
+    """
+    Poll the MyDNS.JP nameservers until expected TXT records are visible.
+    """
+
+    def __init__(self, nameservers: list = None, timeout: float = DEFAULT_QUERY_TIMEOUT) -> None:
+        """
+        Creates a new PropagationChecker object.
+
+        :param nameservers: list of nameserver address ("host[:port]"), None for MyDNS.JP nameservers
+        :param timeout: seconds to wait an answer of each query
+        """
+        if nameservers is None or len(nameservers) == 0:
+            nameservers = MYDNSJP_NAMESERVERS
+        self._nameservers = [parse_nameserver(nameserver) for nameserver in nameservers]
+        self._timeout = timeout
+
+    def wait(self, records: list, ceiling: float, interval: float = DEFAULT_POLL_INTERVAL) -> dict:
+        """
+        Wait until all TXT records are visible at all nameservers, or the ceiling is reached.
+        Names are polled in parallel, by up to MAX_PROPAGATION_WORKERS threads.
+
+        :param records: list of (name, value) tuple
+        :param ceiling: maximum seconds to wait
+        :param interval: seconds between polls of a name
+
+        :return: dictionary of name to observed propagation seconds, or None if not visible by the ceiling
+        """
+        expected = {}
+        for name, value in records:
+            expected.setdefault(name, set()).add(value)
+        if len(expected) == 0:
+            return {}
+        start = time.monotonic()
+        deadline = start + ceiling
+        with concurrent.futures.ThreadPoolExecutor(max_workers=min(len(expected), MAX_PROPAGATION_WORKERS)) as executor:
+            futures = {}
+            for name, values in expected.items():
+                futures[name] = executor.submit(self._wait_name, name, values, start, deadline, interval)
+            result = {}
+            for name, future in futures.items():
+                result[name] = future.result()
+        for name, elapsed in result.items():
+            if elapsed is None:
+                logger.warning("TXT record of %s is not visible at MyDNS.JP nameservers after %.1f seconds", name, ceiling)
+            else:
+                logger.info("TXT record of %s propagated in %.1f seconds", name, elapsed)
+        return result
+
+    def _wait_name(self, name: str, values: set, start: float, deadline: float, interval: float) -> float:
+        """
+        Poll a name until all values are visible at all nameservers.
+
+        :param name: fully qualified domain name
+        :param values: expected TXT record values
+        :param start: monotonic time of the poll start
+        :param deadline: monotonic time to give up
+        :param interval: seconds between polls
+
+        :return: observed propagation seconds, or None if not visible by the deadline
+        """
+        pending = list(self._nameservers)
+        while True:
+            for nameserver in list(pending):
+                try:
+                    answer = query_txt(name, nameserver, min(self._timeout, max(deadline - time.monotonic(), 0.1)))
+                except (DnsQueryError, OSError) as e:
+                    logger.debug("TXT query of %s failed: %s", name, e)
+                    continue
+                if values.issubset(answer):
+                    pending.remove(nameserver)
+            now = time.monotonic()
+            if len(pending) == 0:
+                return now - start
+            if now >= deadline:
+                return None
+            time.sleep(min(interval, deadline - now))
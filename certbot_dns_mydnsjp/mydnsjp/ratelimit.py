@@ -0,0 +1,125 @@
+import threading
+import time
+
+from certbot_dns_mydnsjp.mydnsjp.errors import UpdateMyDnsJpError
+
+# the limits are opt-in, a renewal of many certificates should not wait for its own requests by default
+DEFAULT_ACCOUNT_RATE = 0.0
+DEFAULT_ACCOUNT_BURST = 6
+DEFAULT_HOST_RATE = 0.0
+DEFAULT_HOST_BURST = 10
+
+class TokenBucket:
+    """
+    Token bucket refilled at a constant rate up to the burst size.
+    A reservation may take the balance below zero, so waiting requests are served in order of arrival.
+    """
+
+    __slots__ = ("rate", "burst", "_tokens", "_updated")
+
+    def __init__(self, rate: float, burst: int, now: float) -> None:
+        """
+        Creates a new TokenBucket object, initially full.
+
+        :param rate: tokens added per second
+        :param burst: maximum number of tokens
+        :param now: time.monotonic() value
+        """
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self._tokens = float(self.burst)
+        self._updated = now
+
+    def reserve(self, now: float) -> float:
+        """
+        Take one token.
+
+        :param now: time.monotonic() value
+
+        :return: seconds to wait until the token is available
+        """
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        self._tokens -= 1
+        if self._tokens >= 0:
+            return 0.0
+        return -self._tokens / self.rate
+
+    def refund(self) -> None:
+        """
+        Give back the token of a reservation that was not used.
+        """
+        self._tokens = min(self.burst, self._tokens + 1)
+
+class RateLimiter:
+    """
+    Pace MyDNS.JP requests with token buckets per account and per host, shared by all backends of a client.
+    A rate of 0 or less disables the limit, both limits are disabled by default.
+    """
+
+    def __init__(self, account_rate: float = DEFAULT_ACCOUNT_RATE, account_burst: int = DEFAULT_ACCOUNT_BURST,
+                 host_rate: float = DEFAULT_HOST_RATE, host_burst: int = DEFAULT_HOST_BURST) -> None:
+        """
+        Creates a new RateLimiter object.
+
+        :param account_rate: requests per second of one MyDNS.JP account
+        :param account_burst: requests of one account sent without waiting after an idle time
+        :param host_rate: requests per second to one host (all accounts)
+        :param host_burst: requests to one host sent without waiting after an idle time
+        """
+        self._account_rate = account_rate
+        self._account_burst = account_burst
+        self._host_rate = host_rate
+        self._host_burst = host_burst
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, account: str, host: str, deadline: float) -> float:
+        """
+        Wait until a request of the account to the host is allowed.
+
+        :param account: MyDNS.JP master id
+        :param host: host name of the request url
+        :param deadline: time.monotonic() value to give up
+
+        :return: seconds waited
+
+        :raise UpdateMyDnsJpError: if the request would not be allowed before the deadline
+        """
+        wait = self.reserve(account, host, deadline)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def reserve(self, account: str, host: str, deadline: float) -> float:
+        """
+        Reserve a request of the account to the host without waiting (e.g. to wait with asyncio.sleep).
+
+        :param account: MyDNS.JP master id
+        :param host: host name of the request url
+        :param deadline: time.monotonic() value to give up
+
+        :return: seconds to wait before sending the request
+
+        :raise UpdateMyDnsJpError: if the request would not be allowed before the deadline
+        """
+        with self._lock:
+            now = time.monotonic()
+            buckets = []
+            for key, rate, burst in [(("account", account), self._account_rate, self._account_burst),
+                                     (("host", host), self._host_rate, self._host_burst)]:
+                if rate <= 0:
+                    continue
+                bucket = self._buckets.get(key)
+                if bucket is None:
+                    bucket = TokenBucket(rate, burst, now)
+                    self._buckets[key] = bucket
+                buckets.append(bucket)
+            wait = 0.0
+            for bucket in buckets:
+                wait = max(wait, bucket.reserve(now))
+            if now + wait >= deadline:
+                for bucket in buckets:
+                    bucket.refund()
+                raise UpdateMyDnsJpError(f"Deadline exceeded waiting the MyDNS.JP rate limit. ({host}, wait {wait:.1f}s)")
+        return wait
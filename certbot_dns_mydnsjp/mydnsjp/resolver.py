@@ -0,0 +1,86 @@
+from certbot_dns_mydnsjp.mydnsjp.errors import UpdateMyDnsJpError
+
+class _LabelNode:
+    """
+    Node of the reversed-label trie.
+    """
+
+    __slots__ = ("children", "credential")
+
+    def __init__(self) -> None:
+        self.children = {}
+        self.credential = None
+
+class CredentialResolver:
+    """
+    Resolve the MyDNS.JP credential of a domain by the longest matching domain key, on label boundaries.
+    The keys are stored in a trie of reversed labels ("example.mydns.jp" -> jp, mydns, example),
+    so a lookup costs O(number of labels of the domain).
+    """
+
+    def __init__(self, credential: dict) -> None:
+        """
+        Creates a new CredentialResolver object.
+
+        :param credential: dictionary of domain key to credential
+        """
+        self._root = _LabelNode()
+        for cred_key, cred_val in credential.items():
+            node = self._root
+            for label in reversed(_split_labels(cred_key)):
+                child = node.children.get(label)
+                if child is None:
+                    child = _LabelNode()
+                    node.children[label] = child
+                node = child
+            node.credential = cred_val
+
+    def resolve(self, domain: str) -> dict:
+        """
+        Get the credential of the longest domain key which is the domain or its parent domain.
+
+        :param domain: fully qualified domain name
+
+        :return: credential or None
+        """
+        result = None
+        node = self._root
+        for label in reversed(_split_labels(domain)):
+            node = node.children.get(label)
+            if node is None:
+                break
+            if node.credential is not None:
+                result = node.credential
+        return result
+
+    def group(self, items: list, key: callable = None) -> list:
+        """
+        Group items by the credential of their domains in one pass, in order of the first item of each account.
+
+        :param items: list of domain, or of any item with key
+        :param key: callable(item) returning the domain of an item or None (the item is the domain)
+
+        :return: list of (credential, list of item) tuple, one per MyDNS.JP account
+
+        :raise UpdateMyDnsJpError: if no credential found for a domain
+        """
+        result = {}
+        for item in items:
+            domain = item if key is None else key(item)
+            credential = self.resolve(domain)
+            if credential is None:
+                raise UpdateMyDnsJpError(f"Not found mydnsjp_credential for domain '{domain}'")
+            if credential["id"] not in result:
+                result[credential["id"]] = (credential, [])
+            result[credential["id"]][1].append(item)
+        return list(result.values())
+
+def _split_labels(domain: str) -> list:
+    """
+    Split a domain name into lower case labels.
+
+    :param domain: domain name (a trailing dot is ignored)
+
+    :return: list of label
+    """
+    return domain.rstrip(".").lower().split(".")
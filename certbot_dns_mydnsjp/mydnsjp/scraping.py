@@ -0,0 +1,827 @@
+import codecs
+import logging
+import re
+import requests
+import threading
+import time
+import urllib
+
+from certbot_dns_mydnsjp.mydnsjp.backend import MyDNSJPBackend, RequestContext, RequestPolicy
+from certbot_dns_mydnsjp.mydnsjp.domaininfo import DomainInfo, DomainInfoRecord
+from certbot_dns_mydnsjp.mydnsjp.errors import (
+    ConflictMyDnsJpError, MaybeAppliedMyDnsJpError, SessionExpiredMyDnsJpError, UpdateMyDnsJpError)
+from certbot_dns_mydnsjp.mydnsjp.metrics import MetricsRecorder
+from certbot_dns_mydnsjp.mydnsjp.ratelimit import RateLimiter
+from certbot_dns_mydnsjp.mydnsjp.session import MyDNSJPSessionManager
+from certbot_dns_mydnsjp.mydnsjp.slots import TXT_RECORD_TYPE, TxtSlotAllocator
+
+logger = logging.getLogger(__name__)
+
+MYDNSJP_LOGIN_URL = "https://www.mydns.jp/members/"
+EXCEPT_NAMES_OF_MYDNSJP_CONFIRM = ["BACK"]
+LOGIN_FORM_ACTION = "/members/"
+DOMAININFO_FORM_ACTION = "/members/#domaininfo"
+PREFETCH_MAX_AGE = 120.0
+STREAM_CHUNK_SIZE = 16384
+STREAM_DRAIN_LIMIT = 65536
+
+regexp_tag = re.compile("<(form|/form|input|select|/select|option)(?![a-z0-9])([^>]*)>",re.S|re.I)
+regexp_method = re.compile("\\smethod\\s*=\\s*['\"]([^'\"]+)['\"]",re.S|re.I)
+regexp_action = re.compile("\\saction\\s*=\\s*['\"]([^'\"]+)['\"]",re.S|re.I)
+regexp_type = re.compile("\\stype\\s*=\\s*['\"]([^'\"]+)['\"]",re.S|re.I)
+regexp_name = re.compile("\\sname\\s*=\\s*['\"]([^'\"]+)['\"]",re.S|re.I)
+regexp_value = re.compile("\\svalue\\s*=\\s*['\"]([^'\"]*)['\"]",re.S|re.I)
+regexp_selected = re.compile("selected",re.S|re.I)
+
+class FormParser:
+    """
+    Incremental parser extracting forms by action from html fed in chunks.
+    The element dictionary of a form is the same as ScrapingBackend._get_form_element.
+    """
+
+    def __init__(self, targets: list, stop_target: str = None) -> None:
+        """
+        Creates a new FormParser object.
+
+        :param targets: actions of the forms to extract
+        :param stop_target: action of the form after which the parser is done, or None (parse to the end)
+        """
+        self.results = {}
+        for target in targets:
+            self.results[target] = None
+        self.done = False
+        self.seconds = 0.0
+        self._stop_target = stop_target
+        self._pending = ""
+        self._in_form = False
+        self._target = None
+        self._select_name = None
+
+    def feed(self, text: str) -> bool:
+        """
+        Parse a chunk of html. An incomplete tag at the end is kept for the next chunk.
+
+        :param text: next chunk of html text
+
+        :return: True if the parser is done
+        """
+        if self.done:
+            return True
+        text = self._pending + text
+        pos = text.rfind("<")
+        if pos >= 0 and text.find(">", pos) < 0:
+            self._pending = text[pos:]
+            text = text[:pos]
+        else:
+            self._pending = ""
+        for regexp_tag_result in regexp_tag.finditer(text):
+            self._handle(regexp_tag_result[1].lower(), regexp_tag_result[2])
+            if self.done:
+                self._pending = ""
+                break
+        return self.done
+
+    def _handle(self, tag: str, attrs: str) -> None:
+        """
+        Handle a tag.
+
+        :param tag: lower case tag name
+        :param attrs: attributes text of the tag
+        """
+        if tag == "form":
+            if self._in_form:
+                return
+            self._in_form = True
+            self._select_name = None
+            regexp_action_result = regexp_action.search(attrs)
+            if regexp_action_result is None:
+                return
+            regexp_method_result = regexp_method.search(attrs)
+            if regexp_method_result is None:
+                return
+            if regexp_action_result[1] not in self.results:
+                return
+            self._target = regexp_action_result[1]
+            if self.results[self._target] is None:
+                self.results[self._target] = {}
+            result = self.results[self._target]
+            result[""] = {}
+            result[""]["type"] = "form"
+            result[""]["action"] = regexp_action_result[1]
+            result[""]["method"] = regexp_method_result[1]
+            return
+        if tag == "/form":
+            if self._target is not None and self._target == self._stop_target:
+                self.done = True
+            self._in_form = False
+            self._target = None
+            self._select_name = None
+            return
+        if self._target is None:
+            return
+        result = self.results[self._target]
+        if tag == "input":
+            regexp_type_result = regexp_type.search(attrs)
+            if regexp_type_result is None:
+                return
+            regexp_name_result = regexp_name.search(attrs)
+            if regexp_name_result is None:
+                return
+            regexp_value_result = regexp_value.search(attrs)
+            if regexp_value_result is None:
+                return
+            name = regexp_name_result[1]
+            result[name] = {}
+            result[name]["type"] = regexp_type_result[1]
+            result[name]["value"] = regexp_value_result[1]
+        elif tag == "select":
+            self._select_name = None
+            regexp_name_result = regexp_name.search(attrs)
+            if regexp_name_result is None:
+                return
+            self._select_name = regexp_name_result[1]
+            result[self._select_name] = {}
+            result[self._select_name]["type"] = "select"
+            result[self._select_name]["option"] = []
+        elif tag == "/select":
+            self._select_name = None
+        elif tag == "option":
+            if self._select_name is None:
+                return
+            regexp_value_result = regexp_value.search(attrs)
+            if regexp_value_result is None:
+                return
+            value = regexp_value_result[1]
+            result[self._select_name]["option"].append(value)
+            regexp_selected_result = regexp_selected.search(attrs)
+            if regexp_selected_result is None:
+                return
+            result[self._select_name]["value"] = value
+
+class ScrapingBackend(MyDNSJPBackend):
+    """
+    Backend using the members page (LOGIN and DOMAIN INFO form) of MyDNS.JP web interface.
+    """
+
+    name = "scraping"
+
+    def __init__(self, session_manager: MyDNSJPSessionManager, login_url: str = MYDNSJP_LOGIN_URL, metrics: MetricsRecorder = None,
+                 policy: RequestPolicy = None, limiter: RateLimiter = None) -> None:
+        """
+        Creates a new ScrapingBackend object.
+
+        :param session_manager: session manager shared by backends
+        :param login_url: url of the members page
+        :param metrics: recorder of phase metrics or None
+        :param policy: timeouts and retry settings or None
+        :param limiter: rate limiter shared by backends or None
+        """
+        super().__init__(session_manager, metrics, policy, limiter)
+        self._login_url = login_url
+        self._slots = TxtSlotAllocator()
+        self._prefetched = {}
+        self._prefetch_cancelled = False
+        self._prefetch_lock = threading.Lock()
+
+    def prefetch(self, credential: dict, generation: int) -> None:
+        """
+        Login and read the domain info in advance, the next update of the account starts from it.
+
+        :param credential: credential used for MyDNS.JP web interface
+        :param generation: generation number of the account lock at the prefetch or None
+
+        :raise UpdateMyDnsJpError: if unexpected sequence occured
+        """
+        ctx = self._new_context(credential, [])
+        s = self._session_manager.get_session(credential)
+        request_url, domain_info = self._fetch_domain_info(ctx, s)
+        with self._prefetch_lock:
+            if self._prefetch_cancelled:
+                return
+            self._prefetched[credential["id"]] = (generation, time.monotonic(), request_url, domain_info)
+
+    def validate_prefetched(self, credential: dict, generation: int) -> None:
+        """
+        Discard the prefetched domain info of the account if it was updated after the prefetch.
+
+        :param credential: credential used for MyDNS.JP web interface
+        :param generation: current generation number of the account lock or None
+        """
+        with self._prefetch_lock:
+            prefetched = self._prefetched.get(credential["id"])
+            if prefetched is not None and (generation is None or prefetched[0] != generation):
+                del self._prefetched[credential["id"]]
+
+    def cancel_prefetch(self) -> None:
+        """
+        Discard all prefetched domain info and the results of running prefetches.
+        """
+        with self._prefetch_lock:
+            self._prefetch_cancelled = True
+            self._prefetched.clear()
+
+    def list_txt_records(self, credential: dict, hostname_prefix: str) -> list:
+        """
+        Read the TXT records of an account whose hostname starts with a prefix.
+
+        :param credential: credential used for MyDNS.JP web interface
+        :param hostname_prefix: prefix of the hostname relative to the domainname
+
+        :return: list of (domain, content) tuple, in order of the rows
+
+        :raise UpdateMyDnsJpError: if unexpected sequence occured
+        """
+        ctx = self._new_context(credential, [(hostname_prefix,)])
+        s = self._session_manager.get_session(credential)
+        try:
+            request_url, domain_info = self._fetch_domain_info(ctx, s)
+        except UpdateMyDnsJpError as e:
+            e.retries = ctx.retries
+            raise
+        if domain_info.domainname is None:
+            raise UpdateMyDnsJpError("No configured domainname at MyDNS.JP. (domainname is None)")
+        result = []
+        for record in domain_info.records:
+            if record.type == TXT_RECORD_TYPE and record.hostname is not None and record.hostname.startswith(hostname_prefix):
+                result.append((record.hostname + "." + domain_info.domainname, record.content))
+        return result
+
+    def forget_txt_records(self, credential: dict, records: list) -> None:
+        """
+        Drop the slot holders of TXT values whose clear was given up.
+
+        :param credential: credential used for MyDNS.JP web interface
+        :param records: list of (domain, content, prev_content) tuple
+        """
+        for domain, content, prev_content in records:
+            self._slots.forget(credential["id"], domain, content)
+
+    def _set_txt_records(self, ctx: RequestContext, records: list) -> list:
+        """
+        Set TXT record values for domains of one MyDNS.JP account in a single submission.
+        Each value gets its own TXT row, so values of the same hostname do not overwrite each other.
+
+        :param ctx: context of this call
+        :param records: list of (domain, content) tuple, provided MyDNS.JP credential must have authority of all domains.
+
+        :return: list of previous TXT record value or None, in order of records
+
+        :raise UpdateMyDnsJpError: if unexpected sequence occured
+        """
+        return self._update_txt_records(ctx, [], records)
+
+    def _clear_txt_records(self, ctx: RequestContext, records: list) -> None:
+        """
+        Clear TXT records for domains of one MyDNS.JP account in a single submission.
+        Only the rows allocated for the given values are cleared or restored.
+
+        :param ctx: context of this call
+        :param records: list of (domain, content, prev_content) tuple, prev_content is string value of restoring TXT record or None (for remove)
+
+        :raise UpdateMyDnsJpError: if unexpected sequence occured
+        """
+        self._update_txt_records(ctx, records, [])
+        return None
+
+    def _update_txt_records(self, ctx: RequestContext, clear_records: list, set_records: list, missing_ok: bool = False) -> list:
+        """
+        Clear TXT records then set TXT record values of one MyDNS.JP account in a single submission,
+        so rows freed or restored by the clear are available to the set.
+        Nothing is sent if the domain info does not change (e.g. the same value is set again).
+        The changed rows are checked in the confirm page, the values are verified after confirm.
+
+        :param ctx: context of this call
+        :param clear_records: list of (domain, content, prev_content) tuple
+        :param set_records: list of (domain, content) tuple
+        :param missing_ok: True if a value of clear_records held by no row is already cleared
+
+        :return: list of previous TXT record value or None, in order of set_records
+
+        :raise UpdateMyDnsJpError: if unexpected sequence occured
+        """
+        s = self._session_manager.get_session(ctx.credential)
+        request_url, domain_info = self._get_domain_info(ctx, s)
+        account = ctx.credential["id"]
+        slots, released, expected = prepare_txt_update(self._slots, account, domain_info, clear_records, set_records, missing_ok)
+        try:
+            changes = get_update_changes(account, domain_info)
+            if len(changes) > 0:
+                confirmed_domain_info = self._send_domain_info(ctx, s, request_url, domain_info, changes)
+                try:
+                    self._verify_domain_info(ctx, s, expected, confirmed_domain_info)
+                except ConflictMyDnsJpError:
+                    raise
+                except UpdateMyDnsJpError as e:
+                    raise get_unverified_error(e)
+        except Exception:
+            rollback_txt_update(self._slots, account, slots, released)
+            raise
+        return [slot.prev_content for slot in slots]
+
+    def _send_domain_info(self, ctx: RequestContext, s: requests.Session, request_url: str, domain_info: DomainInfo,
+                          changes: list) -> DomainInfo:
+        """
+        Send domain info form and confirm it, if the changed rows are shown in the confirm page.
+        The confirm request is not retried after it may have reached MyDNS.JP.
+
+        :param ctx: context of this call
+        :param s: session of the credential
+        :param request_url: url of the page containing the domain info form
+        :param domain_info: domain info
+        :param changes: changed rows returned by domain_info.get_changes()
+
+        :return: domain info in the response of confirm or None if the response has no domain info form
+
+        :raise UpdateMyDnsJpError: if unexpected sequence occured
+        """
+        request_url = urllib.parse.urljoin(request_url, domain_info.action)
+        r, parser = self._request_forms(ctx, s, "update", domain_info.method.upper(), request_url, [DOMAININFO_FORM_ACTION, LOGIN_FORM_ACTION],
+                                        DOMAININFO_FORM_ACTION, data=domain_info.get_form_data())
+        start = time.perf_counter() - parser.seconds if parser is not None else None
+        try:
+            request_method, request_url, confirm_domain_info_form_data = get_confirm_request(request_url, r.status_code, parser, changes)
+        except SessionExpiredMyDnsJpError:
+            self._session_manager.invalidate(ctx.credential)
+            raise
+        finally:
+            if start is not None:
+                self._record_phase(ctx, "parse", start)
+        r, parser = self._request_forms(ctx, s, "confirm", request_method, request_url, [DOMAININFO_FORM_ACTION, LOGIN_FORM_ACTION],
+                                        DOMAININFO_FORM_ACTION, replayable=False, data=confirm_domain_info_form_data)
+        try:
+            return get_confirmed_domain_info(r.status_code, parser)
+        except SessionExpiredMyDnsJpError:
+            self._session_manager.invalidate(ctx.credential)
+            raise
+
+    def _verify_domain_info(self, ctx: RequestContext, s: requests.Session, expected: list, domain_info: DomainInfo = None) -> None:
+        """
+        Check the TXT records in the domain info returned by confirm, or read the domain info again if there is none.
+
+        :param ctx: context of this call
+        :param s: session of the credential
+        :param expected: list of (hostname, content, present) tuple, present is True if the TXT value must exist
+        :param domain_info: domain info in the response of confirm or None
+
+        :raise ConflictMyDnsJpError: if a TXT value is not as expected
+        :raise UpdateMyDnsJpError: if unexpected sequence occured
+        """
+        if len(expected) == 0:
+            return
+        if domain_info is None:
+            request_url, domain_info = self._fetch_domain_info(ctx, s)
+        check_domain_info(domain_info, expected)
+
+    def _get_domain_info(self, ctx: RequestContext, s: requests.Session) -> tuple:
+        """
+        Get domain info form, use the prefetched one once if it is still fresh.
+
+        :param ctx: context of this call
+        :param s: session of the credential
+
+        :return: tuple of (request url, domain info)
+
+        :raise UpdateMyDnsJpError: if unexpected sequence occured
+        """
+        with self._prefetch_lock:
+            prefetched = self._prefetched.pop(ctx.credential["id"], None)
+        if prefetched is not None and time.monotonic() - prefetched[1] <= PREFETCH_MAX_AGE:
+            self._record_phase(ctx, "prefetched", time.perf_counter())
+            return prefetched[2], prefetched[3]
+        return self._fetch_domain_info(ctx, s)
+
+    def _fetch_domain_info(self, ctx: RequestContext, s: requests.Session) -> tuple:
+        """
+        Fetch domain info form, login only if the session is not logged in.
+
+        :param ctx: context of this call
+        :param s: session of the credential
+
+        :return: tuple of (request url, domain info)
+
+        :raise UpdateMyDnsJpError: if unexpected sequence occured
+        """
+        credential = ctx.credential
+        request_url = self._login_url
+        request_method = "GET"
+        r, parser = self._request_forms(ctx, s, "login_get", request_method, request_url, [DOMAININFO_FORM_ACTION, LOGIN_FORM_ACTION],
+                                        DOMAININFO_FORM_ACTION)
+        if r.status_code != 200:
+            raise UpdateMyDnsJpError("Abnormal response from MyDNS.JP web. (LOGIN)")
+        start = time.perf_counter() - parser.seconds
+        domain_info_form_element = parser.results[DOMAININFO_FORM_ACTION]
+        if domain_info_form_element is not None:
+            domain_info = DomainInfo(domain_info_form_element)
+            self._record_phase(ctx, "parse", start)
+            self._session_manager.count_login(True)
+            return request_url, domain_info
+        self._record_phase(ctx, "parse", start)
+        request_method, request_url, login_form_data = get_login_request(request_url, parser, credential)
+        r, parser = self._request_forms(ctx, s, "login_post", request_method, request_url, [DOMAININFO_FORM_ACTION], DOMAININFO_FORM_ACTION,
+                                        data=login_form_data)
+        if r.status_code != 200:
+            raise UpdateMyDnsJpError("Abnormal response from MyDNS.JP web. (Get DomainInfo)")
+        start = time.perf_counter() - parser.seconds
+        domain_info_form_element = parser.results[DOMAININFO_FORM_ACTION]
+        if domain_info_form_element is None:
+            self._record_phase(ctx, "parse", start)
+            self._session_manager.invalidate(credential)
+            raise UpdateMyDnsJpError("MyDNS.JP login failed. (DomainInfoForm missing)")
+        domain_info = DomainInfo(domain_info_form_element)
+        self._record_phase(ctx, "parse", start)
+        self._session_manager.count_login(False)
+        self._session_manager.save(credential)
+        return request_url, domain_info
+
+    def _get_form_element(self, text: str, target: str) -> dict:
+        """
+        Extract form parameter elements from html.
+        The html is scanned once from the beginning to the end.
+
+        :param text: html text
+        :param target: action of target form.
+
+        :return: element dictionary of target form
+        """
+        parser = FormParser([target])
+        parser.feed(text)
+        return parser.results[target]
+
+    def _request_forms(self, ctx: RequestContext, s: requests.Session, phase: str, method: str, url: str, targets: list,
+                       stop_target: str, replayable: bool = True, **kwargs) -> tuple:
+        """
+        Send a HTTP request and parse the forms of the response while it is streamed.
+        Reading stops as soon as the stop_target form is closed.
+
+        :param ctx: context of this call
+        :param s: session of the credential
+        :param phase: phase name of the request
+        :param method: HTTP method
+        :param url: request url
+        :param targets: actions of the forms to extract
+        :param stop_target: action of the form after which the rest of the page is not parsed
+        :param replayable: True if sending the request twice is harmless
+        :param kwargs: other arguments of requests.Session.request
+
+        :return: tuple of (response, parser of the last attempt or None if the response is not 200)
+        """
+        parsers = []
+
+        def consume(r: requests.Response) -> int:
+            parser = FormParser(targets, stop_target)
+            parsers.append(parser)
+            decoder = codecs.getincrementaldecoder(r.encoding or "utf-8")(errors="replace")
+            received = 0
+            chunks = r.iter_content(STREAM_CHUNK_SIZE)
+            for chunk in chunks:
+                received += len(chunk)
+                start = time.perf_counter()
+                done = parser.feed(decoder.decode(chunk))
+                parser.seconds += time.perf_counter() - start
+                if done:
+                    break
+            else:
+                parser.feed(decoder.decode(b"", True))
+                return received
+            # read a short rest without parsing to keep the connection alive
+            drained = 0
+            for chunk in chunks:
+                drained += len(chunk)
+                if drained > STREAM_DRAIN_LIMIT:
+                    break
+            return received + drained
+
+        r = self._request(ctx, s, phase, method, url, replayable=replayable, consume=consume, **kwargs)
+        if r.status_code != 200 or len(parsers) == 0:
+            return r, None
+        return r, parsers[-1]
+
+def is_login_page(parser: FormParser) -> bool:
+    """
+    Check if a parsed page is the login page instead of the domain info page.
+
+    :param parser: parser of the page with DOMAININFO_FORM_ACTION and LOGIN_FORM_ACTION targets
+
+    :return: True if the page has the login form and no domain info form
+    """
+    login_form_element = parser.results.get(LOGIN_FORM_ACTION)
+    if parser.results.get(DOMAININFO_FORM_ACTION) is not None or login_form_element is None:
+        return False
+    # the logout button of the members page has the same action
+    return "masterid" in login_form_element
+
+def get_hostname(domain_info: DomainInfo, domain: str) -> str:
+    """
+    Get hostname relative to the domainname of domain info.
+
+    :param domain_info: domain info
+    :param domain: fully qualified domain name
+
+    :return: hostname
+
+    :raise UpdateMyDnsJpError: if the domain is not under the domainname
+    """
+    if domain_info.domainname is None:
+        raise UpdateMyDnsJpError("No configured domainname at MyDNS.JP. (domainname is None)")
+    domain_suffix = "." + domain_info.domainname
+    if not domain.endswith(domain_suffix):
+        raise UpdateMyDnsJpError("Domain suffix mismatch. (DomainInfo domainname between credential domain)")
+    return domain[:-len(domain_suffix)]
+
+def get_form_data(element: dict, except_names: list) -> dict:
+    """
+    Convert to sending data from parameter element.
+
+    :param element: element dictionary of form
+    :param except_names: name list of not to send.
+
+    :return: sending data
+    """
+    result = None
+    for name, param in element.items():
+        if name == "":
+            continue
+        if "value" not in param:
+            continue
+        if except_names is not None and name in except_names:
+            continue
+        if result is None:
+            result = {}
+        result[name] = param["value"]
+    return result
+
+def get_login_form_data(login_form_element: dict, credential: dict) -> dict:
+    """
+    Fill the login form with a credential and convert to sending data.
+
+    :param login_form_element: element dictionary of login form
+    :param credential: credential used for MyDNS.JP web interface
+
+    :return: sending data
+    """
+    login_form_element["masterid"]["value"] = credential["id"]
+    login_form_element["masterpwd"]["value"] = credential["pwd"]
+    return get_form_data(login_form_element, None)
+
+def get_login_request(request_url: str, parser: FormParser, credential: dict) -> tuple:
+    """
+    Get the login request of a members page without domain info form.
+
+    :param request_url: url of the page
+    :param parser: parser of the page with LOGIN_FORM_ACTION target
+    :param credential: credential used for MyDNS.JP web interface
+
+    :return: tuple of (HTTP method, url, sending data)
+
+    :raise UpdateMyDnsJpError: if the page has no login form
+    """
+    login_form_element = parser.results[LOGIN_FORM_ACTION]
+    if login_form_element is None:
+        raise UpdateMyDnsJpError("Abnormal response from MyDNS.JP web. (LoginForm missing)")
+    login_form_data = get_login_form_data(login_form_element, credential)
+    return (login_form_element[""]["method"].upper(), urllib.parse.urljoin(request_url, login_form_element[""]["action"]),
+            login_form_data)
+
+def get_confirm_request(request_url: str, status: int, parser: FormParser, changes: list) -> tuple:
+    """
+    Check the response of the domain info form and get the confirm request, if the changed rows are shown in the confirm page.
+
+    :param request_url: url of the domain info form action
+    :param status: HTTP status of the response
+    :param parser: parser of the response with DOMAININFO_FORM_ACTION and LOGIN_FORM_ACTION targets, or None
+    :param changes: changed rows returned by domain_info.get_changes()
+
+    :return: tuple of (HTTP method, url, sending data)
+
+    :raise SessionExpiredMyDnsJpError: if the response is the login page
+    :raise UpdateMyDnsJpError: if the response is not the confirm page of the changes
+    """
+    if status != 200:
+        raise UpdateMyDnsJpError("Abnormal response from MyDNS.JP web. (Send DomainInfo)")
+    if is_login_page(parser):
+        raise SessionExpiredMyDnsJpError("MyDNS.JP session expired. (Send DomainInfo)")
+    confirm_domain_info_form_element = parser.results[DOMAININFO_FORM_ACTION]
+    if confirm_domain_info_form_element is None:
+        raise UpdateMyDnsJpError("Abnormal response from MyDNS.JP web. (ConfirmForm missing)")
+    check_changes(DomainInfo(confirm_domain_info_form_element), changes)
+    return (confirm_domain_info_form_element[""]["method"].upper(),
+            urllib.parse.urljoin(request_url, confirm_domain_info_form_element[""]["action"]),
+            get_form_data(confirm_domain_info_form_element, EXCEPT_NAMES_OF_MYDNSJP_CONFIRM))
+
+def get_confirmed_domain_info(status: int, parser: FormParser) -> DomainInfo:
+    """
+    Check the response of confirm and get its domain info to verify the update.
+
+    :param status: HTTP status of the response
+    :param parser: parser of the response with DOMAININFO_FORM_ACTION and LOGIN_FORM_ACTION targets, or None
+
+    :return: domain info in the response or None if the response has no domain info form (read it again to verify)
+
+    :raise SessionExpiredMyDnsJpError: if the response is the login page (the confirm was not accepted)
+    :raise UpdateMyDnsJpError: if the response is abnormal
+    """
+    if status != 200:
+        raise UpdateMyDnsJpError("Abnormal response from MyDNS.JP web. (Confirm DomainInfo)")
+    if parser is None:
+        return None
+    if is_login_page(parser):
+        # the confirm was not accepted without the session
+        raise SessionExpiredMyDnsJpError("MyDNS.JP session expired. (Confirm DomainInfo)")
+    if parser.results[DOMAININFO_FORM_ACTION] is None:
+        return None
+    return DomainInfo(parser.results[DOMAININFO_FORM_ACTION])
+
+def get_unverified_error(e: UpdateMyDnsJpError) -> MaybeAppliedMyDnsJpError:
+    """
+    Get the error of an update whose verification failed after the confirm was accepted.
+
+    :param e: error of the verification
+
+    :return: error to raise, the update may have been applied
+    """
+    return MaybeAppliedMyDnsJpError(f"MyDNS.JP update not verified after confirm, it may have been applied. ({e.message})", e.retries)
+
+def get_update_changes(account: str, domain_info: DomainInfo) -> list:
+    """
+    Get the changed rows of a domain info to send, nothing is sent if there is none.
+
+    :param account: MyDNS.JP master id
+    :param domain_info: domain info changed by prepare_txt_update
+
+    :return: list of (record, values before the change) tuple returned by DomainInfo.get_changes()
+    """
+    changes = domain_info.get_changes()
+    if len(changes) == 0:
+        logger.debug("MyDNS.JP domain info of %s unchanged, update skipped", account)
+    else:
+        logger.debug("MyDNS.JP domain info changes of %s: %s", account, format_changes(changes))
+    return changes
+
+def prepare_txt_update(allocator: TxtSlotAllocator, account: str, domain_info: DomainInfo, clear_records: list, set_records: list,
+                       missing_ok: bool = False) -> tuple:
+    """
+    Clear the TXT rows of clear_records then allocate rows for set_records in the domain info,
+    so rows freed or restored by the clear are available to the set. Nothing is kept if it failed.
+
+    :param allocator: slot allocator of the backend
+    :param account: MyDNS.JP master id
+    :param domain_info: domain info of the account
+    :param clear_records: list of (domain, content, prev_content) tuple
+    :param set_records: list of (domain, content) tuple
+    :param missing_ok: True if a value of clear_records held by no row is already cleared
+
+    :return: tuple of (list of slot in order of set_records, list of released slot,
+             list of (hostname, content, present) tuple expected after the update),
+             the slots are given to rollback_txt_update if the update fails
+
+    :raise UpdateMyDnsJpError: if a domain is not of the account or no row is available
+    """
+    expected, released = release_txt_slots(allocator, account, domain_info, clear_records, missing_ok)
+    try:
+        slots = allocate_txt_slots(allocator, account, domain_info, set_records)
+    except BaseException:
+        restore_txt_slots(allocator, account, released)
+        raise
+    # a value cleared and set again must be present
+    set_values = set((slot.hostname, slot.content) for slot in slots)
+    expected = [item for item in expected if (item[0], item[1]) not in set_values]
+    expected.extend((slot.hostname, slot.content, True) for slot in slots)
+    return slots, released, expected
+
+def rollback_txt_update(allocator: TxtSlotAllocator, account: str, slots: list, released: list) -> None:
+    """
+    Cancel the allocated slots and take back the released slots of an update that was not submitted or failed.
+
+    :param allocator: slot allocator of the backend
+    :param account: MyDNS.JP master id
+    :param slots: list of slot returned by prepare_txt_update
+    :param released: list of released slot returned by prepare_txt_update
+    """
+    for slot in slots:
+        allocator.cancel(account, slot)
+    restore_txt_slots(allocator, account, released)
+
+def allocate_txt_slots(allocator: TxtSlotAllocator, account: str, domain_info: DomainInfo, records: list) -> list:
+    """
+    Allocate a TXT row of the domain info for each value, the slots are cancelled if one failed.
+
+    :param allocator: slot allocator of the backend
+    :param account: MyDNS.JP master id
+    :param domain_info: domain info of the account
+    :param records: list of (domain, content) tuple
+
+    :return: list of slot, in order of records
+
+    :raise UpdateMyDnsJpError: if a domain is not of the account or no row is available
+    """
+    slots = []
+    try:
+        for domain, content in records:
+            slots.append(allocator.allocate(account, domain_info, get_hostname(domain_info, domain), content))
+    except Exception:
+        for slot in slots:
+            allocator.cancel(account, slot)
+        raise
+    return slots
+
+def release_txt_slots(allocator: TxtSlotAllocator, account: str, domain_info: DomainInfo, records: list, missing_ok: bool = False) -> tuple:
+    """
+    Clear or restore the TXT rows of the values in the domain info, the slots are restored if one failed.
+
+    :param allocator: slot allocator of the backend
+    :param account: MyDNS.JP master id
+    :param domain_info: domain info of the account
+    :param records: list of (domain, content, prev_content) tuple
+    :param missing_ok: True if a value held by no row is already cleared
+
+    :return: tuple of (list of (hostname, content, present) tuple expected after the update,
+             list of released slot to give to restore_txt_slots if the update fails)
+
+    :raise UpdateMyDnsJpError: if a domain is not of the account or no row holds a value and missing_ok is False
+    """
+    expected = []
+    released = []
+    try:
+        for domain, content, prev_content in records:
+            hostname = get_hostname(domain_info, domain)
+            record, slot = allocator.release(account, domain_info, hostname, content, missing_ok)
+            if slot is not None:
+                released.append(slot)
+            if record is not None:
+                release_txt_row(domain_info, record, hostname, content, prev_content, expected)
+    except Exception:
+        restore_txt_slots(allocator, account, released)
+        raise
+    return expected, released
+
+def restore_txt_slots(allocator: TxtSlotAllocator, account: str, released: list) -> None:
+    """
+    Take back the slots released for an update that was not submitted or failed.
+
+    :param allocator: slot allocator of the backend
+    :param account: MyDNS.JP master id
+    :param released: list of slot returned by release_txt_slots
+    """
+    for slot in released:
+        allocator.restore(account, slot)
+
+def release_txt_row(domain_info: DomainInfo, record: DomainInfoRecord, hostname: str, content: str, prev_content: str,
+                    expected: list) -> None:
+    """
+    Clear or restore a released TXT row in the domain info.
+
+    :param domain_info: domain info of the account
+    :param record: record holding the value
+    :param hostname: hostname relative to the domainname
+    :param content: the string value of TXT record
+    :param prev_content: string value of restoring TXT record or None (for remove)
+    :param expected: list of (hostname, content, present) tuple the expectations are appended to
+    """
+    if prev_content is not None:
+        domain_info.update(record, hostname, TXT_RECORD_TYPE, prev_content)
+        expected.append((hostname, prev_content, True))
+    else :
+        domain_info.clear(record)
+    if prev_content != content and domain_info.find(hostname, TXT_RECORD_TYPE, content) is None:
+        expected.append((hostname, content, False))
+
+def format_changes(changes: list) -> str:
+    """
+    Format changed rows for logging.
+
+    :param changes: list of (record, values before the change) tuple returned by DomainInfo.get_changes()
+
+    :return: text of the changes
+    """
+    items = []
+    for record, original in changes:
+        items.append(f"[{record.ix}] {original!r} -> {record.values()!r}")
+    return ", ".join(items)
+
+def check_changes(confirm_domain_info: DomainInfo, changes: list) -> None:
+    """
+    Check the changed rows in the domain info of the confirm page, before they are confirmed.
+
+    :param confirm_domain_info: domain info of the confirm form
+    :param changes: list of (record, values before the change) tuple returned by DomainInfo.get_changes()
+
+    :raise UpdateMyDnsJpError: if a changed row is not shown as sent
+    """
+    for record, original in changes:
+        confirm_record = confirm_domain_info.get_record(record.ix)
+        if confirm_record is None or confirm_record.values() != record.values():
+            raise UpdateMyDnsJpError(f"MyDNS.JP did not accept the domain info. (DNSINFO row {record.ix} differs in the confirm page)")
+
+def check_domain_info(domain_info: DomainInfo, expected: list) -> None:
+    """
+    Check the TXT records of a domain info read after confirm.
+
+    :param domain_info: domain info read again
+    :param expected: list of (hostname, content, present) tuple, present is True if the TXT value must exist
+
+    :raise ConflictMyDnsJpError: if a TXT value is not as expected
+    """
+    for hostname, content, present in expected:
+        if (domain_info.find(hostname, TXT_RECORD_TYPE, content) is not None) != present:
+            state = "missing" if present else "remaining"
+            raise ConflictMyDnsJpError(f"MyDNS.JP domain info was changed concurrently. (TXT of '{hostname}' {state} after confirm)")
@@ -0,0 +1,109 @@
+import logging
+import requests
+import threading
+
+from certbot_dns_mydnsjp.mydnsjp.cookies import CookieCache
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_POOL_MAXSIZE = 4
+
+class MyDNSJPSessionManager:
+    """
+    Keeps one logged-in, keep-alive session per MyDNS.JP credential.
+    """
+
+    def __init__(self, pool_maxsize: int = DEFAULT_POOL_MAXSIZE, cookie_cache: CookieCache = None) -> None:
+        """
+        Creates a new MyDNSJPSessionManager object.
+
+        :param pool_maxsize: maximum number of pooled connections per session
+        :param cookie_cache: cache of logged-in sessions shared between processes or None
+        """
+        self._pool_maxsize = pool_maxsize
+        self._cookie_cache = cookie_cache
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self.logins = 0
+        self.logins_avoided = 0
+
+    def set_cookie_cache(self, cookie_cache: CookieCache) -> None:
+        """
+        Set the cache of logged-in sessions used for sessions created after this call.
+
+        :param cookie_cache: cache of logged-in sessions shared between processes or None
+        """
+        with self._lock:
+            self._cookie_cache = cookie_cache
+
+    def get_session(self, credential: dict) -> requests.Session:
+        """
+        Get the session of a credential, create it if not exists.
+
+        :param credential: credential used for MyDNS.JP web interface
+
+        :return: session object (may be already logged in)
+        """
+        with self._lock:
+            s = self._sessions.get(credential["id"])
+            if s is None:
+                s = requests.Session()
+                adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=self._pool_maxsize)
+                s.mount("https://", adapter)
+                s.mount("http://", adapter)
+                if self._cookie_cache is not None:
+                    self._cookie_cache.load(credential, s)
+                self._sessions[credential["id"]] = s
+            return s
+
+    def invalidate(self, credential: dict) -> None:
+        """
+        Discard the session of a credential.
+
+        :param credential: credential used for MyDNS.JP web interface
+        """
+        with self._lock:
+            s = self._sessions.pop(credential["id"], None)
+        if s is not None:
+            s.close()
+        if self._cookie_cache is not None:
+            self._cookie_cache.invalidate(credential)
+
+    def save(self, credential: dict) -> None:
+        """
+        Save the just logged-in session of a credential to the cookie cache.
+
+        :param credential: credential used for MyDNS.JP web interface
+        """
+        if self._cookie_cache is None:
+            return
+        with self._lock:
+            s = self._sessions.get(credential["id"])
+        if s is None:
+            return
+        try:
+            self._cookie_cache.save(credential, s)
+        except Exception as e:
+            logger.warning("Failed to save MyDNS.JP session cache: %s", e)
+
+    def count_login(self, avoided: bool) -> None:
+        """
+        Count a login or an avoided login.
+
+        :param avoided: True if an existing logged-in session was reused
+        """
+        with self._lock:
+            if avoided:
+                self.logins_avoided += 1
+            else:
+                self.logins += 1
+
+    def close(self) -> None:
+        """
+        Close all sessions.
+        """
+        with self._lock:
+            sessions = list(self._sessions.values())
+            self._sessions.clear()
+        for s in sessions:
+            s.close()
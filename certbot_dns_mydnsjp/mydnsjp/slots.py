@@ -0,0 +1,186 @@
+import threading
+
+from certbot_dns_mydnsjp.mydnsjp.domaininfo import DomainInfo, DomainInfoRecord
+from certbot_dns_mydnsjp.mydnsjp.errors import TxtRecordMissingMyDnsJpError, UpdateMyDnsJpError
+
+TXT_RECORD_TYPE = "TXT"
+
+class TxtSlot:
+    """
+    A TXT record row holding one pending validation value.
+    """
+
+    __slots__ = ("hostname", "content", "ix", "prev_content", "holders")
+
+    def __init__(self, hostname: str, content: str, ix: str, prev_content: str) -> None:
+        """
+        Creates a new TxtSlot object.
+
+        :param hostname: hostname relative to the domainname
+        :param content: the string value of TXT record
+        :param ix: index of the row holding the value
+        :param prev_content: string value of the row before the allocation or None
+        """
+        self.hostname = hostname
+        self.content = content
+        self.ix = ix
+        self.prev_content = prev_content
+        self.holders = 1
+
+class TxtSlotAllocator:
+    """
+    Allocate TXT record rows of the domain info, one row per pending validation value,
+    so that several values of the same hostname (e.g. apex and wildcard) coexist.
+    Rows are tracked per MyDNS.JP account until they are released.
+    """
+
+    def __init__(self) -> None:
+        """
+        Creates a new TxtSlotAllocator object.
+        """
+        self._slots = {}
+        self._domainnames = {}
+        self._lock = threading.Lock()
+
+    def allocate(self, account: str, domain_info: DomainInfo, hostname: str, content: str) -> TxtSlot:
+        """
+        Allocate a row for a TXT value and update the domain info.
+        A row already holding the value is shared, an empty row is preferred to
+        overwriting another TXT row of the hostname, and a row holding a pending value is never overwritten.
+
+        :param account: MyDNS.JP master id
+        :param domain_info: domain info of the account
+        :param hostname: hostname relative to the domainname
+        :param content: the string value of TXT record
+
+        :return: allocated slot
+
+        :raise UpdateMyDnsJpError: if no row is available
+        """
+        with self._lock:
+            self._domainnames[account] = domain_info.domainname
+            slot = self._slots.get((account, hostname, content))
+            record = domain_info.find(hostname, TXT_RECORD_TYPE, content)
+            if record is not None:
+                if slot is None:
+                    slot = TxtSlot(hostname, content, record.ix, None)
+                    self._slots[(account, hostname, content)] = slot
+                else:
+                    slot.ix = record.ix
+                    slot.holders += 1
+                return slot
+            record = domain_info.find_free()
+            if record is None:
+                record = self._find_overwritable(account, domain_info, hostname)
+            if record is None:
+                raise UpdateMyDnsJpError("Abnormal response from MyDNS.JP web. (no free DNSINFO row for TXT record)")
+            prev_content = None
+            if not record.is_free() and record.content != "":
+                prev_content = record.content
+            domain_info.update(record, hostname, TXT_RECORD_TYPE, content)
+            slot = TxtSlot(hostname, content, record.ix, prev_content)
+            self._slots[(account, hostname, content)] = slot
+            return slot
+
+    def release(self, account: str, domain_info: DomainInfo, hostname: str, content: str, missing_ok: bool = False) -> tuple:
+        """
+        Release the row of a TXT value.
+        Give the slot to restore if the update is not submitted.
+
+        :param account: MyDNS.JP master id
+        :param domain_info: domain info of the account
+        :param hostname: hostname relative to the domainname
+        :param content: the string value of TXT record
+        :param missing_ok: True if a value held by no row is already cleared (e.g. by certbot-dns-mydnsjp-sweep)
+
+        :return: tuple of (record holding the value to clear or restore or None if other holders still use it or it is already cleared,
+                 released slot or None if the value was not allocated by this allocator)
+
+        :raise TxtRecordMissingMyDnsJpError: if no row holds the value and missing_ok is False
+        """
+        with self._lock:
+            self._domainnames[account] = domain_info.domainname
+            slot = self._slots.get((account, hostname, content))
+            if slot is not None and slot.holders > 1:
+                slot.holders -= 1
+                return None, slot
+            record = None
+            if slot is not None:
+                record = domain_info.get_record(slot.ix)
+                if record is not None and (record.hostname != hostname or record.type != TXT_RECORD_TYPE or record.content != content):
+                    record = None
+            if record is None:
+                record = domain_info.find(hostname, TXT_RECORD_TYPE, content)
+            if record is None and not missing_ok:
+                raise TxtRecordMissingMyDnsJpError("Abnormal response from MyDNS.JP web. (hostname_elements missing)")
+            if slot is not None:
+                slot.holders -= 1
+                del self._slots[(account, hostname, content)]
+            return record, slot
+
+    def restore(self, account: str, slot: TxtSlot) -> None:
+        """
+        Take back a slot released for an update that was not submitted or failed, so a retry of the clear releases it again.
+        If the caller gives up the clear, it must forget the value.
+
+        :param account: MyDNS.JP master id
+        :param slot: slot returned by release
+        """
+        with self._lock:
+            current = self._slots.get((account, slot.hostname, slot.content))
+            if current is None:
+                slot.holders += 1
+                self._slots[(account, slot.hostname, slot.content)] = slot
+            else:
+                # allocated again since the release
+                current.holders += 1
+
+    def forget(self, account: str, domain: str, content: str) -> None:
+        """
+        Drop the holder of a TXT value whose clear was given up, the row is left to certbot-dns-mydnsjp-sweep.
+        Without it the holder restored for retries would keep the row of a later set of the same value.
+
+        :param account: MyDNS.JP master id
+        :param domain: fully qualified domain name of the TXT record
+        :param content: the string value of TXT record
+        """
+        with self._lock:
+            domainname = self._domainnames.get(account)
+            if domainname is None or not domain.endswith("." + domainname):
+                return
+            key = (account, domain[:-len(domainname) - 1], content)
+            slot = self._slots.get(key)
+            if slot is None:
+                return
+            slot.holders -= 1
+            if slot.holders <= 0:
+                del self._slots[key]
+
+    def cancel(self, account: str, slot: TxtSlot) -> None:
+        """
+        Forget a slot whose update was not submitted.
+
+        :param account: MyDNS.JP master id
+        :param slot: slot returned by allocate
+        """
+        with self._lock:
+            if self._slots.get((account, slot.hostname, slot.content)) is not slot:
+                return
+            slot.holders -= 1
+            if slot.holders <= 0:
+                del self._slots[(account, slot.hostname, slot.content)]
+
+    def _find_overwritable(self, account: str, domain_info: DomainInfo, hostname: str) -> DomainInfoRecord:
+        """
+        Find a TXT row of the hostname not holding a pending value.
+
+        :param account: MyDNS.JP master id
+        :param domain_info: domain info of the account
+        :param hostname: hostname relative to the domainname
+
+        :return: record or None
+        """
+        for record in domain_info.find_all(hostname, TXT_RECORD_TYPE):
+            if (account, hostname, record.content) not in self._slots:
+                return record
+        return None
@@ -0,0 +1,138 @@
+"""
+Find _acme-challenge TXT records left in MyDNS.JP (e.g. by a crashed certbot run) and clear them.
+
+usage: certbot-dns-mydnsjp-sweep --credentials mydnsjp.ini [--clear] [--include-foreign] [--min-age 3600]
+
+All configured accounts are read concurrently. A TXT value found in the journal of the plugin is "ours",
+and its replaced value is restored when it is cleared. Other values are cleared only with --include-foreign.
+With --clear the selected rows of an account are cleared in one update.
+One JSON result per TXT record is written to stdout:
+  {"account": "...", "domain": "...", "content": "...", "ours": true, "age": 7200.0, "prev": null,
+   "action": "clear", "ok": true, "error": null}
+"""
+import argparse
+import json
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from certbot_dns_mydnsjp.mydnsjp.cli import add_client_arguments, make_client
+from certbot_dns_mydnsjp.mydnsjp.client import ACME_CHALLENGE_TXT_PREFIX, MyDNSJPClient
+
+DEFAULT_SWEEP_CONCURRENCY = 4
+DEFAULT_SWEEP_MIN_AGE = 3600.0
+
+class Sweeper:
+    """
+    Find and clear stale TXT records of all accounts of a client.
+    """
+
+    def __init__(self, client: MyDNSJPClient, out, clear: bool = False, include_foreign: bool = False,
+                 min_age: float = DEFAULT_SWEEP_MIN_AGE, max_concurrency: int = DEFAULT_SWEEP_CONCURRENCY) -> None:
+        """
+        Creates a new Sweeper object.
+
+        :param client: client of the MyDNS.JP accounts
+        :param out: text file the results are written to
+        :param clear: True to clear the stale records, False to report them only
+        :param include_foreign: True to clear also the records not in the journal
+        :param min_age: seconds since a journaled value was set before it is stale (younger values may be in use)
+        :param max_concurrency: maximum number of accounts read at the same time
+        """
+        self._client = client
+        self._out = out
+        self._clear = clear
+        self._include_foreign = include_foreign
+        self._min_age = min_age
+        self._max_concurrency = max(max_concurrency, 1)
+        self._out_lock = threading.Lock()
+        self.failed = 0
+
+    def run(self) -> None:
+        """
+        Sweep all accounts and write the results.
+        """
+        credentials = self._client.get_mydnsjp_credentials()
+        with ThreadPoolExecutor(max_workers=min(self._max_concurrency, len(credentials))) as executor:
+            for future in [executor.submit(self._sweep_account, credential) for credential in credentials]:
+                future.result()
+
+    def _sweep_account(self, credential: dict) -> None:
+        """
+        Find the TXT records of an account and clear the stale ones in one update.
+
+        :param credential: credential used for MyDNS.JP web interface
+        """
+        try:
+            found = self._client.list_txt_records(credential, ACME_CHALLENGE_TXT_PREFIX)
+        except Exception as e:
+            self._write([{"account": credential["id"], "domain": None, "content": None, "ours": None, "age": None,
+                          "prev": None, "action": "list", "ok": False, "error": str(e)}])
+            return
+        now = time.time()
+        results = []
+        targets = []
+        for domain, content, entry in found:
+            result = {"account": credential["id"], "domain": domain, "content": content, "ours": entry is not None,
+                      "age": None, "prev": None, "action": "keep", "ok": True, "error": None}
+            if entry is not None:
+                result["age"] = round(now - entry["time"], 1)
+                result["prev"] = entry["prev"]
+            if (entry is not None and now - entry["time"] >= self._min_age) or (entry is None and self._include_foreign):
+                result["action"] = "clear" if result["prev"] is None else "restore"
+                targets.append((domain, content, result["prev"]))
+            results.append(result)
+        if self._clear and len(targets) > 0:
+            try:
+                self._client.clear_txt_records(credential, targets)
+            except Exception as e:
+                for result in results:
+                    if result["action"] != "keep":
+                        result["ok"] = False
+                        result["error"] = str(e)
+        elif not self._clear:
+            # report only
+            for result in results:
+                if result["action"] != "keep":
+                    result["action"] = "would-" + result["action"]
+        self._write(results)
+
+    def _write(self, results: list) -> None:
+        """
+        Write results, one JSON object per line.
+
+        :param results: list of result dictionary
+        """
+        with self._out_lock:
+            for result in results:
+                if not result["ok"]:
+                    self.failed += 1
+                self._out.write(json.dumps(result) + "\n")
+            self._out.flush()
+
+def main() -> None:
+    """
+    Entry point of the sweep command, exit status is 1 if any account or record failed.
+    """
+    parser = argparse.ArgumentParser(description="Find and clear _acme-challenge TXT records left in MyDNS.JP.")
+    add_client_arguments(parser)
+    parser.add_argument("--clear", action="store_true", help="clear the stale records (default: report only)")
+    parser.add_argument("--include-foreign", action="store_true",
+                        help="clear also the records not set by this plugin (not in the journal)")
+    parser.add_argument("--min-age", type=float, default=DEFAULT_SWEEP_MIN_AGE,
+                        help="seconds since a journaled value was set before it is cleared")
+    parser.add_argument("--max-concurrency", type=int, default=DEFAULT_SWEEP_CONCURRENCY,
+                        help="maximum number of MyDNS.JP accounts read at the same time")
+    args = parser.parse_args()
+
+    client, session_manager = make_client(args, parser)
+    sweeper = Sweeper(client, sys.stdout, args.clear, args.include_foreign, args.min_age, args.max_concurrency)
+    try:
+        sweeper.run()
+    finally:
+        session_manager.close()
+    sys.exit(1 if sweeper.failed > 0 else 0)
+
+if __name__ == "__main__":
+    main()
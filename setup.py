@@ -39,9 +39,17 @@ setup(
         "certbot>=1.18.0,<3.0",
         "requests>=2.20.0,<3.0"
     ],
+    extras_require={
+        "async": ["aiohttp>=3.8,<4.0"],
+    },
     entry_points={
         "certbot.plugins": [
             "dns-mydnsjp = certbot_dns_mydnsjp.cert.client:Authenticator",
+        ],
+        "console_scripts": [
+            "certbot-dns-mydnsjp-broker = certbot_dns_mydnsjp.mydnsjp.broker:main",
+            "certbot-dns-mydnsjp-bulk = certbot_dns_mydnsjp.mydnsjp.bulk:main",
+            "certbot-dns-mydnsjp-sweep = certbot_dns_mydnsjp.mydnsjp.sweep:main",
         ]
     }
 )
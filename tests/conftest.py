@@ -0,0 +1,54 @@
+"""
+Fixtures running MyDNSJPClient and PropagationChecker against the local fake servers of benchmarks/.
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+
+import fake_mydnsjp  # noqa: E402
+
+from certbot_dns_mydnsjp.mydnsjp.backend import RequestPolicy  # noqa: E402
+from certbot_dns_mydnsjp.mydnsjp.client import MyDNSJPClient  # noqa: E402
+from certbot_dns_mydnsjp.mydnsjp.directedit import DirectEditBackend  # noqa: E402
+from certbot_dns_mydnsjp.mydnsjp.journal import TxtJournal  # noqa: E402
+from certbot_dns_mydnsjp.mydnsjp.scraping import ScrapingBackend  # noqa: E402
+from certbot_dns_mydnsjp.mydnsjp.session import MyDNSJPSessionManager  # noqa: E402
+
+@pytest.fixture
+def mydnsjp():
+    """
+    Fake MyDNS.JP server state, served on a free local port (state.base_url).
+    """
+    state = fake_mydnsjp.FakeMyDNSJP()
+    server = fake_mydnsjp.serve(state)
+    state.base_url = f"http://127.0.0.1:{server.server_port}"
+    yield state
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture
+def journal(tmp_path):
+    """
+    TXT journal in tmp_path, used by the clients of make_client.
+    """
+    return TxtJournal(str(tmp_path / "journal"))
+
+@pytest.fixture
+def make_client(mydnsjp, journal, tmp_path):
+    """
+    Factory of MyDNSJPClient using both backends of the fake server, with its lock directory and journal in tmp_path.
+    """
+    def factory(credential: dict) -> MyDNSJPClient:
+        session_manager = MyDNSJPSessionManager()
+        policy = RequestPolicy(1.0, 2.0, 10.0, 1)
+        backends = {
+            ScrapingBackend.name: ScrapingBackend(session_manager, mydnsjp.base_url + "/members/", policy=policy),
+            DirectEditBackend.name: DirectEditBackend(session_manager, mydnsjp.base_url + "/directedit.html", policy=policy),
+        }
+        return MyDNSJPClient(credential, session_manager, backends, policy=policy, lock_dir=str(tmp_path / "locks"),
+                             journal=journal)
+
+    return factory
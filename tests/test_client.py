@@ -0,0 +1,148 @@
+"""
+Set, clear and restore TXT records through the scraping and DirectEDIT backends of the fake MyDNS.JP server.
+"""
+import pytest
+
+from certbot_dns_mydnsjp.mydnsjp.errors import UpdateMyDnsJpError
+
+DOMAINNAME = "example.mydns.jp"
+CHALLENGE = "_acme-challenge." + DOMAINNAME
+SUB_CHALLENGE = "_acme-challenge.www." + DOMAINNAME
+
+def scraping_credential() -> dict:
+    return {DOMAINNAME: {"id": "id0", "pwd": "pwd0"}}
+
+def directedit_credential() -> dict:
+    return {DOMAINNAME: {"id": "id0", "pwd": "pwd0", "backend": "directedit"}}
+
+def test_set_and_clear(mydnsjp, make_client, journal):
+    account = mydnsjp.add_account("id0", "pwd0", DOMAINNAME, rows=5, filled_rows=1)
+    client = make_client(scraping_credential())
+    credential = client.get_mydnsjp_credential(CHALLENGE)
+
+    prev_contents = client.set_txt_records(credential, [(CHALLENGE, "v1"), (SUB_CHALLENGE, "v2")])
+
+    assert prev_contents == [None, None]
+    assert sorted(account.get_txt_records()) == [("_acme-challenge", "v1"), ("_acme-challenge.www", "v2")]
+    assert set(journal.load(credential)) == {(CHALLENGE, "v1"), (SUB_CHALLENGE, "v2")}
+    assert mydnsjp.counts["LOGIN"] == 1
+
+    client.clear_txt_records(credential, [(CHALLENGE, "v1", None), (SUB_CHALLENGE, "v2", None)])
+
+    assert account.get_txt_records() == []
+    assert account.records[0] == ["host0", "A", "192.0.2.0", "0"]
+    assert journal.load(credential) == {}
+
+def test_restore_overwritten_value(mydnsjp, make_client, journal):
+    account = mydnsjp.add_account("id0", "pwd0", DOMAINNAME, rows=1)
+    account.records[0] = ["_acme-challenge", "TXT", "old", "0"]
+    client = make_client(scraping_credential())
+    credential = client.get_mydnsjp_credential(CHALLENGE)
+
+    prev_contents = client.set_txt_records(credential, [(CHALLENGE, "new")])
+
+    assert prev_contents == ["old"]
+    assert account.get_txt_records() == [("_acme-challenge", "new")]
+    assert journal.load(credential)[(CHALLENGE, "new")]["prev"] == "old"
+
+    client.clear_txt_records(credential, [(CHALLENGE, "new", prev_contents[0])])
+
+    assert account.get_txt_records() == [("_acme-challenge", "old")]
+    assert journal.load(credential) == {}
+
+def test_wildcard_and_apex_on_one_hostname(mydnsjp, make_client):
+    account = mydnsjp.add_account("id0", "pwd0", DOMAINNAME, rows=5)
+    client = make_client(scraping_credential())
+    credential = client.get_mydnsjp_credential(CHALLENGE)
+
+    # example.mydns.jp and *.example.mydns.jp are validated at the same name
+    client.set_txt_records(credential, [(CHALLENGE, "apex"), (CHALLENGE, "wildcard")])
+
+    assert sorted(account.get_txt_records()) == [("_acme-challenge", "apex"), ("_acme-challenge", "wildcard")]
+
+    client.clear_txt_records(credential, [(CHALLENGE, "wildcard", None)])
+
+    assert account.get_txt_records() == [("_acme-challenge", "apex")]
+
+    client.clear_txt_records(credential, [(CHALLENGE, "apex", None)])
+
+    assert account.get_txt_records() == []
+
+def test_shared_value_is_cleared_by_last_holder(mydnsjp, make_client):
+    account = mydnsjp.add_account("id0", "pwd0", DOMAINNAME, rows=5)
+    client = make_client(scraping_credential())
+    credential = client.get_mydnsjp_credential(CHALLENGE)
+
+    client.set_txt_records(credential, [(CHALLENGE, "same")])
+    client.set_txt_records(credential, [(CHALLENGE, "same")])
+
+    assert account.get_txt_records() == [("_acme-challenge", "same")]
+
+    client.clear_txt_records(credential, [(CHALLENGE, "same", None)])
+
+    assert account.get_txt_records() == [("_acme-challenge", "same")]
+
+    client.clear_txt_records(credential, [(CHALLENGE, "same", None)])
+
+    assert account.get_txt_records() == []
+
+def test_session_expiry_logs_in_again(mydnsjp, make_client):
+    account = mydnsjp.add_account("id0", "pwd0", DOMAINNAME, rows=5)
+    client = make_client(scraping_credential())
+    credential = client.get_mydnsjp_credential(CHALLENGE)
+    client.set_txt_records(credential, [(CHALLENGE, "v1")])
+
+    mydnsjp.sessions.clear()
+    client.clear_txt_records(credential, [(CHALLENGE, "v1", None)])
+
+    assert account.get_txt_records() == []
+    assert mydnsjp.counts["LOGIN"] == 2
+
+def test_error_on_confirm_is_not_applied(mydnsjp, make_client, journal):
+    account = mydnsjp.add_account("id0", "pwd0", DOMAINNAME, rows=5)
+    client = make_client(scraping_credential())
+    credential = client.get_mydnsjp_credential(CHALLENGE)
+
+    mydnsjp.fail("CONFIRM")
+    with pytest.raises(UpdateMyDnsJpError):
+        client.set_txt_records(credential, [(CHALLENGE, "v1")])
+
+    assert account.get_txt_records() == []
+    assert journal.load(credential) == {}
+
+    # the failed value holds no row, so setting it again and clearing it leaves nothing behind
+    client.set_txt_records(credential, [(CHALLENGE, "v1")])
+    client.clear_txt_records(credential, [(CHALLENGE, "v1", None)])
+
+    assert account.get_txt_records() == []
+
+def test_directedit_set_and_clear(mydnsjp, make_client, journal):
+    account = mydnsjp.add_account("id0", "pwd0", DOMAINNAME, rows=5)
+    client = make_client(directedit_credential())
+    credential = client.get_mydnsjp_credential(CHALLENGE)
+
+    client.set_txt_records(credential, [(CHALLENGE, "apex"), (CHALLENGE, "wildcard")])
+
+    assert sorted(account.get_txt_records()) == [("_acme-challenge", "apex"), ("_acme-challenge", "wildcard")]
+    assert mydnsjp.counts == {"DIRECTEDIT": 2}
+
+    client.clear_txt_records(credential, [(CHALLENGE, "apex", None), (CHALLENGE, "wildcard", None)])
+
+    assert account.get_txt_records() == []
+    assert journal.load(credential) == {}
+
+def test_directedit_error_falls_back_to_scraping(mydnsjp, make_client):
+    account = mydnsjp.add_account("id0", "pwd0", DOMAINNAME, rows=5)
+    client = make_client(directedit_credential())
+    credential = client.get_mydnsjp_credential(CHALLENGE)
+
+    mydnsjp.fail("DIRECTEDIT")
+    client.set_txt_records(credential, [(CHALLENGE, "v1")])
+
+    assert account.get_txt_records() == [("_acme-challenge", "v1")]
+    assert mydnsjp.counts["DIRECTEDIT"] == 1
+    assert mydnsjp.counts["CONFIRM"] == 1
+
+    client.clear_txt_records(credential, [(CHALLENGE, "v1", None)])
+
+    assert account.get_txt_records() == []
@@ -0,0 +1,91 @@
+"""
+Poll the fake nameserver of benchmarks/ with PropagationChecker.
+"""
+import fake_dns
+import fake_mydnsjp
+import pytest
+
+from certbot_dns_mydnsjp.mydnsjp.propagation import DEFAULT_DNS_PORT, PropagationChecker, parse_nameserver, query_txt
+
+CHALLENGE = "_acme-challenge.example.mydns.jp"
+
+@pytest.fixture
+def serve_dns():
+    """
+    Factory serving a FakeDNS state on a free local port, returns the nameserver address "127.0.0.1:port".
+    """
+    servers = []
+
+    def factory(state: fake_dns.FakeDNS) -> str:
+        server = fake_dns.serve(state)
+        servers.append(server)
+        return f"127.0.0.1:{server.server_address[1]}"
+
+    yield factory
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+        server.tcp_server.shutdown()
+        server.tcp_server.server_close()
+
+@pytest.mark.parametrize("nameserver, expected", [
+    ("ns0.mydns.jp", ("ns0.mydns.jp", DEFAULT_DNS_PORT)),
+    ("127.0.0.1:5353", ("127.0.0.1", 5353)),
+    ("[::1]", ("::1", DEFAULT_DNS_PORT)),
+    ("[::1]:5353", ("::1", 5353)),
+])
+def test_parse_nameserver(nameserver, expected):
+    assert parse_nameserver(nameserver) == expected
+
+def test_query_txt(serve_dns):
+    nameserver = serve_dns(fake_dns.FakeDNS(txt={CHALLENGE: ["v1", "v2"]}))
+
+    assert sorted(query_txt(CHALLENGE, parse_nameserver(nameserver))) == ["v1", "v2"]
+    assert query_txt("_acme-challenge.other.mydns.jp", parse_nameserver(nameserver)) == []
+
+def test_truncated_answer_is_queried_over_tcp(serve_dns):
+    values = [f"value{ix:02d}-" + "x" * 40 for ix in range(20)]
+    state = fake_dns.FakeDNS(txt={CHALLENGE: values})
+    nameserver = serve_dns(state)
+
+    assert sorted(query_txt(CHALLENGE, parse_nameserver(nameserver))) == values
+    assert state.tcp_queries == 1
+
+def test_wait_visible_records(serve_dns):
+    nameservers = [serve_dns(fake_dns.FakeDNS(txt={CHALLENGE: ["apex", "wildcard"]})) for _ in range(2)]
+    checker = PropagationChecker(nameservers, timeout=1.0)
+
+    result = checker.wait([(CHALLENGE, "apex"), (CHALLENGE, "wildcard")], ceiling=5.0, interval=0.1)
+
+    assert list(result) == [CHALLENGE]
+    assert result[CHALLENGE] is not None
+
+def test_wait_gives_up_at_ceiling(serve_dns):
+    nameserver = serve_dns(fake_dns.FakeDNS(txt={CHALLENGE: ["apex"]}))
+    checker = PropagationChecker([nameserver], timeout=0.2)
+
+    result = checker.wait([(CHALLENGE, "apex"), (CHALLENGE, "wildcard")], ceiling=0.5, interval=0.1)
+
+    assert result == {CHALLENGE: None}
+
+def test_wait_many_names(serve_dns):
+    names = [f"_acme-challenge.host{ix}.example.mydns.jp" for ix in range(20)]
+    nameserver = serve_dns(fake_dns.FakeDNS(txt={name: ["v"] for name in names}))
+    checker = PropagationChecker([nameserver], timeout=1.0)
+
+    result = checker.wait([(name, "v") for name in names], ceiling=5.0, interval=0.1)
+
+    assert sorted(result) == sorted(names)
+    assert all(elapsed is not None for elapsed in result.values())
+
+def test_wait_rows_of_mydnsjp(serve_dns):
+    mydnsjp = fake_mydnsjp.FakeMyDNSJP()
+    account = mydnsjp.add_account("id0", "pwd0", "example.mydns.jp", rows=5)
+    state = fake_dns.FakeDNS(mydnsjp, refresh=0.3)
+    checker = PropagationChecker([serve_dns(state)], timeout=1.0)
+    with account.lock:
+        account.records[0] = ["_acme-challenge", "TXT", "v1", "0"]
+
+    result = checker.wait([(CHALLENGE, "v1")], ceiling=5.0, interval=0.1)
+
+    assert result[CHALLENGE] is not None